@@ -0,0 +1,229 @@
+import json
+from copy import copy
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import IntegrityError, transaction
+from django.forms.models import model_to_dict
+from django.http import JsonResponse
+from django.views import generic
+
+from . import shards, slugs
+from .forms import WARNING, NoteForm
+from .models import Note, NoteChange
+from .retry import WriteRetryMixin
+
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+
+
+class BatchError(Exception):
+    """Ошибка отдельной операции пакета."""
+
+    def __init__(self, status, errors):
+        super().__init__(status)
+        self.status = status
+        self.errors = errors
+
+
+class RollbackBatch(Exception):
+    """Откатывает весь пакет в режиме atomic."""
+
+
+class ApiLoginRequiredMixin(LoginRequiredMixin):
+    """Вместо перенаправления на вход отвечает 401 в JSON."""
+
+    def handle_no_permission(self):
+        return JsonResponse({'error': 'authentication required'},
+                            status=HTTPStatus.UNAUTHORIZED)
+
+
+class NoteBatch(ApiLoginRequiredMixin, WriteRetryMixin, generic.View):
+    """Пакет операций create/update/delete над заметками автора.
+
+    Все операции выполняются в одной транзакции, каждая — в своей точке
+    сохранения: ошибка одной операции не отменяет остальные, если
+    не передан флаг atomic. Изменять можно только свои заметки,
+    как и в NoteBase.
+    """
+    http_method_names = ['post']
+
+    def get_queryset(self):
+        return Note.objects.for_author(self.request.user)
+
+    def post(self, request, *args, **kwargs):
+        # post определён здесь и закрывает WriteRetryMixin.post,
+        # поэтому пакет повторяется явно.
+        return self.retry_write(self.run_batch, request)
+
+    def run_batch(self, request):
+        try:
+            payload = json.loads(request.body)
+            operations = payload['operations']
+            if not isinstance(operations, list):
+                raise TypeError
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse(
+                {'error': 'expected {"operations": [...]}'},
+                status=HTTPStatus.BAD_REQUEST,
+            )
+        if len(operations) > settings.NOTES_API_MAX_BATCH:
+            return JsonResponse(
+                {'error': f'at most {settings.NOTES_API_MAX_BATCH} '
+                          'operations per batch'},
+                status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+            )
+        atomic = bool(payload.get('atomic'))
+        self.using = shards.db_for_author(request.user.pk)
+        try:
+            with transaction.atomic(using=self.using):
+                results = self.run(operations)
+                failed = any(result['status'] == 'error'
+                             for result in results)
+                if atomic and failed:
+                    raise RollbackBatch
+        except RollbackBatch:
+            for result in results:
+                if result['status'] != 'error':
+                    result['status'] = 'rolled_back'
+        return JsonResponse({'results': results})
+
+    def run(self, operations):
+        slugs_in_batch = {
+            operation.get('slug') for operation in operations
+            if isinstance(operation, dict) and operation.get('slug')
+        }
+        # Все заметки, на которые ссылается пакет, — одним запросом.
+        self.notes = {
+            note.slug: note
+            for note in self.get_queryset().filter(slug__in=slugs_in_batch)
+        }
+        results = []
+        for index, operation in enumerate(operations):
+            try:
+                with transaction.atomic(using=self.using):
+                    result = self.apply(operation)
+            except BatchError as error:
+                result = {'status': 'error', 'code': error.status,
+                          'errors': error.errors}
+            results.append({'index': index, **result})
+        return results
+
+    def apply(self, operation):
+        if not isinstance(operation, dict):
+            raise BatchError(HTTPStatus.BAD_REQUEST,
+                             {'__all__': ['operation must be an object']})
+        action = operation.get('op')
+        if action == CREATE:
+            return self.create(operation)
+        if action in (UPDATE, DELETE):
+            note = self.notes.get(operation.get('slug'))
+            if note is None:
+                raise BatchError(HTTPStatus.NOT_FOUND,
+                                 {'slug': ['note not found']})
+            if action == UPDATE:
+                return self.update(note, operation)
+            return self.delete(note)
+        raise BatchError(HTTPStatus.BAD_REQUEST,
+                         {'op': [f'unknown operation {action!r}']})
+
+    def get_fields(self, operation):
+        fields = operation.get('fields', {})
+        if not isinstance(fields, dict):
+            raise BatchError(HTTPStatus.BAD_REQUEST,
+                             {'fields': ['fields must be an object']})
+        # Теги можно передать и списком названий, и строкой через запятую.
+        if isinstance(fields.get('tags'), list):
+            if not all(isinstance(name, str) for name in fields['tags']):
+                raise BatchError(HTTPStatus.BAD_REQUEST,
+                                 {'tags': ['tags must be strings']})
+            fields = {**fields, 'tags': ','.join(fields['tags'])}
+        return fields
+
+    def save_form(self, form):
+        if not form.is_valid():
+            raise BatchError(HTTPStatus.BAD_REQUEST, form.errors)
+        note = form.save(commit=False)
+        if note.author_id is None:
+            note.author = self.request.user
+        try:
+            with transaction.atomic(using=self.using):
+                note.save()
+                form.save_m2m()
+        except IntegrityError as error:
+            if not slugs.is_slug_conflict(error):
+                raise
+            raise BatchError(HTTPStatus.CONFLICT,
+                             {'slug': [note.slug + WARNING]})
+        self.notes[note.slug] = note
+        return note
+
+    def create(self, operation):
+        note = self.save_form(NoteForm(data=self.get_fields(operation)))
+        return {'status': 'created', 'slug': note.slug}
+
+    def update(self, note, operation):
+        """Частичное обновление: неуказанные поля остаются прежними."""
+        old_slug = note.slug
+        data = model_to_dict(note, fields=NoteForm._meta.fields)
+        data.update(self.get_fields(operation))
+        # Форма меняет instance при проверке, поэтому работаем с копией:
+        # после ошибки в пакете должна остаться исходная заметка.
+        note = self.save_form(NoteForm(data=data, instance=copy(note)))
+        if note.slug != old_slug:
+            del self.notes[old_slug]
+        return {'status': 'updated', 'slug': note.slug}
+
+    def delete(self, note):
+        note.delete()
+        del self.notes[note.slug]
+        return {'status': 'deleted', 'slug': note.slug}
+
+
+class NoteChanges(ApiLoginRequiredMixin, generic.View):
+    """Лента изменений заметок автора после курсора.
+
+    Каждая заметка встречается в ленте один раз — с последним
+    изменением; удалённые заметки приходят с deleted. Клиент передаёт
+    в следующий запрос cursor из ответа, пока has_more истинно.
+    """
+    http_method_names = ['get']
+
+    def get(self, request, *args, **kwargs):
+        try:
+            cursor = int(request.GET.get('cursor', 0))
+            limit = int(request.GET.get('limit',
+                                        settings.NOTES_API_CHANGES_LIMIT))
+        except ValueError:
+            return JsonResponse(
+                {'error': 'cursor and limit must be integers'},
+                status=HTTPStatus.BAD_REQUEST,
+            )
+        limit = max(1, min(limit, settings.NOTES_API_CHANGES_LIMIT))
+        using = shards.db_for_author(request.user.pk, write=False)
+        changes = list(
+            NoteChange.objects.using(using)
+            .filter(author=request.user, id__gt=cursor)
+            .order_by('id')[:limit + 1]
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        notes = Note.objects.using(using).filter(author=request.user).in_bulk(
+            [change.note_id for change in changes if not change.deleted]
+        )
+        items = []
+        for change in changes:
+            note = notes.get(change.note_id)
+            item = {'seq': change.id, 'id': change.note_id,
+                    'slug': change.slug, 'deleted': note is None}
+            if note is not None:
+                item.update(slug=note.slug, title=note.title,
+                            text=note.text, updated=note.updated)
+            items.append(item)
+        return JsonResponse({
+            'changes': items,
+            'cursor': changes[-1].id if changes else cursor,
+            'has_more': has_more,
+        })
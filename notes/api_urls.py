@@ -0,0 +1,10 @@
+from django.urls import path
+
+from notes import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('notes/batch/', api.NoteBatch.as_view(), name='batch'),
+    path('notes/changes/', api.NoteChanges.as_view(), name='changes'),
+]
@@ -0,0 +1,154 @@
+"""Потоковый архив всех заметок пользователя.
+
+Каждая заметка — файл <slug>.md с заголовком и текстом. Заметки
+читаются из базы кусками через iterator(), а архив отдаётся частями
+по мере записи, поэтому память не зависит от числа заметок.
+
+tar.gz собирается вручную из заголовков TarInfo и одного потока gzip:
+tarfile помнит все записанные файлы. ZIP тоже пишется вручную:
+центральный каталог, который zipfile держал бы в памяти, копится
+во временном файле и отдаётся в конце; при 65535 файлах и больше
+или смещениях за 4 ГБ добавляются записи ZIP64.
+"""
+import struct
+import tarfile
+import tempfile
+import zlib
+
+from django.utils import timezone
+
+TAR_GZ = 'tar.gz'
+ZIP = 'zip'
+FORMATS = {
+    TAR_GZ: 'application/gzip',
+    ZIP: 'application/zip',
+}
+# Сколько заметок читается из базы за один запрос.
+CHUNK_SIZE = 500
+# wbits для zlib: 16 + 15 — формат gzip с окном 32 КБ.
+GZIP_WBITS = 31
+FILE_MODE = 0o644
+ZIP_LEVEL = 6
+# Сигнатуры, версии и флаги из спецификации ZIP (APPNOTE.TXT).
+ZIP_LOCAL_HEADER = 0x04034b50
+ZIP_CENTRAL_HEADER = 0x02014b50
+ZIP_END = 0x06054b50
+ZIP64_END = 0x06064b50
+ZIP64_LOCATOR = 0x07064b50
+ZIP64_EXTRA = 0x0001
+ZIP_VERSION = 20
+ZIP64_VERSION = 45
+ZIP_UNIX = 3
+# Имена файлов в UTF-8.
+ZIP_UTF8_FLAG = 0x800
+# С этих значений счётчики и смещения записываются в полях ZIP64.
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+# Сколько байт центрального каталога читается из временного файла за раз.
+DIRECTORY_CHUNK = 64 * 1024
+
+
+def note_file(note):
+    """Имя и содержимое файла заметки."""
+    return f'{note.slug}.md', f'# {note.title}\n\n{note.text}\n'.encode()
+
+
+def stream_tar_gz(notes):
+    compressor = zlib.compressobj(wbits=GZIP_WBITS)
+    for note in notes:
+        name, data = note_file(note)
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mode = FILE_MODE
+        info.mtime = int(note.updated.timestamp())
+        padding = -len(data) % tarfile.BLOCKSIZE
+        chunk = compressor.compress(
+            info.tobuf(tarfile.PAX_FORMAT) + data + tarfile.NUL * padding
+        )
+        if chunk:
+            yield chunk
+    # Конец архива — два пустых блока.
+    yield compressor.compress(tarfile.NUL * tarfile.BLOCKSIZE * 2)
+    yield compressor.flush()
+
+
+def dos_datetime(moment):
+    """Дата и время в формате MS-DOS, как их хранит ZIP."""
+    moment = timezone.localtime(moment)
+    date = (moment.year - 1980) << 9 | moment.month << 5 | moment.day
+    time = moment.hour << 11 | moment.minute << 5 | moment.second // 2
+    return date, time
+
+
+def zip_entry(note, offset):
+    """Локальный заголовок с данными и запись центрального каталога."""
+    name, data = note_file(note)
+    name = name.encode()
+    compressor = zlib.compressobj(ZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed = compressor.compress(data) + compressor.flush()
+    date, time = dos_datetime(note.updated)
+    crc = zlib.crc32(data)
+    local = struct.pack(
+        '<IHHHHHIIIHH', ZIP_LOCAL_HEADER, ZIP_VERSION, ZIP_UTF8_FLAG,
+        zlib.DEFLATED, time, date, crc, len(compressed), len(data),
+        len(name), 0,
+    ) + name + compressed
+    extra = b''
+    version = ZIP_VERSION
+    if offset >= ZIP64_LIMIT:
+        extra = struct.pack('<HHQ', ZIP64_EXTRA, 8, offset)
+        version = ZIP64_VERSION
+    central = struct.pack(
+        '<IHHHHHHIIIHHHHHII', ZIP_CENTRAL_HEADER,
+        ZIP_UNIX << 8 | version, version, ZIP_UTF8_FLAG, zlib.DEFLATED,
+        time, date, crc, len(compressed), len(data), len(name), len(extra),
+        0, 0, 0, FILE_MODE << 16, min(offset, ZIP64_LIMIT),
+    ) + name + extra
+    return local, central
+
+
+def zip_end(count, directory_offset, directory_size):
+    """Конец центрального каталога, при необходимости с ZIP64."""
+    end = b''
+    if (count >= ZIP64_COUNT_LIMIT or directory_offset >= ZIP64_LIMIT
+            or directory_size >= ZIP64_LIMIT):
+        end_offset = directory_offset + directory_size
+        end = struct.pack(
+            '<IQHHIIQQQQ', ZIP64_END, 44, ZIP_UNIX << 8 | ZIP64_VERSION,
+            ZIP64_VERSION, 0, 0, count, count, directory_size,
+            directory_offset,
+        ) + struct.pack('<IIQI', ZIP64_LOCATOR, 0, end_offset, 1)
+    return end + struct.pack(
+        '<IHHHHIIH', ZIP_END, 0, 0, min(count, ZIP64_COUNT_LIMIT),
+        min(count, ZIP64_COUNT_LIMIT), min(directory_size, ZIP64_LIMIT),
+        min(directory_offset, ZIP64_LIMIT), 0,
+    )
+
+
+def stream_zip(notes):
+    offset = 0
+    count = 0
+    with tempfile.TemporaryFile() as directory:
+        for note in notes:
+            local, central = zip_entry(note, offset)
+            directory.write(central)
+            offset += len(local)
+            count += 1
+            yield local
+        directory_size = directory.tell()
+        directory.seek(0)
+        while True:
+            chunk = directory.read(DIRECTORY_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+    yield zip_end(count, offset, directory_size)
+
+
+def stream(queryset, archive_format):
+    """Части архива заметок queryset в формате archive_format."""
+    notes = (queryset.only('slug', 'title', 'text', 'updated')
+             .order_by('id').iterator(chunk_size=CHUNK_SIZE))
+    if archive_format == ZIP:
+        return stream_zip(notes)
+    return stream_tar_gz(notes)
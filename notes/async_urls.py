@@ -0,0 +1,19 @@
+"""Маршруты заметок под ASGI: страницы чтения — асинхронные."""
+from django.urls import path
+
+from notes import async_views, urls
+
+app_name = urls.app_name
+
+ASYNC_VIEWS = {
+    'home': async_views.Home,
+    'list': async_views.NotesList,
+    'detail': async_views.NoteDetail,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name].as_view(),
+         name=pattern.name)
+    if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in urls.urlpatterns
+]
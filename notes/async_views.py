@@ -0,0 +1,49 @@
+"""Асинхронные версии страниц для чтения: домашней, списка и заметки.
+
+Их подключает yanote.asgi_urls, под WSGI работают обычные views.py.
+Проверка входа, кеш страниц, условные запросы, чтение из шарда автора
+и отрисовка шаблона остаются как в синхронных представлениях, но
+выполняются в ограниченном пуле executor, а не в единственном потоке,
+куда Django 3.2 отправляет синхронные представления под ASGI.
+"""
+from asgiref.sync import markcoroutinefunction
+
+from . import executor, views
+
+
+class AsyncViewMixin:
+    """Представление-корутина: синхронная часть уходит в пул потоков.
+
+    Шаблон отрисовывается там же: иначе Django отрисует TemplateResponse
+    в общем потоке синхронного кода, а контекст страницы ленив и
+    обращается к базе при отрисовке.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Django 3.2 узнаёт асинхронное представление по
+        # asyncio.iscoroutinefunction; в 4.1 as_view() делает это сам.
+        return markcoroutinefunction(view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        return await executor.run(self.render_dispatch, request,
+                                  *args, **kwargs)
+
+    def render_dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+
+class Home(AsyncViewMixin, views.Home):
+    """Домашняя страница."""
+
+
+class NotesList(AsyncViewMixin, views.NotesList):
+    """Список всех заметок пользователя."""
+
+
+class NoteDetail(AsyncViewMixin, views.NoteDetail):
+    """Заметка подробно."""
@@ -0,0 +1,271 @@
+"""Хранение и выдача вложений заметок.
+
+Загрузка: HashingUploadHandler получает файл из multipart кусками,
+пишет их во временный файл в NOTES_ATTACHMENTS_ROOT и считает SHA-256
+на лету — файл целиком в памяти процесса не бывает. Затем файл
+переименовывается в путь по хешу; если такой уже есть, временный
+удаляется, и вложения делят одно содержимое.
+
+Выдача: FileResponse (сервер WSGI может отдать его через sendfile)
+с поддержкой одного диапазона Range, либо заголовок X-Accel-Redirect
+для nginx, если задан NOTES_ATTACHMENTS_ACCEL_PREFIX.
+
+Файл удаляется после коммита, когда на его хеш не ссылается ни одно
+вложение ни в одном шарде.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from http import HTTPStatus
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.db import transaction
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from . import shards
+
+TEMP_DIR = 'tmp'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def root():
+    return settings.NOTES_ATTACHMENTS_ROOT
+
+
+def relative_path(sha256):
+    return os.path.join(sha256[:2], sha256[2:4], sha256)
+
+
+def blob_path(sha256):
+    return os.path.join(root(), relative_path(sha256))
+
+
+class HashedUploadedFile(UploadedFile):
+    """Загруженный файл во временном файле с посчитанным SHA-256."""
+
+    def __init__(self, file, name, content_type, size, charset, sha256,
+                 content_type_extra=None):
+        super().__init__(file, name, content_type, size, charset,
+                         content_type_extra)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def discard(self):
+        """Удаляет временный файл, если он не стал содержимым вложения."""
+        self.close()
+        try:
+            os.unlink(self.temporary_file_path())
+        except FileNotFoundError:
+            pass
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """Пишет файлы запроса на диск кусками и считает их SHA-256.
+
+    Файл больше NOTES_ATTACHMENT_MAX_SIZE прерывает загрузку,
+    exceeded становится True.
+    """
+    exceeded = False
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        directory = os.path.join(root(), TEMP_DIR)
+        os.makedirs(directory, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=directory,
+                                                delete=False)
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > settings.NOTES_ATTACHMENT_MAX_SIZE:
+            self.exceeded = True
+            self.upload_interrupted()
+            raise StopUpload(connection_reset=True)
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.flush()
+        self.file.seek(0)
+        return HashedUploadedFile(
+            self.file, self.file_name, self.content_type, file_size,
+            self.charset, self.hash.hexdigest(), self.content_type_extra,
+        )
+
+    def upload_interrupted(self):
+        file = getattr(self, 'file', None)
+        if file is not None and not file.closed:
+            file.close()
+            os.unlink(file.name)
+
+
+def store(upload):
+    """Кладёт загруженный файл на место его хеша (или удаляет копию)."""
+    path = blob_path(upload.sha256)
+    upload.close()
+    if os.path.exists(path):
+        upload.discard()
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(upload.temporary_file_path(), path)
+
+
+def is_referenced(sha256):
+    attachment_model = apps.get_model('notes', 'Attachment')
+    return any(
+        attachment_model.objects.using(alias).filter(sha256=sha256).exists()
+        for alias in shards.aliases()
+    )
+
+
+def remove_unreferenced(sha256):
+    if not is_referenced(sha256):
+        try:
+            os.unlink(blob_path(sha256))
+        except FileNotFoundError:
+            pass
+
+
+def touch_note(note):
+    """Вложения — часть заметки: меняется её время, а с ним ETag."""
+    note_model = apps.get_model('notes', 'Note')
+    note_model.objects.using(note._state.db).filter(pk=note.pk).update(
+        updated=timezone.now()
+    )
+
+
+def attach(note, upload):
+    """Сохраняет файл и создаёт вложение заметки."""
+    attachment_model = apps.get_model('notes', 'Attachment')
+    store(upload)
+    using = note._state.db
+    with transaction.atomic(using=using):
+        attachment = attachment_model.objects.using(using).create(
+            note=note, author_id=note.author_id,
+            name=os.path.basename(upload.name),
+            content_type=upload.content_type or DEFAULT_CONTENT_TYPE,
+            size=upload.size, sha256=upload.sha256,
+        )
+        touch_note(note)
+    # Файл мог удалить параллельный remove_unreferenced до вставки.
+    if not os.path.exists(blob_path(attachment.sha256)):
+        attachment.delete()
+        raise FileNotFoundError(blob_path(attachment.sha256))
+    return attachment
+
+
+def detach(attachment):
+    with transaction.atomic(using=attachment._state.db):
+        attachment.delete()
+        touch_note(attachment.note)
+
+
+def parse_range(header, size):
+    """Диапазон (начало, конец включительно) из заголовка Range.
+
+    None — заголовок можно проигнорировать и отдать файл целиком
+    (его нет, несколько диапазонов или другие единицы).
+    """
+    match = RANGE_RE.match(header.replace(' ', '')) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if not length or not size:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise RangeNotSatisfiable
+    return start, end
+
+
+class RangeFile:
+    """Чтение не больше length байт с текущей позиции файла."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def serve(request, attachment):
+    """Ответ с содержимым вложения с учётом ETag и Range."""
+    etag = f'"{attachment.sha256}"'
+    last_modified = attachment.created.timestamp()
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=last_modified,
+    )
+    if not_modified is not None:
+        return not_modified
+    prefix = settings.NOTES_ATTACHMENTS_ACCEL_PREFIX
+    if prefix:
+        response = HttpResponse(content_type=attachment.content_type)
+        response['X-Accel-Redirect'] = (
+            prefix.rstrip('/') + '/'
+            + relative_path(attachment.sha256).replace(os.sep, '/')
+        )
+    else:
+        response = file_response(request, attachment, etag)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def file_response(request, attachment, etag):
+    size = attachment.size
+    if request.headers.get('If-Range', etag) != etag:
+        byte_range = None
+    else:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(
+                status=HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
+            )
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    file = open(blob_path(attachment.sha256), 'rb')
+    if byte_range is None:
+        return FileResponse(file, as_attachment=True,
+                            filename=attachment.name,
+                            content_type=attachment.content_type)
+    start, end = byte_range
+    file.seek(start)
+    response = FileResponse(
+        RangeFile(file, end - start + 1), as_attachment=True,
+        filename=attachment.name, content_type=attachment.content_type,
+        status=HTTPStatus.PARTIAL_CONTENT,
+    )
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(end - start + 1)
+    return response
@@ -0,0 +1,58 @@
+"""Пользователь запроса из кеша вместо запроса к auth_user.
+
+CachedAuthenticationMiddleware заменяет AuthenticationMiddleware:
+пользователь по id из сессии берётся из кеша заметок и проверяется
+по хешу сессии так же, как в django.contrib.auth.get_user. Запись
+в кеше сбрасывается при выходе, сохранении (в том числе смене пароля)
+и удалении пользователя, см. signals.py. Всё, что не укладывается
+в обычный путь, передаётся в django.contrib.auth.get_user.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from . import cache
+
+
+def user_key(user_id):
+    return f'notes:user:{user_id}'
+
+
+def invalidate_user(user_id):
+    cache.get_cache().delete(user_key(user_id))
+
+
+def get_user(request):
+    """Пользователь сессии; из базы читается, только если его нет в кеше."""
+    timeout = settings.NOTES_USER_CACHE_TIMEOUT
+    session = request.session
+    backend_path = session.get(auth.BACKEND_SESSION_KEY)
+    if (not timeout or auth.SESSION_KEY not in session
+            or backend_path not in settings.AUTHENTICATION_BACKENDS):
+        return auth.get_user(request)
+    user_id = auth.get_user_model()._meta.pk.to_python(
+        session[auth.SESSION_KEY]
+    )
+    key = user_key(user_id)
+    user = cache.get_cache().get(key)
+    if user is None:
+        user = auth.load_backend(backend_path).get_user(user_id)
+        if user is None:
+            return auth.get_user(request)
+        cache.get_cache().set(key, user, timeout)
+    session_hash = session.get(auth.HASH_SESSION_KEY)
+    if not (session_hash and constant_time_compare(
+            session_hash, user.get_session_auth_hash())):
+        # Пароль сменился или хеш старого формата: решает Django.
+        return auth.get_user(request)
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """Как AuthenticationMiddleware, но пользователь берётся из кеша."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
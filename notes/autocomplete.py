@@ -0,0 +1,131 @@
+"""Подсказки «перейти к заметке» по началу заголовка или slug.
+
+Для каждого автора процесс держит в памяти отсортированный массив
+ключей: заголовок и его транслитерация (как в pytils.slugify), slug,
+а также их хвосты с каждого слова. Подсказки — это бинарный поиск
+начала префикса и проход по ключам, пока они начинаются с него,
+без запросов к базе.
+
+Индекс строится лениво одним запросом при первой подсказке и помнит
+токен версии автора из кеша страниц (см. cache.py), который меняется
+при сохранении и удалении заметок. В общем кеше ('file') новый токен
+видят все процессы, и индекс перестраивается сразу. В кеше процесса
+('locmem') его видит только процесс, изменивший заметку, поэтому
+индекс живёт не дольше NOTES_AUTOCOMPLETE_TIMEOUT секунд: столько
+другие процессы могут подсказывать устаревшее. Индексы хранятся
+не больше чем для NOTES_AUTOCOMPLETE_USERS авторов, давно
+не спрашивавших вытесняются.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from pytils.translit import slugify
+
+from . import cache, shards
+from .models import Note
+
+# Разделители слов: пробелы и знаки, которыми slug разделяет слова.
+SEPARATORS = re.compile(r'[\s\-_]+')
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def normalize(text):
+    """Ключ поиска: нижний регистр, «ё» как «е», слова через пробел."""
+    text = text.casefold().replace('ё', 'е')
+    return ' '.join(SEPARATORS.sub(' ', text).split())
+
+
+def tails(text):
+    """Ключ текста и его хвосты, начинающиеся с каждого слова."""
+    words = normalize(text).split(' ')
+    return {' '.join(words[start:]) for start in range(len(words))
+            if words[start]}
+
+
+class PrefixIndex:
+    """Отсортированные ключи заметок одного автора."""
+    __slots__ = ('version', 'built', 'keys', 'ids', 'notes')
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.built = time.monotonic()
+        self.notes = {}
+        entries = set()
+        for note_id, title, slug in rows:
+            self.notes[note_id] = (title, slug)
+            for text in (title, slugify(title), slug):
+                entries.update((key, note_id) for key in tails(text))
+        entries = sorted(entries)
+        self.keys = [key for key, _ in entries]
+        self.ids = [note_id for _, note_id in entries]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def is_fresh(self, version):
+        age = time.monotonic() - self.built
+        return (self.version == version
+                and age < settings.NOTES_AUTOCOMPLETE_TIMEOUT)
+
+    def search(self, prefix, limit):
+        """Пары (заголовок, slug) заметок с ключом на prefix.
+
+        Порядок — по ключу, который совпал первым.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        found = {}
+        keys = self.keys
+        position = bisect_left(keys, prefix)
+        while (position < len(keys) and len(found) < limit
+               and keys[position].startswith(prefix)):
+            found.setdefault(self.ids[position])
+            position += 1
+        return [self.notes[note_id] for note_id in found]
+
+
+def build(author_id, version=None):
+    notes = Note.objects.using(
+        shards.db_for_author(author_id, write=False)
+    ).filter(author_id=author_id).values_list('id', 'title', 'slug')
+    return PrefixIndex(notes.iterator(), version)
+
+
+def get_index(author_id):
+    """Индекс автора: из памяти процесса или построенный заново."""
+    # Токен читается до построения: изменение заметок во время
+    # построения сменит токен, и следующий запрос перестроит индекс.
+    version = cache.get_version(author_id)
+    with _lock:
+        index = _indexes.get(author_id)
+        if index is not None and index.is_fresh(version):
+            _indexes.move_to_end(author_id)
+            return index
+    index = build(author_id, version)
+    with _lock:
+        _indexes[author_id] = index
+        _indexes.move_to_end(author_id)
+        while len(_indexes) > settings.NOTES_AUTOCOMPLETE_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def suggest(author_id, prefix, limit=None):
+    """Заметки автора, заголовок или slug которых начинается с prefix."""
+    if limit is None:
+        limit = settings.NOTES_AUTOCOMPLETE_LIMIT
+    if not normalize(prefix):
+        return []
+    return get_index(author_id).search(prefix, limit)
+
+
+def clear():
+    with _lock:
+        _indexes.clear()
@@ -0,0 +1,47 @@
+"""SQLite с настройками соединения для нескольких процессов-писателей.
+
+Поддерживает два параметра OPTIONS, как sqlite3 в Django 5.1:
+
+* init_command — PRAGMA и другие команды через «;», выполняются
+  на каждом новом соединении;
+* transaction_mode — режим BEGIN у atomic. С IMMEDIATE транзакция
+  сразу берёт блокировку записи и ждёт её busy_timeout, а не падает
+  с «database is locked», когда читающая транзакция пытается стать
+  пишущей после чужого коммита.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    init_commands = ()
+    transaction_mode = None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.init_commands = [
+            command.strip()
+            for command in params.pop('init_command', '').split(';')
+            if command.strip()
+        ]
+        self.transaction_mode = params.pop('transaction_mode', None)
+        if (self.transaction_mode is not None
+                and self.transaction_mode.upper() not in TRANSACTION_MODES):
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из {TRANSACTION_MODES}.'
+            )
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for command in self.init_commands:
+            connection.execute(command)
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,446 @@
+"""Воспроизводимые замеры маршрутов на синтетических данных.
+
+generate() заполняет базу пользователями и заметками с кириллическими
+заголовками; run_cases() прогоняет через тестовый клиент каждый маршрут
+из notes/urls.py и yanote/urls.py и собирает перцентили времени
+и число SQL-запросов. Результаты сериализуются в JSON, и compare()
+сравнивает два прогона между коммитами. measure_compression()
+показывает, сколько места экономит сжатие текста и чего оно стоит
+при чтении.
+"""
+import json
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import time
+from http import HTTPStatus
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+
+from . import cache, compression
+from .models import Attachment, Job, Note
+
+USERNAME = 'bench-{:05d}'
+PASSWORD = 'bench-password'
+PERCENTILES = (50, 95, 99)
+WORDS = (
+    'заметка', 'список', 'покупки', 'встреча', 'проект', 'отчёт', 'план',
+    'идея', 'книга', 'фильм', 'рецепт', 'поездка', 'задача', 'звонок',
+    'письмо', 'код', 'ревью', 'релиз', 'ошибка', 'сервер', 'база', 'данные',
+    'неделя', 'месяц', 'утро', 'вечер', 'дом', 'работа', 'учёба', 'спорт',
+    'здоровье', 'бюджет', 'подарок', 'праздник', 'отпуск', 'лекция',
+    'семинар', 'черновик', 'цитата', 'вопрос',
+)
+# Длина текста в символах распределена логнормально: медиана около
+# 700 символов, хвост — десятки килобайт.
+TEXT_MU = 6.5
+TEXT_SIGMA = 1.2
+TEXT_MAX_LENGTH = 100_000
+# Размеры текста (в байтах) для замеров сжатия: заметка, длинная
+# заметка и вставленный лог.
+COMPRESSION_SIZES = (1024, 64 * 1024, 1024 * 1024)
+LOG_LEVELS = ('DEBUG', 'INFO', 'INFO', 'INFO', 'WARNING', 'ERROR')
+# Маршруты админки замеряются выборочно, см. build_cases().
+SKIPPED_NAMESPACES = ('admin',)
+
+
+def make_title(rng):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(2, 8))).capitalize()
+
+
+def make_text(rng):
+    length = min(int(rng.lognormvariate(TEXT_MU, TEXT_SIGMA)),
+                 TEXT_MAX_LENGTH)
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words).capitalize()
+
+
+def make_log(rng, size):
+    """Текст лога из size байт: такие вставляют в заметки целиком."""
+    lines = []
+    length = 0
+    while length < size:
+        line = (f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} '
+                f'{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:'
+                f'{rng.randint(0, 59):02d} {rng.choice(LOG_LEVELS)} '
+                f'{rng.choice(WORDS)}[{rng.randint(1, 99999)}]: '
+                + ' '.join(rng.choices(WORDS, k=rng.randint(3, 12))))
+        lines.append(line)
+        length += len(line.encode()) + 1
+    return '\n'.join(lines).encode()[:size].decode(errors='ignore')
+
+
+def generate(users, notes_per_user, seed=0, batch_size=1000):
+    """Создаёт users пользователей по notes_per_user заметок.
+
+    Первый пользователь — суперпользователь, от его имени идут замеры.
+    У всех один пароль PASSWORD: хеш считается один раз. Slug
+    получаются из заголовков через slugify, повторы — с суффиксами.
+    """
+    rng = random.Random(seed)
+    user_model = get_user_model()
+    password = make_password(PASSWORD)
+    user_model.objects.bulk_create([
+        user_model(username=USERNAME.format(number), password=password,
+                   is_staff=number == 0, is_superuser=number == 0)
+        for number in range(users)
+    ])
+    author_ids = list(
+        user_model.objects.filter(
+            username__in=[USERNAME.format(number) for number in range(users)]
+        ).order_by('username').values_list('pk', flat=True)
+    )
+    batch = []
+    for author_id in author_ids:
+        for _ in range(notes_per_user):
+            batch.append(Note(author_id=author_id, title=make_title(rng),
+                              text=make_text(rng)))
+            if len(batch) == batch_size:
+                Note.objects.bulk_create_with_slugs(batch)
+                batch = []
+    if batch:
+        Note.objects.bulk_create_with_slugs(batch)
+    return user_model.objects.get(pk=author_ids[0])
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(1, round(percent / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class Case:
+    """Замер маршрута: prepare(client, iteration) вызывается вне замера
+    и возвращает путь и именованные аргументы запроса клиента.
+    """
+
+    def __init__(self, route, method='get', prepare=None, anonymous=False,
+                 status=HTTPStatus.OK):
+        self.route = route
+        self.method = method
+        self.status = status
+        self.prepare = prepare or (lambda client, iteration: (
+            reverse(route), {}
+        ))
+        self.anonymous = anonymous
+
+    @property
+    def label(self):
+        return f'{self.method.upper()} {self.route}'
+
+
+def route_names(resolver=None, namespace=''):
+    """Имена всех маршрутов проекта вида «пространство:имя»."""
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            prefix = namespace
+            if pattern.namespace:
+                prefix = f'{namespace}{pattern.namespace}:'
+            yield from route_names(pattern, prefix)
+        elif pattern.name:
+            yield namespace + pattern.name
+
+
+def uncovered_routes(cases):
+    covered = {case.route for case in cases}
+    return sorted(
+        name for name in set(route_names())
+        if name not in covered
+        and name.split(':', 1)[0] not in SKIPPED_NAMESPACES
+    )
+
+
+def upload_to(note):
+    """Загрузка вложения к заметке note."""
+    def prepare(client, iteration):
+        return reverse('notes:attach', kwargs={'slug': note.slug}), {
+            'data': {'file': SimpleUploadedFile(
+                f'bench-{iteration}.txt', note.text.encode(), 'text/plain',
+            )},
+        }
+    return prepare
+
+
+def with_attachment(note, route):
+    """Маршрут route для вложения, загруженного перед замером."""
+    upload = upload_to(note)
+
+    def prepare(client, iteration):
+        path, kwargs = upload(client, iteration)
+        client.post(path, **kwargs)
+        latest = (Attachment.objects.for_author(note.author)
+                  .order_by('-id').values_list('pk', flat=True)[0])
+        return reverse(route, kwargs={'pk': latest}), {}
+    return prepare
+
+
+def new_job(client, iteration):
+    return reverse('notes:job_add'), {'data': {'name': 'render_notes'}}
+
+
+def queued_job(user):
+    """Страница задачи, поставленной перед замером."""
+    def prepare(client, iteration):
+        job = Job.objects.enqueue('render_notes', user)
+        return reverse('notes:job', kwargs={'pk': job.pk}), {}
+    return prepare
+
+
+def typed_prefix(word):
+    """Подсказка по первым буквам слова, как при наборе."""
+    def prepare(client, iteration):
+        return reverse('notes:autocomplete'), {'data': {'q': word[:3]}}
+    return prepare
+
+
+def build_cases(user):
+    """Замеры для всех маршрутов от имени user и его заметки."""
+    note = Note.objects.for_author(user).order_by('id').first()
+    slug = {'slug': note.slug}
+    word = note.title.split()[0]
+
+    def url(route, **kwargs):
+        return lambda client, iteration: (reverse(route, kwargs=kwargs), {})
+
+    def new_note(client, iteration):
+        return reverse('notes:add'), {'data': {
+            'title': f'{note.title} {iteration}', 'text': note.text,
+        }}
+
+    def edit_note(client, iteration):
+        return reverse('notes:edit', kwargs=slug), {'data': {
+            'title': note.title, 'text': note.text, 'slug': note.slug,
+        }}
+
+    def delete_note(client, iteration):
+        victim = Note.objects.create(author=user, title=note.title,
+                                     text=note.text)
+        return reverse('notes:delete', kwargs={'slug': victim.slug}), {}
+
+    def search(client, iteration):
+        return reverse('notes:search'), {'data': {'q': word}}
+
+    def login(client, iteration):
+        client.logout()
+        return reverse('users:login'), {'data': {
+            'username': user.username, 'password': PASSWORD,
+        }}
+
+    def logout(client, iteration):
+        client.force_login(user)
+        return reverse('users:logout'), {}
+
+    def signup(client, iteration):
+        return reverse('users:signup'), {'data': {
+            'username': f'bench-signup-{iteration}',
+            'password1': PASSWORD, 'password2': PASSWORD,
+        }}
+
+    def batch(client, iteration):
+        operations = [{'op': 'update', 'slug': note.slug,
+                       'fields': {'text': f'{note.text} {iteration}'}}]
+        return reverse('api:batch'), {
+            'data': json.dumps({'operations': operations}),
+            'content_type': 'application/json',
+        }
+
+    return [
+        Case('notes:home'),
+        Case('notes:list'),
+        Case('notes:detail', prepare=url('notes:detail', **slug)),
+        Case('notes:add'),
+        Case('notes:add', 'post', new_note, status=HTTPStatus.FOUND),
+        Case('notes:edit', prepare=url('notes:edit', **slug)),
+        Case('notes:edit', 'post', edit_note, status=HTTPStatus.FOUND),
+        Case('notes:delete', prepare=url('notes:delete', **slug)),
+        Case('notes:delete', 'post', delete_note, status=HTTPStatus.FOUND),
+        Case('notes:success'),
+        Case('notes:search', prepare=search),
+        Case('notes:autocomplete', prepare=typed_prefix(word)),
+        Case('notes:archive'),
+        Case('notes:attach', prepare=url('notes:attach', **slug)),
+        Case('notes:attach', 'post', upload_to(note),
+             status=HTTPStatus.FOUND),
+        Case('notes:attachment',
+             prepare=with_attachment(note, 'notes:attachment')),
+        Case('notes:attachment_delete', 'post',
+             with_attachment(note, 'notes:attachment_delete'),
+             status=HTTPStatus.FOUND),
+        Case('notes:jobs'),
+        Case('notes:job_add', 'post', new_job, status=HTTPStatus.FOUND),
+        Case('notes:job', prepare=queued_job(user)),
+        Case('notes:cache_metrics'),
+        Case('notes:request_metrics'),
+        Case('api:batch', 'post', batch),
+        Case('api:changes'),
+        Case('users:login', anonymous=True),
+        Case('users:login', 'post', login, anonymous=True,
+             status=HTTPStatus.FOUND),
+        Case('users:logout', prepare=logout),
+        Case('users:signup', anonymous=True),
+        Case('users:signup', 'post', signup, anonymous=True,
+             status=HTTPStatus.FOUND),
+        Case('admin:index'),
+        Case('admin:notes_note_changelist'),
+        Case('admin:notes_note_change',
+             prepare=url('admin:notes_note_change', object_id=note.pk)),
+    ]
+
+
+def measure(case, client, iterations, warmup=1, cold_cache=True):
+    """Время в миллисекундах и число запросов для каждой итерации."""
+    timings = []
+    queries = []
+    statuses = set()
+    errors = 0
+    for iteration in range(warmup + iterations):
+        path, kwargs = case.prepare(client, iteration)
+        if cold_cache:
+            cache.get_cache().clear()
+        request = getattr(client, case.method)
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = request(path, **kwargs)
+            if response.streaming:
+                # Потоковый ответ строится, пока его читают.
+                for _ in response.streaming_content:
+                    pass
+            elapsed = time.perf_counter() - started
+        if iteration < warmup:
+            continue
+        timings.append(elapsed * 1000)
+        queries.append(len(captured))
+        statuses.add(response.status_code)
+        errors += response.status_code != case.status
+    return timings, queries, statuses, errors
+
+
+def summarize(timings, queries, statuses, errors):
+    result = {
+        f'p{percent}_ms': round(percentile(timings, percent), 3)
+        for percent in PERCENTILES
+    }
+    result.update(
+        mean_ms=round(statistics.fmean(timings), 3),
+        max_ms=round(max(timings), 3),
+        queries=statistics.median_low(queries),
+        max_queries=max(queries),
+        statuses=sorted(statuses),
+        errors=errors,
+    )
+    return result
+
+
+def run_cases(user, cases, iterations, warmup=1, cold_cache=True):
+    """Прогоняет замеры и возвращает словарь «метод маршрут» → сводка."""
+    results = {}
+    for case in cases:
+        client = Client()
+        if not case.anonymous:
+            client.force_login(user)
+        results[case.label] = summarize(
+            *measure(case, client, iterations, warmup, cold_cache)
+        )
+    return results
+
+
+def measure_compression(user, sizes=COMPRESSION_SIZES, iterations=20,
+                        seed=0):
+    """Объём хранения и время чтения текста без сжатия и со сжатием.
+
+    Для каждого размера лог записывается дважды: с отключённым сжатием
+    и со сжатием любого текста, который от него становится короче.
+    Чтение замеряется через ORM и страницей заметки с холодным кешем.
+    """
+    rng = random.Random(seed)
+    client = Client()
+    client.force_login(user)
+    results = []
+    for size in sizes:
+        text = make_log(rng, size)
+        for mode, threshold in (('plain', 0), ('zlib', 1)):
+            with override_settings(
+                    NOTES_TEXT_COMPRESSION_THRESHOLD=threshold):
+                note = Note.objects.create(
+                    author=user, title=f'Лог {size} {mode}', text=text,
+                )
+            stored = len(compression.encode(text, threshold))
+            reads = []
+            pages = []
+            url = reverse('notes:detail', kwargs={'slug': note.slug})
+            for _ in range(iterations):
+                started = time.perf_counter()
+                Note.objects.for_author(user).get(pk=note.pk).text
+                reads.append((time.perf_counter() - started) * 1000)
+                cache.get_cache().clear()
+                started = time.perf_counter()
+                client.get(url)
+                pages.append((time.perf_counter() - started) * 1000)
+            results.append({
+                'bytes': len(text.encode()),
+                'mode': mode,
+                'stored_bytes': stored,
+                'ratio': round(stored / len(text.encode()), 3),
+                'read_p50_ms': round(percentile(reads, 50), 3),
+                'read_p95_ms': round(percentile(reads, 95), 3),
+                'page_p50_ms': round(percentile(pages, 50), 3),
+            })
+            note.delete()
+    return results
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(**options):
+    return {
+        'revision': revision(),
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'machine': platform.machine(),
+        **options,
+    }
+
+
+def load(path):
+    return json.loads(Path(path).read_text(encoding='utf-8'))
+
+
+def compare(old, new):
+    """Строки (набор, замер, p50 было, p50 стало, запросов было, стало)."""
+    old_sizes = {run['size']: run['routes'] for run in old['runs']}
+    for run in new['runs']:
+        old_routes = old_sizes.get(run['size'], {})
+        for label, result in run['routes'].items():
+            before = old_routes.get(label)
+            if before is None:
+                continue
+            yield (run['size'], label, before['p50_ms'], result['p50_ms'],
+                   before['queries'], result['queries'])
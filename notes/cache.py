@@ -0,0 +1,154 @@
+"""Кеш отрисованных страниц заметок для каждого пользователя.
+
+У каждого автора в кеше есть токен версии, и ключ страницы включает
+этот токен. Любое изменение заметок автора записывает новый токен,
+после чего все его страницы становятся недостижимыми и вытесняются
+бэкендом кеша сами. Токен случайный, поэтому даже если бэкенд вытеснит
+сам токен, старые страницы не вернутся.
+
+Сброс токена виден всем процессам только в общем кеше ('file').
+В кеше процесса ('locmem') токен истекает через
+NOTES_CACHE_VERSION_TIMEOUT секунд, чем и ограничено время, пока
+другие процессы отдают устаревшие страницы.
+
+Здесь же кешируется статистика заметок автора (см. stats.py); её ключ
+не зависит от токена и сбрасывается при изменении самой статистики.
+"""
+import threading
+import uuid
+from collections import Counter
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+HIT = 'hit'
+MISS = 'miss'
+# Заголовки, которые сохраняются вместе со страницей.
+STORED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[settings.NOTES_CACHE_ALIAS]
+
+
+def version_key(author_id):
+    return f'notes:version:{author_id}'
+
+
+def get_version(author_id):
+    cache = get_cache()
+    key = version_key(author_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex,
+                  timeout=settings.NOTES_CACHE_VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_authors(author_ids):
+    """Сбрасывает закешированные страницы перечисленных авторов."""
+    get_cache().set_many(
+        {version_key(author_id): uuid.uuid4().hex
+         for author_id in author_ids if author_id is not None},
+        timeout=settings.NOTES_CACHE_VERSION_TIMEOUT,
+    )
+
+
+def stats_key(author_id):
+    return f'notes:stats:{author_id}'
+
+
+def invalidate_stats(author_ids, using=None):
+    """Сбрасывает закешированную статистику заметок авторов.
+
+    Сразу и ещё раз после коммита: иначе параллельный запрос мог бы
+    положить в кеш статистику, прочитанную до коммита.
+    """
+    keys = [stats_key(author_id) for author_id in author_ids]
+    if not keys:
+        return
+    get_cache().delete_many(keys)
+    transaction.on_commit(lambda: get_cache().delete_many(keys),
+                          using=using)
+
+
+def page_key(request, view_name):
+    version = get_version(request.user.pk)
+    return (f'notes:page:{request.user.pk}:{version}:{view_name}:'
+            f'{request.get_full_path()}')
+
+
+def record(view_name, result):
+    with _stats_lock:
+        _stats[view_name, result] += 1
+
+
+def get_stats():
+    """Счётчики попаданий и промахов с момента запуска процесса."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class UserPageCacheMixin:
+    """Кеширует GET-ответ представления отдельно для каждого автора.
+
+    Подмешивается после NoteBase, чтобы проверка авторизации
+    выполнялась до обращения к кешу. Вместе со страницей хранятся
+    её валидаторы, поэтому условный запрос к закешированной странице
+    получает 304 без обращения к базе. Страницы с формами, в которых
+    выведен токен CSRF, не кешируются.
+    """
+    cache_name = None
+
+    def get(self, request, *args, **kwargs):
+        view_name = self.cache_name or type(self).__name__
+        cache = get_cache()
+        key = page_key(request, view_name)
+        entry = cache.get(key)
+        if entry is not None:
+            record(view_name, HIT)
+            content, headers = entry
+            response = HttpResponse(content)
+            for header, value in headers.items():
+                response[header] = value
+            return get_conditional_response(
+                request,
+                etag=response.get('ETag'),
+                last_modified=parse_http_date_safe(
+                    response.get('Last-Modified')
+                ),
+                response=response,
+            )
+        record(view_name, MISS)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code != HTTPStatus.OK:
+            return response
+
+        def store(rendered):
+            # Токен CSRF выдан этой сессии вместе с cookie: из кеша
+            # страница досталась бы другой сессии с чужим токеном
+            # и без cookie, и её формы не прошли бы проверку.
+            if request.META.get('CSRF_COOKIE_USED'):
+                return
+            headers = {
+                header: rendered[header]
+                for header in STORED_HEADERS if rendered.has_header(header)
+            }
+            cache.set(key, (rendered.content, headers))
+
+        response.add_post_render_callback(store)
+        return response
@@ -0,0 +1,108 @@
+"""Сжатое хранение длинного текста заметок.
+
+Текст хранится в двоичной колонке: первый байт — флаг строки (PLAIN
+или ZLIB), дальше UTF-8 или сжатый zlib UTF-8. Сжимается только текст
+длиннее NOTES_TEXT_COMPRESSION_THRESHOLD байт и только если сжатие
+действительно экономит место. Строки, оставшиеся текстом после смены
+типа колонки, читаются как есть; команда compress_notes переписывает
+их пачками.
+
+Для форм, шаблонов, админки и поиска поле выглядит обычным TextField.
+Условия filter() по тексту сжатые строки не находят.
+"""
+import zlib
+
+from django.conf import settings
+from django.db import connections, models, transaction
+
+PLAIN = b'\x00'
+ZLIB = b'\x01'
+LEVEL = 6
+
+
+def encode(text, threshold=None):
+    """Текст в байты для колонки: сжатые, если так короче."""
+    if threshold is None:
+        threshold = settings.NOTES_TEXT_COMPRESSION_THRESHOLD
+    data = text.encode()
+    if threshold and len(data) > threshold:
+        compressed = zlib.compress(data, LEVEL)
+        if len(compressed) < len(data):
+            return ZLIB + compressed
+    return PLAIN + data
+
+
+def decode(value):
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    flag, data = value[:1], value[1:]
+    if flag == ZLIB:
+        data = zlib.decompress(data)
+    elif flag != PLAIN:
+        raise ValueError(f'Неизвестный формат текста: {flag!r}')
+    return data.decode()
+
+
+def stored_size(value):
+    """Сколько байт занимает значение колонки."""
+    if isinstance(value, str):
+        return len(value.encode())
+    return len(value)
+
+
+class CompressedTextField(models.TextField):
+    """TextField, который хранит длинный текст сжатым."""
+
+    def get_internal_type(self):
+        return 'BinaryField'
+
+    def from_db_value(self, value, expression, connection):
+        return decode(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        # prepared=True приходит из условий filter(): их значения
+        # сравниваются с колонкой как есть.
+        if prepared or value is None:
+            return value
+        value = self.get_prep_value(value)
+        return connection.Database.Binary(encode(value))
+
+
+def compress_rows(model, batch_size, using):
+    """Переписывает текст заметок базы using в текущем формате.
+
+    Строки читаются пачками по id, переписываются только те, чьё
+    хранимое значение меняется; updated и лента изменений не трогаются.
+    Возвращает генератор троек (обработано, байт до, байт после)
+    с нарастающим итогом.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    column = model._meta.get_field('text').column
+    last_id = 0
+    done = before = after = 0
+    while True:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT id, {column} FROM {table} WHERE id > %s '
+                'ORDER BY id LIMIT %s',
+                (last_id, batch_size),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            updates = []
+            for note_id, value in rows:
+                stored = encode(decode(value))
+                before += stored_size(value)
+                after += len(stored)
+                if isinstance(value, str) or bytes(value) != stored:
+                    updates.append((connection.Database.Binary(stored),
+                                    note_id))
+            cursor.executemany(
+                f'UPDATE {table} SET {column} = %s WHERE id = %s', updates
+            )
+        last_id = rows[-1][0]
+        done += len(rows)
+        yield done, before, after
@@ -0,0 +1,40 @@
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def is_conditional(request):
+    """Есть ли у запроса валидаторы клиентской копии."""
+    return ('HTTP_IF_NONE_MATCH' in request.META
+            or 'HTTP_IF_MODIFIED_SINCE' in request.META)
+
+
+class ConditionalGetMixin:
+    """Отвечает 304 на If-None-Match/If-Modified-Since без отрисовки.
+
+    Валидаторы считаются в get_validators() лёгким запросом, который
+    не загружает текст заметок; страница отрисовывается, только если
+    клиентская копия устарела.
+    """
+
+    def get_validators(self):
+        """Возвращает пару (etag, last_modified), любой элемент — None."""
+        return None, None
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        if etag is not None:
+            etag = quote_etag(etag)
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if etag is not None:
+            response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # Страницы заметок личные: общим кешам хранить их нельзя.
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,18 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import stats
+
+
+def note_stats(request):
+    """Статистика заметок пользователя для шапки и списка.
+
+    Загружается, только если шаблон её выводит; из кеша — без
+    запросов к базе.
+    """
+    def load():
+        user = request.user
+        if not user.is_authenticated:
+            return None
+        return stats.get_stats(user.pk)
+
+    return {'note_stats': SimpleLazyObject(load)}
@@ -0,0 +1,60 @@
+"""Ограниченный пул потоков для работы с базой из асинхронного кода.
+
+В Django 3.2 ORM только синхронный, а sync_to_async по умолчанию
+(thread_sensitive) выполняет весь синхронный код процесса в одном
+потоке — под нагрузкой запросы ждут друг друга. Здесь он выполняется
+в пуле из NOTES_ASYNC_DB_THREADS потоков: одновременных обращений
+к базе не больше, чем потоков, остальные ждут в очереди, не занимая
+цикл событий.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import instrumentation
+
+THREAD_NAME_PREFIX = 'notes-db'
+
+_lock = threading.Lock()
+_executor = None
+_size = None
+
+
+def get_executor():
+    """Пул по настройке; при её смене создаётся новый."""
+    global _executor, _size
+    size = settings.NOTES_ASYNC_DB_THREADS
+    with _lock:
+        if _executor is None or _size != size:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(
+                max_workers=size, thread_name_prefix=THREAD_NAME_PREFIX,
+            )
+            _size = size
+        return _executor
+
+
+def call(function, *args, **kwargs):
+    """Вызов в потоке пула.
+
+    Соединения потоков пула живут по CONN_MAX_AGE, как соединения
+    потоков WSGI-сервера между запросами. Их SQL попадает в замеры
+    запроса, если включён NOTES_PERF_ENABLED.
+    """
+    close_old_connections()
+    try:
+        with instrumentation.measure_queries():
+            return function(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run(function, *args, **kwargs):
+    """Выполняет синхронную function в пуле и ждёт результат."""
+    return await sync_to_async(
+        call, thread_sensitive=False, executor=get_executor(),
+    )(function, *args, **kwargs)
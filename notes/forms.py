@@ -1,8 +1,7 @@
-from pytils.translit import slugify
-
 from django import forms
 from django.core.exceptions import ValidationError
 
+from . import jobs, shards, tags
 from .models import Note
 
 WARNING = ' - такой slug уже существует, придумайте уникальное значение!'
@@ -10,20 +9,92 @@ WARNING = ' - такой slug уже существует, придумайте
 
 class NoteForm(forms.ModelForm):
     """Форма для создания или обновления заметки."""
+    tags = forms.CharField(
+        label='Теги', required=False, max_length=1000,
+        help_text='Через запятую, например: работа, покупки',
+    )
 
     class Meta:
         model = Note
         fields = ('title', 'text', 'slug')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Заполненной форме (API, пакетные операции) теги не читаются.
+        if not self.is_bound and 'tags' not in self.initial:
+            self.initial['tags'] = ', '.join(
+                tags.note_tag_names(self.instance)
+            )
+
+    def clean_tags(self):
+        names = tags.parse(self.cleaned_data['tags'])
+        if len(names) > tags.MAX_TAGS:
+            raise ValidationError(
+                f'Не больше {tags.MAX_TAGS} тегов у одной заметки.'
+            )
+        for name in names:
+            if len(name) > tags.MAX_LENGTH:
+                raise ValidationError(
+                    f'Тег «{name}» длиннее {tags.MAX_LENGTH} символов.'
+                )
+        return names
+
     def clean_slug(self):
-        """Обрабатывает случай, если slug не уникален."""
+        """Обрабатывает случай, если slug не уникален.
+
+        Пустой slug подбирается по заголовку с суффиксом -2, -3, ...,
+        а занятый slug, указанный явно, отклоняется.
+        """
         cleaned_data = super().clean()
         slug = cleaned_data.get('slug')
+        notes = self.get_shard_queryset()
         if not slug:
-            title = cleaned_data.get('title')
-            slug = slugify(title)[:100]
-        if Note.objects.filter(
-                slug=slug
-        ).exclude(id=self.instance.pk).exists():
+            return notes.allocate_slug(cleaned_data.get('title'),
+                                       self.instance.pk)
+        if notes.slug_exists(slug, self.instance.pk):
             raise ValidationError(slug + WARNING)
         return slug
+
+    def get_shard_queryset(self):
+        """Заметки шарда, в котором лежит редактируемая заметка.
+
+        Slug проверяется во всех шардах, а сама заметка исключается
+        из проверки только в своём.
+        """
+        if self.instance._state.db is None:
+            return Note.objects.all()
+        return Note.objects.using(
+            shards.primary_for(self.instance._state.db)
+        )
+
+    def validate_unique(self):
+        """Уникальность slug уже проверена в clean_slug."""
+        exclude = set(self._get_validation_exclusions()) | {'slug'}
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except ValidationError as error:
+            self._update_errors(error)
+
+    def _save_m2m(self):
+        """Теги меняются, только если поле было в запросе.
+
+        Так API и админка, которые тегов не передают, их не стирают.
+        """
+        super()._save_m2m()
+        if 'tags' in self.data:
+            tags.set_tags(self.instance, self.cleaned_data['tags'])
+
+    def slug_taken(self):
+        """Сообщает об ошибке, если slug заняли после проверки формы."""
+        slug = self.instance.slug
+        self.add_error('slug', slug + WARNING)
+
+
+class AttachmentForm(forms.Form):
+    """Форма загрузки вложения."""
+    file = forms.FileField(label='Файл')
+
+
+class JobForm(forms.Form):
+    """Запуск фоновой задачи над своими заметками."""
+    name = forms.ChoiceField(label='Задача', choices=jobs.public_choices)
@@ -0,0 +1,213 @@
+"""Замеры времени запросов: SQL, шаблоны, представление.
+
+Middleware подключается в MIDDLEWARE, но работает, только если
+NOTES_PERF_ENABLED включён: иначе оно отказывается от участия
+при запуске и не добавляет к запросу ни одного вызова.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+# Верхние границы корзин гистограмм в миллисекундах.
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+METRICS = ('db', 'tpl', 'view', 'total')
+UNRESOLVED = '<unresolved>'
+
+# Замеры текущего запроса. Копии контекста указывают на тот же объект,
+# так что запросы из потоков executor считаются в них же.
+_timings = contextvars.ContextVar('notes_perf_timings', default=None)
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными корзинами."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value_ms):
+        self.counts[bisect_left(BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.sum += value_ms
+
+    def cumulative(self):
+        """Пары (граница, число наблюдений не больше неё)."""
+        total = 0
+        for bound, count in zip(BUCKETS_MS + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    """Гистограммы по имени маршрута и метрике, общие для процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.queries = {}
+
+    def observe(self, route, timings, query_count):
+        with self.lock:
+            for metric, value_ms in timings.items():
+                histogram = self.histograms.get((route, metric))
+                if histogram is None:
+                    histogram = self.histograms[route, metric] = Histogram()
+                histogram.observe(value_ms)
+            self.queries[route] = self.queries.get(route, 0) + query_count
+
+    def snapshot(self):
+        with self.lock:
+            return (
+                {key: (list(histogram.cumulative()), histogram.count,
+                       histogram.sum)
+                 for key, histogram in self.histograms.items()},
+                dict(self.queries),
+            )
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.queries.clear()
+
+    def prometheus(self):
+        """Гистограммы в текстовом формате Prometheus."""
+        histograms, queries = self.snapshot()
+        lines = [
+            '# HELP notes_request_duration_ms Request phase duration.',
+            '# TYPE notes_request_duration_ms histogram',
+        ]
+        for (route, metric), (buckets, count, total) in sorted(
+                histograms.items()):
+            labels = f'route="{route}",phase="{metric}"'
+            for bound, cumulative in buckets:
+                lines.append(
+                    f'notes_request_duration_ms_bucket{{{labels},'
+                    f'le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'notes_request_duration_ms_sum{{{labels}}} '
+                         f'{total:.3f}')
+            lines.append(f'notes_request_duration_ms_count{{{labels}}} '
+                         f'{count}')
+        lines += [
+            '# HELP notes_request_queries_total SQL queries per route.',
+            '# TYPE notes_request_queries_total counter',
+        ]
+        for route, count in sorted(queries.items()):
+            lines.append(
+                f'notes_request_queries_total{{route="{route}"}} {count}'
+            )
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class QueryTimer:
+    """Обёртка execute_wrapper: считает SQL-запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+class RequestTimings:
+    def __init__(self):
+        self.queries = QueryTimer()
+        self.view_started = None
+        self.view_seconds = 0.0
+        self.render_started = None
+        self.render_seconds = 0.0
+
+
+@contextmanager
+def measure_queries():
+    """Считает SQL соединений этого потока в замерах текущего запроса.
+
+    Обёртки ставятся на соединения потока, поэтому в потоке пула
+    (см. executor.call) их нужно поставить заново.
+    """
+    timings = _timings.get()
+    with ExitStack() as stack:
+        if timings is not None:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(timings.queries)
+                )
+        yield
+
+
+class PerformanceMiddleware:
+    """Заголовок Server-Timing и гистограммы по именам маршрутов."""
+
+    def __init__(self, get_response):
+        if not settings.NOTES_PERF_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = request._perf_timings = RequestTimings()
+        started = time.perf_counter()
+        token = _timings.set(timings)
+        try:
+            with measure_queries():
+                response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        finished = time.perf_counter()
+        total = finished - started
+        if timings.view_started is not None and timings.render_started is None:
+            # Ответ без шаблона: представление работало до этого момента.
+            timings.view_seconds = finished - timings.view_started
+        durations = {
+            'db': timings.queries.seconds * 1000,
+            'tpl': timings.render_seconds * 1000,
+            'view': timings.view_seconds * 1000,
+            'total': total * 1000,
+        }
+        match = request.resolver_match
+        route = match.view_name if match else UNRESOLVED
+        registry.observe(route, durations, timings.queries.count)
+        response['Server-Timing'] = ', '.join(
+            f'{metric};dur={durations[metric]:.2f};'
+            f'desc="{self.describe(metric, timings)}"'
+            for metric in METRICS
+        )
+        return response
+
+    @staticmethod
+    def describe(metric, timings):
+        if metric == 'db':
+            return f'{timings.queries.count} SQL'
+        return metric
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._perf_timings.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        timings = request._perf_timings
+        now = time.perf_counter()
+        if timings.view_started is not None:
+            timings.view_seconds = now - timings.view_started
+        timings.render_started = now
+
+        def finish_render(rendered):
+            timings.render_seconds = (time.perf_counter()
+                                      - timings.render_started)
+
+        response.add_post_render_callback(finish_render)
+        return response
@@ -0,0 +1,264 @@
+"""Фоновые задачи: реестр, исполнение и раздача пулу процессов.
+
+Очередь — модель Job в default, никаких брокеров: достаточно одной
+машины и SQLite. Задача — функция (см. tasks.py), зарегистрированная
+через register(); она получает Job, сообщает прогресс через
+job.report() и возвращает результат, который можно записать в JSON.
+
+manage.py run_workers (run_workers() ниже) берёт задачи из очереди
+по приоритету и отдаёт их пулу процессов, сам же следит за ними:
+продлевает heartbeat выполняемых задач, повторяет проваленные и
+возвращает в очередь задачи исполнителя, который перестал отвечать.
+Исход попытки записывается, только пока задача за ней (см. claimed()).
+
+Модуль импортируется в процессах пула до django.setup(), поэтому
+модели здесь берутся через apps.get_model().
+"""
+import os
+import signal
+import socket
+import threading
+import traceback
+from collections import Counter, namedtuple
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from multiprocessing import get_context
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+Task = namedtuple('Task', 'name title function public')
+
+# Зарегистрированные задачи по имени.
+TASKS = {}
+
+STALE_ERROR = 'Исполнитель перестал отвечать.'
+# Исход попытки, у которой задачу забрали как зависшую.
+LOST = 'lost'
+
+
+def register(name, title, public=False):
+    """Регистрирует функцию задачи; public — её запускает пользователь."""
+    def decorator(function):
+        TASKS[name] = Task(name, title, function, public)
+        return function
+    return decorator
+
+
+def public_choices():
+    return [(task.name, task.title) for task in TASKS.values()
+            if task.public]
+
+
+def job_model():
+    return apps.get_model('notes', 'Job')
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def retry_delay(attempts):
+    """Задержка перед повтором: удваивается с каждой попыткой."""
+    return timedelta(
+        seconds=settings.NOTES_JOB_RETRY_DELAY * 2 ** max(attempts - 1, 0)
+    )
+
+
+def claimed(job_id, worker, attempts):
+    """Задача, пока она за попыткой attempts исполнителя worker.
+
+    Зависшую задачу могли вернуть в очередь и забрать снова: переходы
+    прежней попытки тогда не меняют ни одной строки.
+    """
+    model = job_model()
+    return model.objects.filter(pk=job_id, status=model.RUNNING,
+                                worker=worker, attempts=attempts)
+
+
+def fail(job_id, worker, attempts, error):
+    """Проваленная попытка: повтор позже или окончательная ошибка.
+
+    Возвращает новое состояние задачи или LOST, если попытка её
+    уже потеряла.
+    """
+    model = job_model()
+    claim = claimed(job_id, worker, attempts)
+    now = timezone.now()
+    if claim.filter(max_attempts__gt=attempts).update(
+        status=model.QUEUED, run_after=now + retry_delay(attempts),
+        error=error, worker='',
+    ):
+        return model.QUEUED
+    if claim.update(status=model.FAILED, error=error, finished=now):
+        return model.FAILED
+    return LOST
+
+
+def release(job_id, worker, attempts):
+    """Возвращает задачу в очередь, не засчитывая попытку."""
+    model = job_model()
+    if claimed(job_id, worker, attempts).update(
+        status=model.QUEUED, attempts=F('attempts') - 1,
+        run_after=timezone.now(), worker='',
+    ):
+        return model.QUEUED
+    return LOST
+
+
+def execute(job_id, worker, attempts):
+    """Выполняет попытку attempts задачи, забранной исполнителем worker.
+
+    Вызывается в процессе пула. Возвращает новое состояние задачи
+    или LOST, если попытка её потеряла.
+    """
+    model = job_model()
+    close_old_connections()
+    try:
+        job = claimed(job_id, worker, attempts).first()
+        if job is None:
+            return LOST
+        try:
+            result = TASKS[job.name].function(job)
+        except Exception:
+            return fail(job_id, worker, attempts, traceback.format_exc())
+        if claimed(job_id, worker, attempts).update(
+            status=model.DONE, result=result, error='',
+            finished=timezone.now(),
+        ):
+            return model.DONE
+        return LOST
+    finally:
+        close_old_connections()
+
+
+def init_worker():
+    """Запуск процесса пула: Ctrl+C обрабатывает только run_workers."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    django.setup()
+
+
+def new_pool(processes):
+    # spawn, а не fork: копия открытого соединения SQLite в дочернем
+    # процессе может повредить базу.
+    return futures.ProcessPoolExecutor(
+        processes, mp_context=get_context('spawn'), initializer=init_worker,
+    )
+
+
+class Supervisor:
+    """Раздаёт задачи из очереди пулу из processes процессов.
+
+    Сам задачи не выполняет: продлевает heartbeat выполняемых,
+    записывает исход попыток и заменяет пул, если его процесс убит.
+    """
+
+    def __init__(self, processes, log=None):
+        self.processes = processes
+        self.log = log
+        self.worker = worker_name()
+        self.finished = Counter()
+        # Будущее попытки: (id задачи, номер попытки).
+        self.running = {}
+        # Задачи, бывшие в сломанном пуле: какая из них убила процесс,
+        # неизвестно, поэтому до их завершения задачи идут по одной.
+        self.suspects = set()
+
+    def record(self, job_id, status):
+        self.finished[status] += 1
+        if status != job_model().QUEUED:
+            self.suspects.discard(job_id)
+        if self.log is not None:
+            self.log(job_id, status)
+
+    def requeue_stale(self):
+        stale = job_model().objects.stale().values_list('pk', 'worker',
+                                                        'attempts')
+        for job_id, worker, attempts in stale:
+            self.record(job_id, fail(job_id, worker, attempts, STALE_ERROR))
+
+    def submit(self, pool):
+        """Забирает задачи, пока есть свободные процессы."""
+        model = job_model()
+        if self.suspects and not self.running:
+            # Подозреваемых, которых забрал другой исполнитель, не ждём.
+            self.suspects = set(model.objects.filter(
+                pk__in=self.suspects, status=model.QUEUED,
+            ).values_list('pk', flat=True))
+        limit = 1 if self.suspects else self.processes
+        while len(self.running) < limit:
+            job = model.objects.claim(self.worker)
+            if job is None:
+                return
+            future = pool.submit(execute, job.pk, self.worker, job.attempts)
+            self.running[future] = (job.pk, job.attempts)
+
+    def collect(self, timeout):
+        """Ждёт завершения задач; True — пул сломан и нужен новый."""
+        model = job_model()
+        model.objects.filter(
+            pk__in=[job_id for job_id, _ in self.running.values()],
+            status=model.RUNNING, worker=self.worker,
+        ).update(heartbeat=timezone.now())
+        done, _ = futures.wait(self.running, timeout=timeout,
+                               return_when=futures.FIRST_COMPLETED)
+        if any(isinstance(future.exception(), BrokenProcessPool)
+               for future in done):
+            # Сломанный пул завершает все свои будущие.
+            done, _ = futures.wait(self.running)
+        broken = [future for future in done
+                  if isinstance(future.exception(), BrokenProcessPool)]
+        for future in done:
+            job_id, attempts = self.running.pop(future)
+            try:
+                status = future.result()
+            except BrokenProcessPool:
+                if len(broken) > 1:
+                    # Процесс пула убит (например, нехваткой памяти),
+                    # но на какой задаче — неизвестно: попытка
+                    # не засчитывается, задачи повторяются по одной.
+                    self.suspects.add(job_id)
+                    status = release(job_id, self.worker, attempts)
+                else:
+                    status = fail(job_id, self.worker, attempts,
+                                  traceback.format_exc())
+            except Exception:
+                status = fail(job_id, self.worker, attempts,
+                              traceback.format_exc())
+            self.record(job_id, status)
+        return bool(broken)
+
+    def run(self, burst, stop):
+        poll_interval = settings.NOTES_JOB_POLL_INTERVAL
+        pool = new_pool(self.processes)
+        try:
+            while True:
+                self.requeue_stale()
+                if not stop.is_set():
+                    self.submit(pool)
+                if not self.running:
+                    if burst or stop.is_set():
+                        break
+                    stop.wait(poll_interval)
+                elif self.collect(poll_interval):
+                    pool.shutdown(wait=False)
+                    pool = new_pool(self.processes)
+        finally:
+            pool.shutdown(wait=True)
+        return self.finished
+
+
+def run_workers(processes, burst=False, stop=None, log=None):
+    """Выполняет задачи из очереди на пуле из processes процессов.
+
+    burst — выйти, когда очередь опустеет; иначе работать до stop
+    (threading.Event). Выполняемые задачи при остановке дорабатывают.
+    log(id задачи, состояние) вызывается по завершении каждой попытки.
+    Возвращает Counter состояний задач после попыток.
+    """
+    return Supervisor(processes, log).run(burst, stop or threading.Event())
@@ -0,0 +1,501 @@
+"""Сквозная нагрузка на приложение многими одновременными пользователями.
+
+Каждый виртуальный пользователь — отдельный поток со своими cookie:
+он регистрируется, входит, создаёт несколько заметок и затем делает
+requests запросов, выбирая маршрут из смеси MIX по весам. Запросы идут
+через настоящий стек приложения — middleware, CSRF, сессии — одним
+из способов (TARGETS):
+
+- wsgi — вызов yanote.wsgi.application в процессе, как его вызывал бы
+  многопоточный WSGI-сервер;
+- asgi — вызов yanote.asgi.application в цикле событий отдельного
+  потока, как его вызывал бы ASGI-сервер;
+- http — WSGI-приложение на локальном порту (ThreadedWSGIServer
+  из runserver) и запросы по HTTP; так же можно нагрузить и уже
+  запущенный сервер по его адресу.
+
+Итог по каждому маршруту — число запросов в секунду, перцентили
+задержки и доля ошибок: ответ с неожиданным статусом или исключение.
+
+Медленные клиенты (delay) для wsgi и asgi: ответ каждому уходит
+с задержкой. WSGI-сервер с workers потоками всё это время держит
+поток, ASGI-сервер только ждёт в цикле событий — так сравниваются
+синхронные страницы под WSGI и асинхронные под ASGI при большом
+числе одновременных пользователей.
+"""
+import asyncio
+import contextlib
+import io
+import random
+import sys
+import threading
+import time
+from http import HTTPStatus
+from http.client import HTTPConnection
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.servers.basehttp import (ThreadedWSGIServer,
+                                          WSGIRequestHandler)
+from django.db import connections
+from django.urls import reverse
+
+from .benchmark import PASSWORD, percentile
+
+WSGI = 'wsgi'
+ASGI = 'asgi'
+HTTP = 'http'
+TARGETS = (WSGI, ASGI, HTTP)
+HOST = 'testserver'
+# Смесь маршрутов по умолчанию: веса примерно как у живого трафика,
+# где заметки читают чаще, чем пишут.
+MIX = {
+    'login': 1,
+    'list': 6,
+    'detail': 8,
+    'create': 2,
+    'edit': 2,
+    'delete': 1,
+}
+ROUTES = tuple(MIX)
+# Сколько заметок пользователь создаёт до замеров.
+NOTES_PER_USER = 5
+PERCENTILES = (50, 95, 99)
+
+
+def parse_mix(value):
+    """Смесь из строки вида «list=5,detail=10»; остальные веса — 0."""
+    mix = dict.fromkeys(ROUTES, 0)
+    for item in value.split(','):
+        route, _, weight = item.partition('=')
+        route = route.strip()
+        if route not in mix or not weight.strip().isdigit():
+            raise ValueError(item)
+        mix[route] = int(weight)
+    if not any(mix.values()):
+        raise ValueError(value)
+    return mix
+
+
+class Response:
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def header(self, name):
+        name = name.lower()
+        return [value for key, value in self.headers if key.lower() == name]
+
+
+class WsgiTransport:
+    """Запросы к WSGI-приложению напрямую, без сокетов.
+
+    workers — сколько запросов обслуживается одновременно, как потоков
+    у WSGI-сервера (None — без ограничения). Поток занят и на время
+    отдачи ответа медленному клиенту (delay секунд).
+    """
+
+    def __init__(self, application, workers=None, delay=0):
+        self.application = application
+        self.delay = delay
+        self.workers = contextlib.nullcontext()
+        if workers:
+            self.workers = threading.BoundedSemaphore(workers)
+
+    def send(self, method, path, headers, body):
+        path, _, query = path.partition('?')
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': HOST,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in headers.items():
+            key = name.upper().replace('-', '_')
+            if key != 'CONTENT_TYPE':
+                key = f'HTTP_{key}'
+            environ[key] = value
+        started = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            started['status'] = int(status.split()[0])
+            started['headers'] = response_headers
+
+        with self.workers:
+            result = self.application(environ, start_response)
+            try:
+                content = b''.join(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+            if self.delay:
+                time.sleep(self.delay)
+        return Response(started['status'], started['headers'], content)
+
+    def close(self):
+        pass
+
+
+class AsgiTransport:
+    """Запросы к ASGI-приложению в цикле событий отдельного потока.
+
+    Потоки пользователей только ждут ответа: все запросы выполняются
+    одновременно в одном цикле, как на ASGI-сервере. Отдача ответа
+    медленному клиенту (delay секунд) цикл не занимает.
+    """
+
+    def __init__(self, application, delay=0):
+        self.application = application
+        self.delay = delay
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       daemon=True)
+        self.thread.start()
+
+    async def call(self, method, path, headers, body):
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(b'host', HOST.encode())] + [
+                (name.lower().encode(), value.encode())
+                for name, value in headers.items()
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': (HOST, 80),
+        }
+        messages = [{'type': 'http.request', 'body': body,
+                     'more_body': False}]
+        response = {'headers': [], 'body': []}
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = [
+                    (name.decode('latin-1'), value.decode('latin-1'))
+                    for name, value in message.get('headers', ())
+                ]
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+                if self.delay and not message.get('more_body'):
+                    await asyncio.sleep(self.delay)
+
+        await self.application(scope, receive, send)
+        return Response(response['status'], response['headers'],
+                        b''.join(response['body']))
+
+    def send(self, method, path, headers, body):
+        return asyncio.run_coroutine_threadsafe(
+            self.call(method, path, headers, body), self.loop
+        ).result()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpTransport:
+    """Запросы по HTTP: к своему серверу на локальном порту или по url.
+
+    Каждый запрос — новое соединение: так сервер не путает
+    пользователей, а повтор неидемпотентного POST не нужен.
+    """
+
+    def __init__(self, application=None, url=None):
+        self.server = None
+        if url is None:
+            self.server = ThreadedWSGIServer(('127.0.0.1', 0),
+                                             QuietRequestHandler)
+            self.server.daemon_threads = True
+            self.server.set_app(application)
+            threading.Thread(target=self.server.serve_forever,
+                             daemon=True).start()
+            url = f'http://127.0.0.1:{self.server.server_port}'
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+
+    def send(self, method, path, headers, body):
+        connection = HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            connection.request(method, self.prefix + path, body=body,
+                               headers={**headers, 'Connection': 'close'})
+            response = connection.getresponse()
+            return Response(response.status, response.getheaders(),
+                            response.read())
+        finally:
+            connection.close()
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def make_transport(target, url=None, delay=0, workers=None):
+    """Транспорт цели; delay и workers действуют только на wsgi и asgi."""
+    if url is not None:
+        return HttpTransport(url=url)
+    if target == ASGI:
+        from yanote.asgi import application
+        return AsgiTransport(application, delay)
+    from yanote.wsgi import application
+    if target == HTTP:
+        return HttpTransport(application)
+    return WsgiTransport(application, workers, delay)
+
+
+class VirtualUser:
+    """Пользователь со своими cookie; запоминает slug своих заметок."""
+
+    def __init__(self, transport, username, rng):
+        self.transport = transport
+        self.username = username
+        self.rng = rng
+        self.cookies = {}
+        self.slugs = []
+        self.created = 0
+
+    def request(self, method, path, data=None):
+        headers = {}
+        body = b''
+        if self.cookies:
+            headers['Cookie'] = '; '.join(
+                f'{name}={value}' for name, value in self.cookies.items()
+            )
+        if method == 'POST':
+            headers['X-CSRFToken'] = self.cookies.get(
+                settings.CSRF_COOKIE_NAME, ''
+            )
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            body = urlencode(data or {}).encode()
+        response = self.transport.send(method, path, headers, body)
+        for header in response.header('Set-Cookie'):
+            for name, morsel in SimpleCookie(header).items():
+                if morsel.value and morsel['max-age'] != '0':
+                    self.cookies[name] = morsel.value
+                else:
+                    self.cookies.pop(name, None)
+        return response
+
+    def new_slug(self):
+        self.created += 1
+        return f'{self.username}-{self.created}'
+
+    def note_data(self, slug):
+        return {'title': f'Нагрузка {slug}',
+                'text': 'Текст заметки под нагрузкой. ' * 20, 'slug': slug}
+
+    def signup(self):
+        self.request('GET', reverse('users:signup'))
+        return self.request('POST', reverse('users:signup'), {
+            'username': self.username,
+            'password1': PASSWORD, 'password2': PASSWORD,
+        })
+
+    def login(self):
+        if settings.CSRF_COOKIE_NAME not in self.cookies:
+            self.request('GET', reverse('users:login'))
+        return self.request('POST', reverse('users:login'), {
+            'username': self.username, 'password': PASSWORD,
+        })
+
+    def create(self):
+        slug = self.new_slug()
+        response = self.request('POST', reverse('notes:add'),
+                                self.note_data(slug))
+        if response.status == HTTPStatus.FOUND:
+            self.slugs.append(slug)
+        return response
+
+    def list(self):
+        return self.request('GET', reverse('notes:list'))
+
+    def detail(self):
+        slug = self.rng.choice(self.slugs)
+        return self.request('GET', reverse('notes:detail', args=(slug,)))
+
+    def edit(self):
+        slug = self.rng.choice(self.slugs)
+        return self.request('POST', reverse('notes:edit', args=(slug,)),
+                            self.note_data(slug))
+
+    def delete(self):
+        slug = self.slugs.pop(self.rng.randrange(len(self.slugs)))
+        return self.request('POST', reverse('notes:delete', args=(slug,)))
+
+
+# Ожидаемые статусы ответов: формы после успеха перенаправляют.
+EXPECTED_STATUS = {
+    'login': HTTPStatus.FOUND,
+    'list': HTTPStatus.OK,
+    'detail': HTTPStatus.OK,
+    'create': HTTPStatus.FOUND,
+    'edit': HTTPStatus.FOUND,
+    'delete': HTTPStatus.FOUND,
+}
+
+
+def choose(rng, mix, user):
+    """Маршрут по весам; без заметок чтение и правка заменяются созданием.
+
+    Одна заметка не удаляется, чтобы пользователю было что читать.
+    """
+    route = rng.choices(ROUTES, weights=[mix[name] for name in ROUTES])[0]
+    if route in ('detail', 'edit') and not user.slugs:
+        return 'create'
+    if route == 'delete' and len(user.slugs) < 2:
+        return 'create'
+    return route
+
+
+def prepare(user, notes):
+    """Регистрация, вход и первые заметки — до замеров."""
+    for step in (user.signup, user.login):
+        response = step()
+        if response.status != HTTPStatus.FOUND:
+            raise RuntimeError(f'{user.username}: {step.__name__} вернул '
+                               f'{response.status}')
+    for _ in range(notes):
+        user.create()
+
+
+def simulate(user, requests, mix, notes, results, barrier):
+    """Тело потока пользователя: подготовка, ожидание старта, запросы."""
+    try:
+        try:
+            prepare(user, notes)
+        except BaseException:
+            barrier.abort()
+            raise
+        barrier.wait()
+        for _ in range(requests):
+            route = choose(user.rng, mix, user)
+            started = time.perf_counter()
+            try:
+                response = getattr(user, route)()
+                ok = response.status == EXPECTED_STATUS[route]
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+            results.append((route, elapsed * 1000, ok))
+    finally:
+        # Соединения с базой потока (транспорт wsgi) закрываются с ним.
+        connections.close_all()
+
+
+def summarize(results, elapsed):
+    """Сводка по маршрутам и итог: запросы в секунду, перцентили, ошибки."""
+    by_route = {}
+    for route, latency, ok in results:
+        by_route.setdefault(route, []).append((latency, ok))
+    by_route['total'] = [(latency, ok) for _, latency, ok in results]
+    summary = {}
+    for route, samples in by_route.items():
+        if not samples:
+            continue
+        latencies = [latency for latency, _ in samples]
+        errors = sum(not ok for _, ok in samples)
+        summary[route] = {
+            'requests': len(samples),
+            'rps': round(len(samples) / elapsed, 1),
+            **{f'p{percent}_ms': round(percentile(latencies, percent), 2)
+               for percent in PERCENTILES},
+            'errors': errors,
+            'error_rate': round(errors / len(samples), 4),
+        }
+    return summary
+
+
+def run(target, users, requests, mix=None, notes=NOTES_PER_USER, seed=0,
+        url=None, delay=0, workers=None):
+    """Прогон нагрузки на target (или сервер по url) и его сводка.
+
+    delay — задержка отдачи ответа медленному клиенту в секундах,
+    workers — потоки WSGI-сервера (см. WsgiTransport).
+    """
+    mix = mix or MIX
+    transport = make_transport(target, url, delay, workers)
+    prefix = f'load-{random.Random().getrandbits(32):08x}'
+    # Старт по барьеру: замеры начинаются, когда все готовы.
+    barrier = threading.Barrier(users + 1)
+    results = []
+    threads = [
+        threading.Thread(
+            target=simulate,
+            args=(VirtualUser(transport, f'{prefix}-{number}',
+                              random.Random(seed + number)),
+                  requests, mix, notes, results, barrier),
+            daemon=True,
+        )
+        for number in range(users)
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            raise RuntimeError('не все пользователи смогли войти, '
+                               'подробности — в выводе потоков') from None
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        transport.close()
+    return {
+        'target': url or target,
+        'users': users,
+        'requests_per_user': requests,
+        'seconds': round(elapsed, 3),
+        'routes': summarize(results, elapsed),
+    }
+
+
+def compare(old, new):
+    """Строки (цель, маршрут, rps было, стало, p95 было, стало)."""
+    old_runs = {run['target']: run['routes'] for run in old['runs']}
+    for run in new['runs']:
+        old_routes = old_runs.get(run['target'], {})
+        for route, result in run['routes'].items():
+            before = old_routes.get(route)
+            if before is None:
+                continue
+            yield (run['target'], route, before['rps'], result['rps'],
+                   before['p95_ms'], result['p95_ms'])
@@ -0,0 +1,141 @@
+import json
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from notes import benchmark, transfer
+
+SIZE_RE = re.compile(r'^(\d+)x(\d+)$')
+
+
+def dataset_size(value):
+    match = SIZE_RE.match(value)
+    if not match or not all(int(number) for number in match.groups()):
+        raise ValueError(value)
+    return value
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время и число SQL-запросов всех маршрутов '
+            'на синтетических данных в отдельной тестовой базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', action='append', dest='sizes', type=dataset_size,
+            help='Размер данных ПОЛЬЗОВАТЕЛИxЗАМЕТОК, например 10x100 '
+                 '(можно указать несколько раз; по умолчанию 5x20 '
+                 'и 20x500).',
+        )
+        parser.add_argument('--iterations', type=int, default=20,
+                            help='Сколько замеров на маршрут.')
+        parser.add_argument('--warmup', type=int, default=2,
+                            help='Сколько прогонов до замеров.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Зерно генератора данных.')
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Не очищать кеш страниц перед каждым запросом.',
+        )
+        parser.add_argument(
+            '--compression', action='store_true',
+            help='Замерить хранение и чтение длинного текста без сжатия '
+                 'и со сжатием.',
+        )
+        parser.add_argument(
+            '--output', default=transfer.STDIO,
+            help='Куда записать JSON с результатами; «-» — стандартный '
+                 'вывод.',
+        )
+        parser.add_argument(
+            '--compare', metavar='JSON',
+            help='Сравнить с результатами прошлого прогона.',
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['warmup'] < 0:
+            raise CommandError('--iterations должен быть больше нуля, '
+                               '--warmup — не меньше нуля.')
+        sizes = options['sizes'] or ['5x20', '20x500']
+        report = {
+            'environment': benchmark.environment(
+                iterations=options['iterations'], warmup=options['warmup'],
+                seed=options['seed'], cold_cache=not options['warm_cache'],
+            ),
+            'runs': [self.run(size, options) for size in sizes],
+        }
+        if options['compression']:
+            report['compression'] = self.run_compression(options)
+        data = json.dumps(report, ensure_ascii=False, indent=2) + '\n'
+        with transfer.open_lines(options['output'], 'w') as stream:
+            stream.write(data)
+        if options['compare']:
+            self.print_comparison(benchmark.load(options['compare']), report)
+
+    def run(self, size, options):
+        users, notes_per_user = map(int, SIZE_RE.match(size).groups())
+        old_name = connection.settings_dict['NAME']
+        # Каждый набор данных — в новой тестовой базе, рабочая не трогается.
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False,
+        )
+        try:
+            self.stderr.write(f'{size}: генерация данных')
+            user = benchmark.generate(users, notes_per_user,
+                                      seed=options['seed'])
+            self.stderr.write(f'{size}: замеры')
+            cases = benchmark.build_cases(user)
+            routes = benchmark.run_cases(
+                user, cases, options['iterations'], options['warmup'],
+                cold_cache=not options['warm_cache'],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        uncovered = benchmark.uncovered_routes(cases)
+        if uncovered:
+            self.stderr.write('Нет замеров для маршрутов: '
+                              + ', '.join(uncovered))
+        for label, result in routes.items():
+            self.stderr.write(
+                f'{size:>10} {label:<36} p50 {result["p50_ms"]:8.2f} мс  '
+                f'p95 {result["p95_ms"]:8.2f} мс  '
+                f'запросов {result["queries"]:3}'
+            )
+        return {'size': size, 'users': users,
+                'notes_per_user': notes_per_user, 'routes': routes,
+                'uncovered_routes': uncovered}
+
+    def run_compression(self, options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False,
+        )
+        try:
+            self.stderr.write('сжатие: замеры')
+            user = benchmark.generate(1, 1, seed=options['seed'])
+            results = benchmark.measure_compression(
+                user, iterations=options['iterations'], seed=options['seed'],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        for result in results:
+            self.stderr.write(
+                f'{result["bytes"]:>10} {result["mode"]:<6} '
+                f'хранится {result["stored_bytes"]:>9} байт '
+                f'(×{result["ratio"]:.3f})  '
+                f'чтение p50 {result["read_p50_ms"]:8.3f} мс  '
+                f'страница p50 {result["page_p50_ms"]:8.2f} мс'
+            )
+        return results
+
+    def print_comparison(self, old, new):
+        old_revision = old['environment'].get('revision')
+        self.stderr.write(f'Сравнение с {old_revision}:')
+        for size, label, p50_before, p50_after, queries_before, \
+                queries_after in benchmark.compare(old, new):
+            ratio = p50_after / p50_before if p50_before else float('inf')
+            self.stderr.write(
+                f'{size:>10} {label:<36} p50 {p50_before:8.2f} → '
+                f'{p50_after:8.2f} мс (×{ratio:.2f})  '
+                f'запросов {queries_before} → {queries_after}'
+            )
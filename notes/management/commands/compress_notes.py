@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from notes import compression, shards
+from notes.models import Note
+
+
+class Command(BaseCommand):
+    help = ('Переписывает текст заметок пачками: длиннее порога '
+            'NOTES_TEXT_COMPRESSION_THRESHOLD — сжатым, короче — как есть.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько заметок переписывать в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        started = time.monotonic()
+        done = before = after = 0
+        for alias in shards.aliases():
+            shard_done = shard_before = shard_after = 0
+            for shard_done, shard_before, shard_after in \
+                    compression.compress_rows(Note, batch_size, alias):
+                self.stdout.write(
+                    f'Обработано заметок: {done + shard_done}'
+                )
+            done += shard_done
+            before += shard_before
+            after += shard_after
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Текст {done} заметок: {before} → {after} байт '
+            f'(порог {settings.NOTES_TEXT_COMPRESSION_THRESHOLD} байт) '
+            f'за {elapsed:.1f} с.'
+        ))
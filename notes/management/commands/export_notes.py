@@ -0,0 +1,74 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from notes import shards, transfer
+from notes.models import Note
+
+
+class Command(BaseCommand):
+    help = 'Выгружает заметки в JSON Lines (при желании в gzip).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', nargs='?', default=transfer.STDIO,
+            help='Файл выгрузки; «-» — стандартный вывод. '
+                 'Файлы *.gz сжимаются.',
+        )
+        parser.add_argument('--gzip', action='store_true',
+                            help='Сжать выгрузку gzip.')
+        parser.add_argument(
+            '--author', action='append', dest='authors', default=[],
+            help='Выгрузить заметки только этого пользователя '
+                 '(можно указать несколько раз).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Сколько строк читать из базы за раз.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        users = get_user_model().objects
+        author_ids = None
+        if options['authors']:
+            author_ids = list(
+                users.filter(username__in=options['authors'])
+                .values_list('pk', flat=True)
+            )
+        path = options['output']
+        progress = transfer.Progress(self.stderr, 'Выгружено заметок')
+        orphans = 0
+        with transfer.open_lines(
+                path, 'w', transfer.is_gzip(path, options['gzip'])
+        ) as stream:
+            for alias in shards.aliases():
+                queryset = Note.objects.using(alias).order_by('id')
+                if author_ids is not None:
+                    queryset = queryset.filter(author_id__in=author_ids)
+                rows = queryset.values_list('author_id', *transfer.NOTE_FIELDS)
+                # Пользователи лежат в default, а заметки — в шардах,
+                # поэтому имена авторов подгружаются для каждой пачки.
+                for batch in transfer.batched(
+                        rows.iterator(chunk_size=options['batch_size']),
+                        options['batch_size']):
+                    usernames = dict(
+                        users.filter(pk__in={row[0] for row in batch})
+                        .values_list('pk', 'username')
+                    )
+                    written = 0
+                    for author_id, *values in batch:
+                        if author_id not in usernames:
+                            # Такую строку import_notes не примет.
+                            orphans += 1
+                            continue
+                        row = {'author': usernames[author_id]}
+                        row.update(zip(transfer.NOTE_FIELDS, values))
+                        stream.write(transfer.dump_note(row))
+                        written += 1
+                    progress.advance(written)
+        progress.finish()
+        if orphans:
+            self.stderr.write(self.style.WARNING(
+                f'Пропущено заметок без автора: {orphans}.'
+            ))
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from notes import transfer
+from notes.models import Note
+
+SKIP = 'skip'
+CREATE = 'create'
+ERROR = 'error'
+
+
+class Command(BaseCommand):
+    help = ('Загружает заметки из JSON Lines пачками; занятые slug '
+            'получают суффиксы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', nargs='?', default=transfer.STDIO,
+            help='Файл выгрузки; «-» — стандартный ввод. '
+                 'Файлы *.gz распаковываются.',
+        )
+        parser.add_argument('--gzip', action='store_true',
+                            help='Входные данные сжаты gzip.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько заметок вставлять в одной транзакции.',
+        )
+        parser.add_argument(
+            '--missing-authors', choices=(ERROR, SKIP, CREATE),
+            default=ERROR,
+            help='Что делать с заметками неизвестных пользователей.',
+        )
+
+    def resolve_authors(self, usernames, missing):
+        """Id авторов пачки по именам за один запрос."""
+        users = get_user_model().objects
+        found = dict(
+            users.filter(username__in=usernames).values_list('username', 'pk')
+        )
+        unknown = set(usernames) - found.keys()
+        if unknown and missing == CREATE:
+            new_users = [users.model(username=username)
+                         for username in unknown]
+            for user in new_users:
+                user.set_unusable_password()
+            users.bulk_create(new_users)
+            found.update(
+                users.filter(username__in=unknown)
+                .values_list('username', 'pk')
+            )
+        elif unknown and missing == ERROR:
+            raise CommandError(
+                'Неизвестные пользователи: ' + ', '.join(sorted(unknown))
+            )
+        return found
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        path = options['input']
+        progress = transfer.Progress(self.stderr, 'Загружено заметок')
+        skipped = 0
+        with transfer.open_lines(
+                path, 'r', transfer.is_gzip(path, options['gzip'])
+        ) as stream:
+            try:
+                for batch in transfer.batched(
+                        transfer.read_notes(stream), batch_size):
+                    authors = self.resolve_authors(
+                        {row['author'] for _, row in batch},
+                        options['missing_authors'],
+                    )
+                    notes = [
+                        Note(
+                            author_id=authors[row['author']],
+                            **{field: row.get(field) or ''
+                               for field in transfer.NOTE_FIELDS},
+                        )
+                        for _, row in batch if row['author'] in authors
+                    ]
+                    skipped += len(batch) - len(notes)
+                    Note.objects.bulk_create_with_slugs(notes)
+                    progress.advance(len(notes))
+            except ValueError as error:
+                raise CommandError(f'Некорректная выгрузка: {error}')
+        progress.finish()
+        if skipped:
+            self.stderr.write(
+                f'Пропущено заметок неизвестных пользователей: {skipped}'
+            )
@@ -0,0 +1,147 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from notes import benchmark, load, transfer
+
+
+class Command(BaseCommand):
+    help = ('Нагружает приложение многими одновременными пользователями '
+            'и выводит запросы в секунду, перцентили задержки и долю '
+            'ошибок по маршрутам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', dest='targets',
+            choices=load.TARGETS,
+            help='Как вызывать приложение (можно указать несколько раз; '
+                 'по умолчанию все).',
+        )
+        parser.add_argument(
+            '--url', help='Нагрузить уже запущенный сервер по адресу '
+                          'вместо приложения в процессе.',
+        )
+        parser.add_argument('--users', type=int, default=20,
+                            help='Сколько пользователей работают '
+                                 'одновременно.')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Сколько запросов делает каждый '
+                                 'пользователь.')
+        parser.add_argument(
+            '--notes', type=int, default=load.NOTES_PER_USER,
+            help='Сколько заметок пользователь создаёт до замеров.',
+        )
+        parser.add_argument(
+            '--mix', type=load.parse_mix,
+            help='Веса маршрутов, например «list=5,detail=10,create=1»; '
+                 f'маршруты: {", ".join(load.ROUTES)}.',
+        )
+        parser.add_argument(
+            '--slow-client', type=int, default=0, metavar='MS',
+            help='Задержка отдачи каждого ответа в миллисекундах, как '
+                 'у медленного клиента (цели wsgi и asgi).',
+        )
+        parser.add_argument(
+            '--workers', type=int,
+            help='Сколько потоков у WSGI-сервера цели wsgi; по умолчанию '
+                 'поток на пользователя. Вместе с --slow-client и большим '
+                 '--users сравнивает WSGI с асинхронными страницами ASGI.',
+        )
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Зерно выбора маршрутов.')
+        parser.add_argument(
+            '--output', default=transfer.STDIO,
+            help='Куда записать JSON с результатами; «-» — стандартный '
+                 'вывод.',
+        )
+        parser.add_argument(
+            '--compare', metavar='JSON',
+            help='Сравнить с результатами прошлого прогона.',
+        )
+
+    def handle(self, *args, **options):
+        if (options['users'] < 1 or options['requests'] < 1
+                or options['notes'] < 0 or options['slow_client'] < 0
+                or (options['workers'] or 1) < 1):
+            raise CommandError('--users, --requests и --workers должны '
+                               'быть больше нуля, --notes и --slow-client '
+                               '— не меньше нуля.')
+        if options['url']:
+            runs = [self.run(None, options)]
+        else:
+            runs = self.run_in_test_db(options)
+        report = {
+            'environment': benchmark.environment(
+                users=options['users'], requests=options['requests'],
+                notes=options['notes'], seed=options['seed'],
+                mix=options['mix'] or load.MIX,
+                slow_client_ms=options['slow_client'],
+                workers=options['workers'],
+            ),
+            'runs': runs,
+        }
+        data = json.dumps(report, ensure_ascii=False, indent=2) + '\n'
+        with transfer.open_lines(options['output'], 'w') as stream:
+            stream.write(data)
+        if options['compare']:
+            self.print_comparison(benchmark.load(options['compare']), report)
+
+    def run_in_test_db(self, options):
+        """Прогоны в новой базе: рабочая не трогается.
+
+        База — файл, а не SQLite в памяти: потоки пользователей
+        открывают к ней свои соединения, как процессы сервера.
+        """
+        old_name = connection.settings_dict['NAME']
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        old_test_name = test_settings.get('NAME')
+        with tempfile.TemporaryDirectory() as directory:
+            test_settings['NAME'] = str(Path(directory) / 'load.sqlite3')
+            connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False,
+            )
+            try:
+                return [self.run(target, options)
+                        for target in options['targets'] or load.TARGETS]
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                test_settings['NAME'] = old_test_name
+
+    def run(self, target, options):
+        self.stderr.write(f'{options["url"] or target}: '
+                          f'{options["users"]} пользователей')
+        try:
+            result = load.run(
+                target, options['users'], options['requests'],
+                mix=options['mix'], notes=options['notes'],
+                seed=options['seed'], url=options['url'],
+                delay=options['slow_client'] / 1000,
+                workers=options['workers'],
+            )
+        except RuntimeError as error:
+            raise CommandError(str(error))
+        for route, summary in result['routes'].items():
+            self.stderr.write(
+                f'{result["target"]:>6} {route:<7} '
+                f'{summary["rps"]:8.1f} запросов/с  '
+                f'p50 {summary["p50_ms"]:8.2f}  p95 {summary["p95_ms"]:8.2f}  '
+                f'p99 {summary["p99_ms"]:8.2f} мс  '
+                f'ошибок {summary["errors"]} '
+                f'({summary["error_rate"]:.1%})'
+            )
+        return result
+
+    def print_comparison(self, old, new):
+        old_revision = old['environment'].get('revision')
+        self.stderr.write(f'Сравнение с {old_revision}:')
+        for target, route, rps_before, rps_after, p95_before, \
+                p95_after in load.compare(old, new):
+            ratio = rps_after / rps_before if rps_before else float('inf')
+            self.stderr.write(
+                f'{target:>6} {route:<7} {rps_before:8.1f} → '
+                f'{rps_after:8.1f} запросов/с (×{ratio:.2f})  '
+                f'p95 {p95_before:8.2f} → {p95_after:8.2f} мс'
+            )
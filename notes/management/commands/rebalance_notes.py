@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from notes import shards
+
+
+class Command(BaseCommand):
+    help = ('Переносит заметки авторов между шардами: по умолчанию каждого '
+            'автора — в шард по хешу его id.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--author', action='append', dest='authors', default=[],
+            help='Перенести только этого пользователя (можно указать '
+                 'несколько раз).',
+        )
+        parser.add_argument(
+            '--to', dest='target',
+            help='Шард назначения вместо шарда по хешу.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько заметок переносить за раз.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        target = options['target']
+        if target is not None and target not in shards.aliases():
+            raise CommandError(
+                f'Неизвестный шард {target}; шарды: '
+                + ', '.join(shards.aliases())
+            )
+        users = get_user_model().objects.order_by('pk')
+        if options['authors']:
+            users = users.filter(username__in=options['authors'])
+            unknown = set(options['authors']) - set(
+                users.values_list('username', flat=True)
+            )
+            if unknown:
+                raise CommandError('Неизвестные пользователи: '
+                                   + ', '.join(sorted(unknown)))
+        total = 0
+        for author_id, username in list(users.values_list('pk',
+                                                          'username')):
+            alias = target or shards.hashed_shard(author_id)
+            moved = shards.move_author(author_id, alias,
+                                       options['batch_size'])
+            if moved:
+                self.stdout.write(f'{username}: {moved} заметок → {alias}')
+            total += moved
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено заметок: {total}.'
+        ))
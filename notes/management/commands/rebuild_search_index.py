@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notes import search, shards
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс заметок пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько заметок индексировать в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        if not all(map(search.is_available, shards.aliases())):
+            raise CommandError('Полнотекстовый поиск доступен только '
+                               'для SQLite.')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        started = time.monotonic()
+        done = 0
+        for alias in shards.aliases():
+            shard_done = 0
+            for shard_done in search.rebuild_index(batch_size, alias):
+                self.stdout.write(
+                    f'Проиндексировано заметок: {done + shard_done}'
+                )
+            done += shard_done
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс пересобран: {done} заметок за {elapsed:.1f} с.'
+        ))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notes import shards, stats
+
+
+class Command(BaseCommand):
+    help = ('Сверяет статистику заметок пользователей с самими заметками '
+            'и исправляет расхождения пачками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько пользователей сверять в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        started = time.monotonic()
+        fixed = 0
+        for alias in shards.aliases():
+            shard_fixed = 0
+            for checked, shard_fixed in stats.reconcile_rows(batch_size,
+                                                             alias):
+                self.stdout.write(
+                    f'{alias}: проверено пользователей: {checked}, '
+                    f'исправлено: {shard_fixed}'
+                )
+            fixed += shard_fixed
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено записей статистики: {fixed} за {elapsed:.1f} с.'
+        ))
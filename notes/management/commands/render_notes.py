@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notes import rendering, shards
+from notes.models import Note
+
+
+class Command(BaseCommand):
+    help = ('Перерисовывает HTML заметок пачками после смены версии '
+            'отрисовки Markdown.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько заметок перерисовывать в одной транзакции.',
+        )
+        parser.add_argument(
+            '--all', action='store_true', dest='everything',
+            help='Перерисовать все заметки, а не только устаревшие.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        started = time.monotonic()
+        done = 0
+        for alias in shards.aliases():
+            shard_done = 0
+            for shard_done in rendering.render_rows(
+                    Note, batch_size, alias, options['everything']):
+                self.stdout.write(
+                    f'Перерисовано заметок: {done + shard_done}'
+                )
+            done += shard_done
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'HTML версии {rendering.VERSION}: {done} заметок '
+            f'за {elapsed:.1f} с.'
+        ))
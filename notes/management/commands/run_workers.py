@@ -0,0 +1,47 @@
+import os
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notes import jobs
+from notes.models import Job
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из очереди на пуле процессов. '
+            'SIGTERM или Ctrl+C — не брать новые задачи и дождаться '
+            'выполняемых.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1,
+            help='Сколько задач выполнять одновременно (по умолчанию — '
+                 'по числу процессоров).',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выйти, когда в очереди не останется готовых задач.',
+        )
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1:
+            raise CommandError('--processes должен быть больше нуля.')
+        stop = threading.Event()
+
+        def request_stop(signum, frame):
+            self.stderr.write('Останавливаемся после выполняемых задач...')
+            stop.set()
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, request_stop)
+        finished = jobs.run_workers(options['processes'], options['burst'],
+                                    stop, self.log)
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {finished[Job.DONE]}, отложено для '
+            f'повтора: {finished[Job.QUEUED]}, с ошибкой: '
+            f'{finished[Job.FAILED]}.'
+        ))
+
+    def log(self, job_id, status):
+        self.stdout.write(f'Задача {job_id}: {status}')
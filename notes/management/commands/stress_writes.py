@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notes import stress
+
+MODES = ('default', 'production')
+
+
+class Command(BaseCommand):
+    help = ('Одновременная запись заметок несколькими процессами '
+            'во временную базу: проверка на «database is locked».')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', action='append', dest='modes', choices=MODES,
+            help='Режим базы NOTES_DB_MODE (можно указать несколько раз; '
+                 'по умолчанию оба).',
+        )
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Сколько процессов пишут одновременно.')
+        parser.add_argument('--writes', type=int, default=60,
+                            help='Сколько операций делает каждый процесс.')
+        parser.add_argument('--worker', type=int, help='Служебный: номер '
+                            'процесса-писателя.')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['writes'] < 1:
+            raise CommandError('--workers и --writes должны быть больше '
+                               'нуля.')
+        if options['worker'] is not None:
+            stress.work(options['worker'], options['writes'],
+                        sys.stdin, sys.stdout)
+            return
+        for mode in options['modes'] or MODES:
+            result = stress.run(mode, options['workers'], options['writes'])
+            self.stdout.write(
+                f'{mode:>10}: операций {result["operations"]}, '
+                f'«database is locked» {result["locked"]}, '
+                f'других ошибок {result["errors"]}, '
+                f'{result["per_second"]} в секунду, '
+                f'p50 {result["p50_ms"]} мс, p99 {result["p99_ms"]} мс'
+            )
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE notes_note_fts USING fts5("
+        "title, text, owner, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO notes_note_fts (rowid, title, text, owner) "
+        "SELECT id, title, text, 'u' || author_id FROM notes_note"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE notes_note_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0002_note_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
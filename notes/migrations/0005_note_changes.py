@@ -0,0 +1,44 @@
+# Generated by Django 3.2.15 on 2026-10-18 19:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notes', '0004_note_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('note_id', models.BigIntegerField(verbose_name='Заметка')),
+                ('slug', models.CharField(max_length=100, verbose_name='Адрес заметки')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Удалена')),
+                ('changed', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Изменена')),
+                ('author', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='notechange',
+            index=models.Index(fields=['author', 'id'], name='notechange_author_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notechange',
+            constraint=models.UniqueConstraint(fields=('note_id', 'author'), name='notechange_note_author_uniq'),
+        ),
+        # Существующие заметки попадают в ленту для первой синхронизации.
+        migrations.RunSQL(
+            'INSERT INTO notes_notechange '
+            '(author_id, note_id, slug, deleted, changed) '
+            'SELECT author_id, id, slug, 0, updated '
+            'FROM notes_note ORDER BY id',
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.15 on 2026-10-18 19:22
+
+from django.db import migrations
+import notes.compression
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0006_note_shards'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='note',
+            name='text',
+            field=notes.compression.CompressedTextField(help_text='Добавьте подробностей', verbose_name='Текст'),
+        ),
+    ]
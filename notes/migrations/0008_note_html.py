@@ -0,0 +1,24 @@
+# Generated by Django 3.2.15 on 2026-10-18 19:25
+
+from django.db import migrations, models
+import notes.compression
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0007_note_text_compression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='html',
+            field=notes.compression.CompressedTextField(blank=True, editable=False, verbose_name='HTML'),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='html_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Версия отрисовки'),
+        ),
+    ]
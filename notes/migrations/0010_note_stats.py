@@ -0,0 +1,24 @@
+# Generated by Django 3.2.15 on 2026-10-18 19:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notes', '0009_note_attachments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteStats',
+            fields=[
+                ('author', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('note_count', models.IntegerField(default=0, verbose_name='Число заметок')),
+                ('last_edited', models.DateTimeField(null=True, verbose_name='Последнее изменение')),
+            ],
+        ),
+    ]
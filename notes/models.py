@@ -1,7 +1,199 @@
+from datetime import timedelta
+
 from django.conf import settings
-from django.db import models
+from django.db import (IntegrityError, connections, models, router,
+                       transaction)
+from django.db.models import Count, F, Max, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.dispatch import Signal
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from . import cache, jobs, rendering, shards, slugs
+from .compression import CompressedTextField
+
+# Сколько раз повторять вставку, если подобранный slug успели занять.
+SLUG_ATTEMPTS = 5
+
+# Отправляется после bulk_create: post_save для него не вызывается.
+# Аргумент instances — созданные заметки с заполненными pk.
+bulk_created = Signal()
+# Отправляется после bulk_delete: post_delete для него не вызывается.
+# Аргумент rows — тройки (id, id автора, slug) удалённых заметок.
+bulk_deleted = Signal()
+
+
+class NoteQuerySet(models.QuerySet):
+    """Массовые операции, которые не отправляют сигналы модели."""
+
+    def for_author(self, author, write=True):
+        """Заметки автора из его шарда (или реплики шарда для чтения)."""
+        return self.using(
+            shards.db_for_author(author.pk, write)
+        ).filter(author=author)
+
+    def create(self, **kwargs):
+        """Без явного using база выбирается по автору новой заметки."""
+        if self._db is not None:
+            return super().create(**kwargs)
+        note = self.model(**kwargs)
+        note.save(force_insert=True)
+        return note
+
+    def slug_max_length(self):
+        return self.model._meta.get_field('slug').max_length
+
+    def slug_exists(self, slug, exclude_pk=None):
+        """Занят ли slug в каком-либо шарде.
+
+        exclude_pk исключает заметку из шарда этого QuerySet.
+        """
+        for alias in shards.aliases():
+            queryset = self.model.objects.using(alias).filter(slug=slug)
+            if alias == self.db:
+                queryset = queryset.exclude(pk=exclude_pk)
+            if queryset.exists():
+                return True
+        return False
+
+    def allocate_slugs(self, bases, exclude_pk=None):
+        """Свободные slug для списка основ за один запрос на пачку.
+
+        Slug уникальны во всех шардах, поэтому занятые ищутся в каждом;
+        exclude_pk относится к шарду этого QuerySet.
+        """
+        max_length = self.slug_max_length()
+        bases = [base[:max_length] or slugs.DEFAULT_BASE for base in bases]
+        taken = set()
+        for alias in shards.aliases():
+            taken |= slugs.taken_slugs(
+                self.model, alias, bases, max_length,
+                exclude_pk if alias == self.db else None,
+            )
+        return slugs.allocate(bases, taken, max_length)
+
+    def allocate_slug(self, title, exclude_pk=None):
+        """Свободный slug по заголовку: основа, основа-2, основа-3, ..."""
+        base = slugs.slugify_title(title, self.slug_max_length())
+        return self.allocate_slugs([base], exclude_pk)[0]
 
-from pytils.translit import slugify
+    def bulk_create_with_slugs(self, notes, batch_size=None):
+        """Создаёт заметки, подбирая свободные slug всей пачке сразу.
+
+        Заданный slug считается основой и получает суффикс, только если
+        уже занят. Если slug заняли между подбором и вставкой, пачка
+        подбирается и вставляется заново. Без явного using() заметки
+        раскладываются по шардам авторов.
+        """
+        if self._db is None and shards.is_sharded():
+            by_shard = {}
+            for note in notes:
+                alias = shards.shard_for(note.author_id)
+                by_shard.setdefault(alias, []).append(note)
+            return [
+                note
+                for alias, shard_notes in by_shard.items()
+                for note in self.using(alias).bulk_create_with_slugs(
+                    shard_notes, batch_size
+                )
+            ]
+        max_length = self.slug_max_length()
+        bases = [
+            note.slug or slugs.slugify_title(note.title, max_length)
+            for note in notes
+        ]
+        for attempt in range(SLUG_ATTEMPTS):
+            for note, slug in zip(notes, self.allocate_slugs(bases)):
+                note.slug = slug
+            try:
+                with transaction.atomic(using=self.db):
+                    return self.bulk_create(notes, batch_size=batch_size)
+            except IntegrityError as error:
+                if (attempt == SLUG_ATTEMPTS - 1
+                        or not slugs.is_slug_conflict(error)):
+                    raise
+
+    def bulk_create(self, objs, *args, **kwargs):
+        for note in objs:
+            note.render_html()
+        # Заметки и записи обработчиков bulk_created — одной транзакцией.
+        with transaction.atomic(using=self.db):
+            notes = super().bulk_create(objs, *args, **kwargs)
+            features = connections[self.db].features
+            if (not features.can_return_rows_from_bulk_insert
+                    and not kwargs.get('ignore_conflicts')):
+                self.fill_pks(notes)
+            cache.invalidate_authors({note.author_id for note in notes})
+            bulk_created.send(sender=self.model, instances=notes,
+                              using=self.db)
+        return notes
+
+    def fill_pks(self, notes):
+        """Дозаполняет pk по уникальному slug, если база их не вернула."""
+        missing = {str(note.slug): note for note in notes if note.pk is None}
+        if not missing or '' in missing:
+            return
+        missing_slugs = list(missing)
+        for start in range(0, len(missing_slugs), slugs.BASES_PER_QUERY):
+            chunk = missing_slugs[start:start + slugs.BASES_PER_QUERY]
+            for slug, pk in self.model.objects.using(self.db).filter(
+                    slug__in=chunk).values_list('slug', 'pk'):
+                missing[slug].pk = pk
+
+    def bulk_delete(self):
+        """Удаляет заметки одним DELETE без загрузки объектов.
+
+        Возвращает число удалённых заметок.
+        """
+        with transaction.atomic(using=self.db):
+            rows = list(
+                self.order_by().values_list('pk', 'author_id', 'slug')
+            )
+            if not rows:
+                return 0
+            deleted = self.order_by()._raw_delete(self.db)
+            bulk_deleted.send(sender=self.model, rows=rows, using=self.db)
+        return deleted
+
+    def update(self, **kwargs):
+        if shards.is_sharded() and kwargs.keys() & {'author', 'author_id'}:
+            raise ValueError('Сменить автора в шардированной базе можно '
+                             'только командой rebalance_notes.')
+        kwargs.setdefault('updated', timezone.now())
+        if 'text' in kwargs:
+            kwargs.update(rendering.render_fields(kwargs['text']))
+        with transaction.atomic(using=self.db):
+            before = list(
+                self.order_by().values_list('pk', 'author_id', 'slug')
+            )
+            rows = super().update(**kwargs)
+            after = list(
+                self.model.objects.using(self.db)
+                .filter(pk__in=[pk for pk, _, _ in before])
+                .values_list('pk', 'author_id', 'slug')
+            )
+            moved = set(before) - {(pk, author_id, slug)
+                                   for pk, author_id, slug in after}
+            current_authors = {(pk, author_id) for pk, author_id, _ in after}
+            changes = NoteChange.objects.using(self.db)
+            changes.record(after)
+            changes.record(
+                [row for row in moved if row[:2] not in current_authors],
+                deleted=True,
+            )
+            counts = {author_id: 0 for _, author_id, _ in before}
+            for _, author_id, _ in before:
+                counts[author_id] -= 1
+            for _, author_id, _ in after:
+                counts[author_id] = counts.get(author_id, 0) + 1
+            NoteStats.objects.using(self.db).record({
+                author_id: (count, kwargs['updated'])
+                for author_id, count in counts.items()
+            })
+        cache.invalidate_authors(
+            {author_id for _, author_id, _ in before + after}
+        )
+        return rows
 
 
 class Note(models.Model):
@@ -11,7 +203,8 @@ class Note(models.Model):
         default='Название заметки',
         help_text='Дайте короткое название заметке'
     )
-    text = models.TextField(
+    # Длинный текст хранится сжатым, см. compression.py.
+    text = CompressedTextField(
         'Текст',
         help_text='Добавьте подробностей'
     )
@@ -23,16 +216,475 @@ class Note(models.Model):
         help_text=('Укажите адрес для страницы заметки. Используйте только '
                    'латиницу, цифры, дефисы и знаки подчёркивания')
     )
+    # Без ограничения внешнего ключа: заметка может лежать в шарде,
+    # а пользователь — в default. Каскадное удаление выполняет Django.
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_constraint=False,
+    )
+    # HTML текста в разметке Markdown, см. rendering.py.
+    html = CompressedTextField('HTML', blank=True, editable=False)
+    html_version = models.PositiveSmallIntegerField(
+        'Версия отрисовки', default=0, editable=False,
     )
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    updated = models.DateTimeField('Изменена', auto_now=True)
+    # Связи и счётчики тегов меняет tags.set_tags().
+    tags = models.ManyToManyField('Tag', through='NoteTag',
+                                  related_name='notes', blank=True)
+
+    objects = NoteQuerySet.as_manager()
+
+    class Meta:
+        indexes = (
+            # Список заметок автора упорядочен по id.
+            models.Index(fields=('author', 'id'), name='note_author_id_idx'),
+            # Поиск заметки автора по slug.
+            models.Index(fields=('author', 'slug'),
+                         name='note_author_slug_idx'),
+            # Время последнего изменения заметок автора для условных GET.
+            models.Index(fields=('author', 'updated'),
+                         name='note_author_updated_idx'),
+        )
 
     def __str__(self):
         return self.title
 
+    def render_html(self):
+        for name, value in rendering.render_fields(self.text).items():
+            setattr(self, name, value)
+
+    @property
+    def rendered_html(self):
+        """HTML для страницы; устаревший отрисовывается и сохраняется.
+
+        Сохраняется, как в render_notes, без save(): текст не изменился,
+        и ни updated, ни лента изменений не трогаются.
+        """
+        stale = self.html_version
+        if stale != rendering.VERSION:
+            self.render_html()
+            if self.pk is not None and self._state.db is not None:
+                # Условие на версию не даёт затереть HTML правки,
+                # сохранённой тем временем.
+                models.QuerySet.update(
+                    Note.objects.using(shards.primary_for(self._state.db))
+                    .filter(pk=self.pk, html_version=stale),
+                    html=self.html, html_version=self.html_version,
+                )
+        return mark_safe(self.html)
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            max_slug_length = self._meta.get_field('slug').max_length
-            self.slug = slugify(self.title)[:max_slug_length]
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'text' in update_fields:
+            self.render_html()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'html',
+                                           'html_version'}
+        using = kwargs.get('using') or router.db_for_write(Note, instance=self)
+        loaded_from = self._state.db
+        if (not self._state.adding and loaded_from is not None
+                and shards.primary_for(loaded_from) != using):
+            raise ValueError('Заметка лежит в другом шарде: перенести её '
+                             'можно только командой rebalance_notes.')
+        # Обработчики post_save пишут ленту изменений и статистику
+        # автора: вместе с заметкой или не пишут вовсе.
+        with transaction.atomic(using=using):
+            if self.slug:
+                return super().save(*args, **kwargs)
+            # Slug подбирается автоматически: если его успели занять
+            # до вставки, подбираем новый и повторяем.
+            for attempt in range(SLUG_ATTEMPTS):
+                self.slug = Note.objects.using(using).allocate_slug(
+                    self.title, self.pk
+                )
+                try:
+                    with transaction.atomic(using=using):
+                        return super().save(*args, **kwargs)
+                except IntegrityError as error:
+                    if (attempt == SLUG_ATTEMPTS - 1
+                            or not slugs.is_slug_conflict(error)):
+                        raise
+
+
+class NoteChangeQuerySet(models.QuerySet):
+
+    def record(self, rows, deleted=False):
+        """Записывает изменения заметок.
+
+        rows — тройки (id заметки, id автора, slug). Прежняя запись
+        о заметке у того же автора удаляется, новая получает следующий
+        id, поэтому в ленте остаётся только последнее изменение.
+        Без явного using() изменения пишутся в шарды авторов.
+        """
+        by_author = {}
+        for note_id, author_id, slug in rows:
+            by_author.setdefault(author_id, {})[note_id] = slug
+        if not by_author:
+            return
+        if self._db is None and shards.is_sharded():
+            for author_id, notes in by_author.items():
+                self.using(shards.shard_for(author_id)).record(
+                    [(note_id, author_id, slug)
+                     for note_id, slug in notes.items()],
+                    deleted,
+                )
+            return
+        now = timezone.now()
+        with transaction.atomic(using=self.db):
+            for author_id, notes in by_author.items():
+                note_ids = list(notes)
+                for start in range(0, len(note_ids), CHANGES_PER_QUERY):
+                    chunk = note_ids[start:start + CHANGES_PER_QUERY]
+                    self.filter(author_id=author_id,
+                                note_id__in=chunk).delete()
+                self.bulk_create([
+                    self.model(author_id=author_id, note_id=note_id,
+                               slug=slug, deleted=deleted, changed=now)
+                    for note_id, slug in notes.items()
+                ])
+
+
+# Сколько заметок удалять из ленты изменений одним запросом.
+CHANGES_PER_QUERY = 500
+
+
+class NoteChange(models.Model):
+    """Последнее изменение заметки в ленте синхронизации.
+
+    id служит курсором ленты: на SQLite ключи AUTOINCREMENT растут
+    монотонно и не переиспользуются. Для удалённых заметок (и заметок,
+    переданных другому автору) остаётся запись-надгробие с deleted.
+    Ограничения внешнего ключа на автора нет, чтобы надгробия
+    каскадно удаляемых заметок не мешали удалить пользователя;
+    их убирает обработчик удаления пользователя.
+    """
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='+',
+    )
+    note_id = models.BigIntegerField('Заметка')
+    slug = models.CharField('Адрес заметки', max_length=100)
+    deleted = models.BooleanField('Удалена', default=False)
+    changed = models.DateTimeField('Изменена', default=timezone.now)
+
+    objects = NoteChangeQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=('note_id', 'author'),
+                                    name='notechange_note_author_uniq'),
+        )
+        indexes = (
+            # Лента изменений автора после курсора.
+            models.Index(fields=('author', 'id'),
+                         name='notechange_author_id_idx'),
+        )
+
+
+class AuthorShard(models.Model):
+    """Явное размещение заметок автора в шарде; хранится в default."""
+    author = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+    )
+    alias = models.CharField('База', max_length=100)
+
+
+class AttachmentQuerySet(models.QuerySet):
+
+    def for_author(self, author, write=True):
+        """Вложения автора из его шарда (или реплики шарда для чтения)."""
+        return self.using(
+            shards.db_for_author(author.pk, write)
+        ).filter(author=author)
+
+
+class Attachment(models.Model):
+    """Файл, прикреплённый к заметке.
+
+    Содержимое хранится на диске под своим SHA-256 (см. attachments.py),
+    поэтому одинаковые файлы лежат один раз, сколько бы вложений на них
+    ни ссылалось. Вложение хранится в шарде заметки; автор повторён
+    для маршрутизации и проверки доступа без JOIN.
+    """
+    note = models.ForeignKey(
+        Note,
+        on_delete=models.CASCADE,
+        related_name='attachments',
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='+',
+    )
+    name = models.CharField('Имя файла', max_length=255)
+    content_type = models.CharField('Тип содержимого', max_length=255)
+    size = models.PositiveBigIntegerField('Размер')
+    sha256 = models.CharField('SHA-256', max_length=64, db_index=True)
+    # Не auto_now_add: при переносе между шардами время сохраняется.
+    created = models.DateTimeField('Добавлено', default=timezone.now)
+
+    objects = AttachmentQuerySet.as_manager()
+
+    def __str__(self):
+        return self.name
+
+
+class NoteStatsQuerySet(models.QuerySet):
+
+    def record(self, changes):
+        """Учитывает изменения заметок в статистике авторов.
+
+        changes — {id автора: (изменение числа заметок, время)}.
+        Вызывается в транзакции, которая меняет заметки. Если записи
+        автора ещё нет, она считается по его заметкам в той же
+        транзакции, поэтому уже учитывает изменение.
+        """
+        with transaction.atomic(using=self.db):
+            for author_id, (delta, edited) in changes.items():
+                edited = Value(edited, output_field=models.DateTimeField())
+                found = self.filter(author_id=author_id).update(
+                    note_count=F('note_count') + delta,
+                    last_edited=Greatest(Coalesce('last_edited', edited),
+                                         edited),
+                )
+                if not found:
+                    self.recount(author_id, edited.value)
+        cache.invalidate_stats(changes, using=self.db)
+
+    def count_notes(self, author_ids):
+        """Число заметок и время последнего изменения по заметкам базы."""
+        return {
+            row['author_id']: (row['count'], row['updated'])
+            for row in Note.objects.using(self.db)
+            .filter(author_id__in=author_ids).order_by()
+            .values('author_id')
+            .annotate(count=Count('id'), updated=Max('updated'))
+        }
+
+    def recount(self, author_id, edited=None):
+        """Пересчитывает запись автора по его заметкам."""
+        count, updated = self.count_notes([author_id]).get(author_id,
+                                                           (0, None))
+        last_edited = max(filter(None, (updated, edited)), default=None)
+        stats, _ = self.update_or_create(
+            author_id=author_id,
+            defaults={'note_count': count, 'last_edited': last_edited},
+        )
+        cache.invalidate_stats([author_id], using=self.db)
+        return stats
+
+
+class NoteStats(models.Model):
+    """Число заметок автора и время их последнего изменения.
+
+    Хранится в шарде автора и меняется в одной транзакции с заметками,
+    поэтому шапке и списку не нужен COUNT(*) по заметкам автора.
+    Удаление заметки тоже считается изменением. Расхождения (например,
+    после правки базы вручную) исправляет команда reconcile_note_stats.
+    Как и у ленты изменений, ограничения внешнего ключа нет: запись
+    удаляет обработчик удаления пользователя.
+    """
+    author = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+        related_name='+',
+    )
+    # Не Positive: вычитание при расхождении не должно ломать удаление.
+    note_count = models.IntegerField('Число заметок', default=0)
+    last_edited = models.DateTimeField('Последнее изменение', null=True)
+
+    objects = NoteStatsQuerySet.as_manager()
+
+
+class Tag(models.Model):
+    """Тег заметок автора; хранится в его шарде.
+
+    note_count меняется в одной транзакции со связями заметок
+    (см. tags.py), поэтому облаку тегов не нужен GROUP BY.
+    Ограничения внешнего ключа на автора нет, как у NoteStats.
+    """
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='+',
+    )
+    name = models.CharField('Название', max_length=50)
+    note_count = models.IntegerField('Число заметок', default=0)
+
+    class Meta:
+        constraints = (
+            # Заодно индекс облака тегов автора по названию.
+            models.UniqueConstraint(fields=('author', 'name'),
+                                    name='tag_author_name_uniq'),
+        )
+
+    def __str__(self):
+        return self.name
+
+
+class NoteTag(models.Model):
+    """Связь заметки с тегом."""
+    note = models.ForeignKey(Note, on_delete=models.CASCADE,
+                             related_name='+')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, db_index=False,
+                            related_name='+')
+
+    class Meta:
+        constraints = (
+            # Заодно индекс фильтра заметок по тегу.
+            models.UniqueConstraint(fields=('tag', 'note'),
+                                    name='notetag_tag_note_uniq'),
+        )
+
+
+class JobQuerySet(models.QuerySet):
+    """Очередь фоновых задач; исполняет их команда run_workers."""
+
+    def enqueue(self, name, author, params=None, priority=0):
+        """Ставит задачу name автора в очередь."""
+        return self.create(
+            name=name, author=author, params=params or {},
+            priority=priority,
+            max_attempts=settings.NOTES_JOB_ATTEMPTS,
+        )
+
+    def claim(self, worker):
+        """Берёт из очереди задачу с наибольшим приоритетом.
+
+        Задачу забирает тот, чей условный UPDATE её изменил, поэтому
+        несколько процессов run_workers не возьмут одну задачу дважды.
+        Возвращает задачу или None, если брать нечего.
+        """
+        while True:
+            now = timezone.now()
+            job = self.filter(
+                status=Job.QUEUED, run_after__lte=now,
+            ).order_by('-priority', 'id').first()
+            if job is None:
+                return None
+            claimed = self.filter(pk=job.pk, status=Job.QUEUED).update(
+                status=Job.RUNNING, worker=worker, started=now,
+                heartbeat=now, attempts=F('attempts') + 1,
+            )
+            if claimed:
+                job.refresh_from_db()
+                return job
+
+    def stale(self):
+        """Выполняемые задачи, от которых давно не было вестей.
+
+        Процесс run_workers, скорее всего, убит: задачи пора вернуть
+        в очередь (или признать проваленными).
+        """
+        cutoff = timezone.now() - timedelta(
+            seconds=settings.NOTES_JOB_TIMEOUT
+        )
+        return self.filter(status=Job.RUNNING, heartbeat__lt=cutoff)
+
+
+class Job(models.Model):
+    """Фоновая задача пользователя: тяжёлая операция вне запроса.
+
+    Хранится в default. Провал — повтор через NOTES_JOB_RETRY_DELAY
+    секунд, удваивающиеся с каждой попыткой, пока попытки не кончатся.
+    Исполнитель пишет прогресс (done из total) и заодно heartbeat.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='+',
+    )
+    name = models.CharField('Задача', max_length=100)
+    params = models.JSONField('Параметры', default=dict)
+    status = models.CharField('Состояние', max_length=10, choices=STATUSES,
+                              default=QUEUED)
+    # Больше — раньше.
+    priority = models.SmallIntegerField('Приоритет', default=0)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField('Наибольшее число '
+                                                    'попыток', default=1)
+    run_after = models.DateTimeField('Не раньше', default=timezone.now)
+    done = models.PositiveIntegerField('Сделано', default=0)
+    total = models.PositiveIntegerField('Всего', null=True)
+    result = models.JSONField('Результат', null=True)
+    error = models.TextField('Ошибка', blank=True)
+    worker = models.CharField('Исполнитель', max_length=100, blank=True)
+    created = models.DateTimeField('Создана', default=timezone.now)
+    started = models.DateTimeField('Начата', null=True)
+    heartbeat = models.DateTimeField('Последний отчёт', null=True)
+    finished = models.DateTimeField('Завершена', null=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        indexes = (
+            # Очередь: готовые задачи по приоритету и порядку постановки.
+            models.Index(fields=('status', '-priority', 'id'),
+                         name='job_queue_idx'),
+            # Страница задач пользователя, новые сверху.
+            models.Index(fields=('author', 'id'), name='job_author_id_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+    @property
+    def title(self):
+        task = jobs.TASKS.get(self.name)
+        return task.title if task is not None else self.name
+
+    @property
+    def error_summary(self):
+        """Последняя строка ошибки: трассировка — для администратора."""
+        lines = self.error.strip().splitlines()
+        return lines[-1] if lines else ''
+
+    @property
+    def percent(self):
+        """Прогресс в процентах или None, если объём неизвестен."""
+        if self.status == self.DONE:
+            return 100
+        if not self.total:
+            return None
+        return min(100, self.done * 100 // self.total)
+
+    @property
+    def is_active(self):
+        return self.status in (self.QUEUED, self.RUNNING)
+
+    def report(self, done, total=None):
+        """Прогресс задачи: сделано done из total; вызывает исполнитель."""
+        fields = {'done': done, 'heartbeat': timezone.now()}
+        if total is not None:
+            fields['total'] = total
+        for name, value in fields.items():
+            setattr(self, name, value)
+        # Задачу, отнятую как зависшую, прогресс этой попытки не трогает.
+        Job.objects.filter(pk=self.pk, status=Job.RUNNING,
+                           worker=self.worker,
+                           attempts=self.attempts).update(**fields)
@@ -0,0 +1,112 @@
+from django.core.paginator import Paginator
+from django.db.models import Max
+from django.http import Http404
+from django.utils.functional import cached_property
+
+# Больше стольких записей отфильтрованная выборка не пересчитывает.
+COUNT_LIMIT = 10000
+
+
+class KeysetPage:
+    """Страница выдачи при пагинации по ключу."""
+
+    def __init__(self, object_list, cursor_field, has_previous, has_next):
+        self.object_list = object_list
+        self.cursor_field = cursor_field
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    @property
+    def previous_cursor(self):
+        """Курсор для ?before= — ключ первой записи на странице."""
+        if self.object_list:
+            return getattr(self.object_list[0], self.cursor_field)
+        return None
+
+    @property
+    def next_cursor(self):
+        """Курсор для ?after= — ключ последней записи на странице."""
+        if self.object_list:
+            return getattr(self.object_list[-1], self.cursor_field)
+        return None
+
+
+class KeysetPaginationMixin:
+    """Пагинация по ключу (keyset) для ListView.
+
+    Вместо OFFSET страница выбирается условием по последнему полю
+    из keyset_ordering, поэтому стоимость запроса не зависит от номера
+    страницы, а курсоры ?after=/?before= не «съезжают» при добавлении
+    и удалении заметок. Предыдущие поля keyset_ordering должны быть
+    постоянны в пределах queryset (например, автор).
+    """
+    keyset_ordering = ('id',)
+    after_kwarg = 'after'
+    before_kwarg = 'before'
+
+    def get_cursor(self, name):
+        value = self.request.GET.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise Http404('Некорректный курсор страницы.')
+
+    def paginate_queryset(self, queryset, page_size):
+        after = self.get_cursor(self.after_kwarg)
+        before = self.get_cursor(self.before_kwarg)
+        if after is not None and before is not None:
+            raise Http404('Нельзя передавать after и before одновременно.')
+        cursor_field = self.keyset_ordering[-1]
+        if before is not None:
+            descending = [f'-{field}' for field in self.keyset_ordering]
+            rows = list(queryset.filter(
+                **{f'{cursor_field}__lt': before}
+            ).order_by(*descending)[:page_size + 1])
+            has_previous = len(rows) > page_size
+            rows = rows[:page_size][::-1]
+            has_next = True
+        else:
+            if after is not None:
+                queryset = queryset.filter(**{f'{cursor_field}__gt': after})
+            rows = list(
+                queryset.order_by(*self.keyset_ordering)[:page_size + 1]
+            )
+            has_next = len(rows) > page_size
+            rows = rows[:page_size]
+            has_previous = after is not None
+        page = KeysetPage(rows, cursor_field, has_previous, has_next)
+        return None, page, page.object_list, page.has_other_pages()
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator без COUNT(*) по всей таблице.
+
+    Для выборки без условий число записей оценивается наибольшим id:
+    его даёт индекс первичного ключа, а id не переиспользуются, так что
+    оценка не меньше настоящего числа (последние страницы могут быть
+    пустыми). Выборка с условиями считается, но не дальше COUNT_LIMIT.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return queryset.aggregate(last_id=Max('pk'))['last_id'] or 0
+        return queryset.order_by()[:COUNT_LIMIT].count()
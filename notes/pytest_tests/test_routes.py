@@ -20,7 +20,8 @@ def test_pages_availability_for_anonymous_user(client, name):
 
 @pytest.mark.parametrize(
     'name',
-    ('notes:list', 'notes:add', 'notes:success')
+    ('notes:list', 'notes:add', 'notes:success', 'notes:search',
+     'notes:archive', 'notes:jobs')
 )
 def test_pages_availability_for_auth_user(not_author_client, name):
     url = reverse(name)
@@ -40,7 +41,7 @@ def test_pages_availability_for_auth_user(not_author_client, name):
 )
 @pytest.mark.parametrize(
     'name',
-    ('notes:detail', 'notes:edit', 'notes:delete'),
+    ('notes:detail', 'notes:edit', 'notes:delete', 'notes:attach'),
 )
 def test_pages_availability_for_different_users(
         parametrized_client, name, note, expected_status
@@ -53,7 +54,7 @@ def test_pages_availability_for_different_users(
 # Параметризуем тестирующую функцию:
 @pytest.mark.parametrize(
     'name',
-    ('notes:detail', 'notes:edit', 'notes:delete'),
+    ('notes:detail', 'notes:edit', 'notes:delete', 'notes:attach'),
 )
 def test_pages_availability_for_author(author_client, name, note):
     url = reverse(name, args=(note.slug,))
@@ -67,9 +68,14 @@ def test_pages_availability_for_author(author_client, name, note):
         ('notes:detail', pytest.lazy_fixture('slug_for_args')),
         ('notes:edit', pytest.lazy_fixture('slug_for_args')),
         ('notes:delete', pytest.lazy_fixture('slug_for_args')),
+        ('notes:attach', pytest.lazy_fixture('slug_for_args')),
         ('notes:add', None),
         ('notes:success', None),
         ('notes:list', None),
+        ('notes:search', None),
+        ('notes:autocomplete', None),
+        ('notes:archive', None),
+        ('notes:jobs', None),
     ),
 )
 # Передаём в тест анонимный клиент, name проверяемых страниц и args:
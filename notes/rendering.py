@@ -0,0 +1,89 @@
+"""Markdown заметок, отрисованный один раз при сохранении.
+
+Текст переводится в HTML через Python-Markdown и очищается bleach
+по списку разрешённых тегов и атрибутов, результат хранится в Note.html
+вместе с VERSION. Когда меняется отрисовка (расширения Markdown,
+списки тегов), VERSION увеличивается, а команда render_notes пачками
+перерисовывает устаревшие заметки; до этого они отрисовываются
+при показе. Текст длиннее NOTES_MARKDOWN_MAX_LENGTH символов (обычно
+вставленный лог) Markdown не разбирается: на таком объёме разбор
+занимает секунды, и текст выводится как есть в <pre>.
+"""
+import bleach
+import markdown
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.html import escape
+
+from . import cache
+
+# Увеличить при любом изменении того, как текст превращается в HTML.
+VERSION = 1
+EXTENSIONS = ('extra', 'sane_lists', 'nl2br')
+ALLOWED_TAGS = (
+    'a', 'abbr', 'blockquote', 'br', 'code', 'dd', 'del', 'div', 'dl', 'dt',
+    'em', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'img', 'li', 'ol', 'p',
+    'pre', 'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'th', 'thead',
+    'tr', 'ul',
+)
+ALLOWED_ATTRIBUTES = {
+    'a': ('href', 'title'),
+    'abbr': ('title',),
+    'img': ('src', 'alt', 'title'),
+    'td': ('align',),
+    'th': ('align',),
+}
+ALLOWED_PROTOCOLS = ('http', 'https', 'mailto')
+
+
+def render(text):
+    """Безопасный HTML для текста заметки в разметке Markdown."""
+    text = text or ''
+    if len(text) > settings.NOTES_MARKDOWN_MAX_LENGTH:
+        return f'<pre>{escape(text)}</pre>'
+    html = markdown.markdown(text, extensions=EXTENSIONS,
+                             output_format='html')
+    return bleach.clean(html, tags=ALLOWED_TAGS,
+                        attributes=ALLOWED_ATTRIBUTES,
+                        protocols=ALLOWED_PROTOCOLS, strip=True)
+
+
+def render_fields(text):
+    """Значения полей html и html_version для текста."""
+    return {'html': render(text), 'html_version': VERSION}
+
+
+def render_rows(model, batch_size, using, everything=False, author_id=None):
+    """Перерисовывает заметки базы using (или только автора) пачками по id.
+
+    Без everything берутся только заметки, отрисованные другой версией.
+    updated и лента изменений не трогаются: текст не изменился.
+    Возвращает генератор числа перерисованных заметок.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    html_field = model._meta.get_field('html')
+    queryset = model.objects.using(using).only('id', 'author_id', 'text')
+    if not everything:
+        queryset = queryset.exclude(html_version=VERSION)
+    if author_id is not None:
+        queryset = queryset.filter(author_id=author_id)
+    last_id = 0
+    done = 0
+    while True:
+        batch = list(
+            queryset.filter(id__gt=last_id).order_by('id')[:batch_size]
+        )
+        if not batch:
+            break
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {table} SET {html_field.column} = %s, '
+                'html_version = %s WHERE id = %s',
+                [(html_field.get_db_prep_save(render(note.text), connection),
+                  VERSION, note.pk) for note in batch],
+            )
+        cache.invalidate_authors({note.author_id for note in batch})
+        last_id = batch[-1].pk
+        done += len(batch)
+        yield done
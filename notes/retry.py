@@ -0,0 +1,43 @@
+"""Повтор записи, если SQLite занята другим процессом."""
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections
+
+# Пауза перед повтором: BACKOFF * 2**попытка секунд плюс случайная доля.
+BACKOFF = 0.05
+
+
+def is_database_locked(error):
+    return 'database is locked' in str(error)
+
+
+class WriteRetryMixin:
+    """Повторяет POST целиком, если запись упала на блокировке базы.
+
+    Обработчик POST заново строит форму и объект, поэтому повтор
+    безопасен, пока запрос не обёрнут во внешнюю транзакцию
+    (ATOMIC_REQUESTS): её откат повтором не исправить.
+    """
+
+    def post(self, request, *args, **kwargs):
+        return self.retry_write(super().post, request, *args, **kwargs)
+
+    def retry_write(self, handler, *args, **kwargs):
+        """Вызывает handler, повторяя его при блокировке базы.
+
+        Для представлений, которые сами определяют post: их post
+        оборачивает свой обработчик явно.
+        """
+        attempts = settings.NOTES_DB_WRITE_ATTEMPTS
+        for attempt in range(attempts):
+            try:
+                return handler(*args, **kwargs)
+            except OperationalError as error:
+                if (attempt == attempts - 1
+                        or not is_database_locked(error)
+                        or any(connection.in_atomic_block
+                               for connection in connections.all())):
+                    raise
+            time.sleep(BACKOFF * 2 ** attempt * (1 + random.random()))
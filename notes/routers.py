@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+
+from . import shards
+
+# Модели, которые хранятся в шарде автора.
+SHARDED_MODELS = ('note', 'notechange', 'attachment', 'notestats', 'tag',
+                  'notetag')
+# Модели приложения, таблицы которых есть только в default.
+DEFAULT_ONLY_MODELS = ('authorshard', 'job')
+
+
+def is_sharded_model(model):
+    """Модель или её экземпляр (в том числе ленивый request.user)."""
+    return (model._meta.app_label == 'notes'
+            and model._meta.model_name in SHARDED_MODELS)
+
+
+def author_id_from(instance):
+    """Автор из подсказки роутера: заметки, изменения или пользователя."""
+    if instance is None:
+        return None
+    if isinstance(instance, get_user_model()):
+        return instance.pk
+    return getattr(instance, 'author_id', None)
+
+
+class NoteShardRouter:
+    """Заметки и ленту изменений — в шард автора, остальное — в default.
+
+    Запросы без подсказки instance (например, Note.objects.filter())
+    уходят в default: представления выбирают шард сами через
+    Note.objects.for_author().
+    """
+
+    def route(self, model, hints, write):
+        if not is_sharded_model(model):
+            # Иначе автор заметки искался бы в шарде самой заметки.
+            return DEFAULT_DB_ALIAS
+        author_id = author_id_from(hints.get('instance'))
+        if author_id is None:
+            return None
+        return shards.db_for_author(author_id, write)
+
+    def db_for_read(self, model, **hints):
+        return self.route(model, hints, write=False)
+
+    def db_for_write(self, model, **hints):
+        return self.route(model, hints, write=True)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Автор заметки живёт в default, сама заметка — в шарде."""
+        if is_sharded_model(obj1) or is_sharded_model(obj2):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Таблицы заметок создаются в любой базе, кроме реплик.
+
+        Так шард можно добавить в NOTES_SHARDS без отдельной миграции;
+        таблицы остальных приложений, AuthorShard и Job есть только в default.
+        """
+        if db in settings.NOTES_REPLICAS.values():
+            return False
+        if app_label == 'notes' and model_name not in DEFAULT_ONLY_MODELS:
+            return True
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,198 @@
+"""Полнотекстовый поиск по заметкам на SQLite FTS5.
+
+Индекс хранится в виртуальной таблице notes_note_fts: rowid совпадает
+с id заметки, колонки title и text повторяют поля Note, а в колонке
+owner лежит токен автора. Условие на owner проверяется внутри индекса
+FTS, поэтому поиск не перебирает совпадения чужих заметок.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from . import shards
+from .models import Note
+
+FTS_TABLE = 'notes_note_fts'
+# Маркеры начала и конца совпадения в snippet(): их не бывает в тексте
+# заметок, поэтому после экранирования их можно заменить на <mark>.
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+SNIPPET_TOKENS = 16
+# Веса bm25() для колонок title, text и owner.
+RANK_WEIGHTS = (10.0, 1.0, 0.0)
+TERM = re.compile(r'\w+')
+
+
+def is_available(using=DEFAULT_DB_ALIAS):
+    """FTS5 есть только у SQLite."""
+    return connections[using].vendor == 'sqlite'
+
+
+def owner_token(author_id):
+    return f'u{author_id}'
+
+
+def build_match(author_id, query):
+    """Собирает выражение MATCH из пользовательского запроса.
+
+    Каждое слово берётся в кавычки, чтобы синтаксис FTS5 в запросе
+    не интерпретировался, и ищется по префиксу.
+    """
+    terms = TERM.findall(query)
+    if not terms:
+        return None
+    words = ' '.join(f'"{term}"*' for term in terms)
+    return f'owner : "{owner_token(author_id)}" AND ({words})'
+
+
+def title_match(query):
+    """Выражение MATCH по заголовкам всех авторов."""
+    terms = TERM.findall(query)
+    if not terms:
+        return None
+    words = ' '.join(f'"{term}"*' for term in terms)
+    return f'title : ({words})'
+
+
+def title_note_ids(query):
+    """Подзапрос id заметок с такими словами в заголовке для pk__in.
+
+    Возвращает None, если поиск по индексу невозможен.
+    """
+    match = title_match(query)
+    if match is None:
+        return None
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (match,),
+    )
+
+
+def index_notes(notes):
+    """Добавляет или обновляет заметки в индексе их базы."""
+    by_db = {}
+    for note in notes:
+        by_db.setdefault(note._state.db or DEFAULT_DB_ALIAS, []).append(note)
+    for using, db_notes in by_db.items():
+        index_rows(using, [
+            (note.pk, note.title, note.text, owner_token(note.author_id))
+            for note in db_notes
+        ])
+
+
+def index_rows(using, rows):
+    if not is_available(using) or not rows:
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(row[0],) for row in rows],
+        )
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, text, owner) '
+            'VALUES (%s, %s, %s, %s)',
+            rows,
+        )
+
+
+def unindex_notes(note_ids, using=DEFAULT_DB_ALIAS):
+    """Удаляет заметки из поискового индекса базы using."""
+    if not is_available(using) or not note_ids:
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(note_id,) for note_id in note_ids],
+        )
+
+
+def format_snippet(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MATCH_START, '<mark>')
+        .replace(MATCH_END, '</mark>')
+    )
+
+
+def search_notes(author, query, limit):
+    """Заметки автора, подходящие под запрос, по убыванию релевантности.
+
+    У каждой найденной заметки есть атрибут snippet — фрагмент текста
+    с выделенными совпадениями. Без FTS5 ищется только подстрока
+    в заголовке, без фрагмента: text хранится сжатым (см.
+    CompressedTextField), и СУБД не может сравнить его с запросом.
+    """
+    using = shards.db_for_author(author.pk, write=False)
+    if not is_available(using):
+        notes = list(
+            Note.objects.using(using).filter(author=author)
+            .filter(title__icontains=query)
+            .only('id', 'slug', 'title')[:limit]
+        )
+        for note in notes:
+            note.snippet = ''
+        return notes
+    match = build_match(author.pk, query)
+    if match is None:
+        return []
+    weights = ', '.join(map(str, RANK_WEIGHTS))
+    notes = list(Note.objects.using(using).raw(
+        f'SELECT note.id, note.title, note.slug, '
+        f'snippet({FTS_TABLE}, 1, %s, %s, %s, %s) AS snippet '
+        f'FROM {FTS_TABLE} '
+        f'JOIN {Note._meta.db_table} AS note ON note.id = {FTS_TABLE}.rowid '
+        f'WHERE {FTS_TABLE} MATCH %s AND note.author_id = %s '
+        f'ORDER BY bm25({FTS_TABLE}, {weights}) '
+        f'LIMIT %s',
+        (MATCH_START, MATCH_END, '…', SNIPPET_TOKENS,
+         match, author.pk, limit),
+    ))
+    for note in notes:
+        note.snippet = format_snippet(note.snippet)
+    return notes
+
+
+def rebuild_index(batch_size, using=DEFAULT_DB_ALIAS):
+    """Пересобирает индекс базы using пачками, не опустошая его целиком.
+
+    Каждая пачка заменяет в индексе диапазон id от предыдущей пачки
+    до своей последней заметки, так что поиск работает всё время
+    перестройки. Возвращает генератор количества обработанных заметок.
+    """
+    connection = connections[using]
+    queryset = Note.objects.using(using).only('id', 'title', 'text',
+                                              'author_id')
+    last_id = 0
+    done = 0
+    while True:
+        batch = list(
+            queryset.filter(id__gt=last_id).order_by('id')[:batch_size]
+        )
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            if batch:
+                cursor.execute(
+                    f'DELETE FROM {FTS_TABLE} '
+                    'WHERE rowid > %s AND rowid <= %s',
+                    (last_id, batch[-1].pk),
+                )
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, title, text, owner) '
+                    'VALUES (%s, %s, %s, %s)',
+                    [(note.pk, note.title, note.text,
+                      owner_token(note.author_id)) for note in batch],
+                )
+            else:
+                cursor.execute(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid > %s', (last_id,)
+                )
+        if not batch:
+            break
+        last_id = batch[-1].pk
+        done += len(batch)
+        yield done
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) "
+                       "VALUES ('optimize')")
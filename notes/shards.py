@@ -0,0 +1,283 @@
+"""Распределение заметок авторов по базам-шардам.
+
+Заметки автора и его лента изменений целиком лежат в одном шарде
+из NOTES_SHARDS. Шард выбирается по устойчивому хешу id автора,
+если для автора нет явного размещения AuthorShard (его записывает
+команда rebalance_notes). Пользователи и размещения хранятся в default.
+Чтение можно направить на реплику шарда через NOTES_REPLICAS.
+
+Ключи заметок уникальны только внутри шарда, slug — во всех шардах.
+"""
+import contextvars
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F, Max
+
+# Размещения авторов, прочитанные в текущем запросе (см. shard_for).
+# Словарь общий для копий контекста, поэтому его видят и потоки
+# асинхронных представлений.
+_placements = contextvars.ContextVar('notes_placements', default=None)
+
+
+def aliases():
+    return settings.NOTES_SHARDS
+
+
+def is_sharded():
+    return len(aliases()) > 1
+
+
+def hashed_shard(author_id):
+    """Шард по хешу: crc32 не зависит от процесса, в отличие от hash()."""
+    shards = aliases()
+    return shards[zlib.crc32(str(author_id).encode()) % len(shards)]
+
+
+def shard_for(author_id):
+    """Шард, в котором лежат заметки автора.
+
+    Внутри remembered_placements() размещение автора читается из
+    default один раз.
+    """
+    shards = aliases()
+    if len(shards) == 1:
+        return shards[0]
+    remembered = _placements.get()
+    if remembered is not None and author_id in remembered:
+        return remembered[author_id]
+    placement = apps.get_model('notes', 'AuthorShard')
+    alias = (placement.objects.using(DEFAULT_DB_ALIAS)
+             .filter(author_id=author_id)
+             .values_list('alias', flat=True).first())
+    if alias not in shards:
+        alias = hashed_shard(author_id)
+    if remembered is not None:
+        remembered[author_id] = alias
+    return alias
+
+
+@contextmanager
+def remembered_placements():
+    """Запоминает прочитанные размещения авторов до выхода из блока.
+
+    Не кеш между запросами: rebalance_notes в другом процессе меняет
+    размещение, и следующий запрос должен увидеть его сразу.
+    """
+    token = _placements.set({})
+    try:
+        yield
+    finally:
+        _placements.reset(token)
+
+
+class PlacementMiddleware:
+    """Размещения авторов читаются из default один раз за запрос."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with remembered_placements():
+            return self.get_response(request)
+
+
+def replica_for(alias):
+    return settings.NOTES_REPLICAS.get(alias, alias)
+
+
+def primary_for(alias):
+    """Шард, которому принадлежит база alias (сама она или её реплика)."""
+    for primary, replica in settings.NOTES_REPLICAS.items():
+        if replica == alias:
+            return primary
+    return alias
+
+
+def db_for_author(author_id, write=True):
+    """База для заметок автора: шард для записи или его реплика."""
+    alias = shard_for(author_id)
+    return alias if write else replica_for(alias)
+
+
+def place(author_id, alias):
+    """Закрепляет автора за шардом; размещение по хешу не хранится."""
+    remembered = _placements.get()
+    if remembered is not None:
+        remembered[author_id] = alias
+    placement = apps.get_model('notes', 'AuthorShard')
+    if alias == hashed_shard(author_id):
+        placement.objects.filter(author_id=author_id).delete()
+    else:
+        placement.objects.update_or_create(author_id=author_id,
+                                           defaults={'alias': alias})
+
+
+def advance_change_cursor(source, target):
+    """Сдвигает счётчик id ленты изменений в target не ниже, чем в source.
+
+    Курсор клиента, полученный в старом шарде, остаётся меньше id новых
+    записей ленты, и после переноса клиент их не пропустит.
+    """
+    change_model = apps.get_model('notes', 'NoteChange')
+    last_id = change_model.objects.using(source).aggregate(
+        last_id=Max('id')
+    )['last_id']
+    connection = connections[target]
+    if not last_id or connection.vendor != 'sqlite':
+        return
+    table = change_model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s',
+            (last_id, table),
+        )
+        if not cursor.rowcount:
+            cursor.execute(
+                'INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)',
+                (table, last_id),
+            )
+
+
+def copy_notes(notes, target):
+    """Копирует заметки в target, по возможности с прежними id.
+
+    Возвращает пары (прежний id, новый id). Время создания и изменения
+    сохраняется, хотя bulk_create проставляет текущее.
+    """
+    note_model = apps.get_model('notes', 'Note')
+    taken = set(
+        note_model.objects.using(target)
+        .filter(pk__in=[note.pk for note in notes])
+        .values_list('pk', flat=True)
+    )
+    copies = [
+        note_model(pk=None if note.pk in taken else note.pk,
+                   author_id=note.author_id, title=note.title,
+                   text=note.text, slug=note.slug)
+        for note in notes
+    ]
+    note_model.objects.using(target).bulk_create(copies)
+    connection = connections[target]
+    adapt = connection.ops.adapt_datetimefield_value
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {note_model._meta.db_table} '
+            'SET created = %s, updated = %s WHERE id = %s',
+            [(adapt(note.created), adapt(note.updated), copy.pk)
+             for note, copy in zip(notes, copies)],
+        )
+    return [(note.pk, copy.pk) for note, copy in zip(notes, copies)]
+
+
+def copy_attachments(pairs, source, target):
+    """Копирует вложения перенесённых заметок: пары (прежний id, новый)."""
+    attachment_model = apps.get_model('notes', 'Attachment')
+    new_ids = dict(pairs)
+    attachment_model.objects.using(target).bulk_create([
+        attachment_model(
+            note_id=new_ids[attachment.note_id],
+            author_id=attachment.author_id, name=attachment.name,
+            content_type=attachment.content_type, size=attachment.size,
+            sha256=attachment.sha256, created=attachment.created,
+        )
+        for attachment in attachment_model.objects.using(source)
+        .filter(note_id__in=new_ids).order_by('id')
+    ])
+
+
+def copy_tags(pairs, source, target):
+    """Копирует теги перенесённых заметок: пары (прежний id, новый).
+
+    Теги сопоставляются по названию; счётчики тегов в target
+    увеличиваются на число перенесённых связей.
+    """
+    tag_model = apps.get_model('notes', 'Tag')
+    link_model = apps.get_model('notes', 'NoteTag')
+    new_ids = dict(pairs)
+    links = list(
+        link_model.objects.using(source).filter(note_id__in=new_ids)
+        .values_list('note_id', 'tag__author_id', 'tag__name')
+    )
+    if not links:
+        return
+    author_id = links[0][1]
+    names = sorted({name for _, _, name in links})
+    tag_model.objects.using(target).bulk_create(
+        [tag_model(author_id=author_id, name=name) for name in names],
+        ignore_conflicts=True,
+    )
+    tags = dict(
+        tag_model.objects.using(target)
+        .filter(author_id=author_id, name__in=names)
+        .values_list('name', 'pk')
+    )
+    link_model.objects.using(target).bulk_create([
+        link_model(note_id=new_ids[note_id], tag_id=tags[name])
+        for note_id, _, name in links
+    ])
+    counts = Counter(tags[name] for _, _, name in links)
+    for tag_id, count in counts.items():
+        tag_model.objects.using(target).filter(pk=tag_id).update(
+            note_count=F('note_count') + count
+        )
+
+
+def move_author(author_id, target, batch_size=1000):
+    """Переносит заметки автора из остальных шардов в target.
+
+    Перенос из каждого шарда идёт в одной транзакции в нём и в target;
+    в конце автор закрепляется за target. Вложения и теги переносятся
+    вместе с заметками, файлы вложений остаются на месте. Заметки,
+    которым пришлось выдать новый id, попадают в ленту target
+    надгробием со старым id.
+    Возвращает число перенесённых заметок.
+    """
+    note_model = apps.get_model('notes', 'Note')
+    change_model = apps.get_model('notes', 'NoteChange')
+    stats_model = apps.get_model('notes', 'NoteStats')
+    tag_model = apps.get_model('notes', 'Tag')
+    moved = 0
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        for source in aliases():
+            if source == target:
+                continue
+            notes = note_model.objects.using(source).filter(
+                author_id=author_id
+            ).order_by('id')
+            with transaction.atomic(using=source), \
+                    transaction.atomic(using=target):
+                advance_change_cursor(source, target)
+                while True:
+                    batch = list(notes[:batch_size])
+                    if not batch:
+                        break
+                    pairs = copy_notes(batch, target)
+                    copy_attachments(pairs, source, target)
+                    copy_tags(pairs, source, target)
+                    new_ids = {new_id for _, new_id in pairs}
+                    change_model.objects.using(target).record(
+                        [(old_id, author_id, note.slug)
+                         for (old_id, new_id), note in zip(pairs, batch)
+                         if old_id != new_id and old_id not in new_ids],
+                        deleted=True,
+                    )
+                    note_model.objects.using(source).filter(
+                        pk__in=[note.pk for note in batch]
+                    ).delete()
+                    moved += len(batch)
+                change_model.objects.using(source).filter(
+                    author_id=author_id
+                ).delete()
+                stats_model.objects.using(source).filter(
+                    author_id=author_id
+                ).delete()
+                tag_model.objects.using(source).filter(
+                    author_id=author_id
+                ).delete()
+        place(author_id, target)
+    return moved
@@ -0,0 +1,205 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import attachments, auth, cache, search, shards, tags
+from .models import (Attachment, Note, NoteChange, NoteStats, NoteTag, Tag,
+                     bulk_created, bulk_deleted)
+
+
+@receiver(post_save, sender=Note)
+def index_saved_note(sender, instance, **kwargs):
+    """Обновляет заметку в поисковом индексе после сохранения."""
+    search.index_notes([instance])
+
+
+@receiver(bulk_created, sender=Note)
+def index_created_notes(sender, instances, **kwargs):
+    """Индексирует заметки, созданные через bulk_create."""
+    search.index_notes([note for note in instances if note.pk is not None])
+
+
+@receiver(post_delete, sender=Note)
+def unindex_deleted_note(sender, instance, **kwargs):
+    """Убирает удалённую заметку из поискового индекса."""
+    search.unindex_notes([instance.pk], using=instance._state.db)
+
+
+@receiver(bulk_deleted, sender=Note)
+def unindex_deleted_notes(sender, rows, using, **kwargs):
+    search.unindex_notes([note_id for note_id, _, _ in rows], using=using)
+
+
+@receiver(post_init, sender=Note)
+def remember_author(sender, instance, **kwargs):
+    """Запоминает исходного автора, чтобы сбросить и его кеш."""
+    # Через __dict__, чтобы не загружать отложенное поле.
+    instance._loaded_author_id = instance.__dict__.get('author_id')
+
+
+# Регистрируется раньше track_saved_note: тот обновляет
+# _loaded_author_id, по которому здесь видна смена автора.
+@receiver(post_save, sender=Note)
+def count_saved_note(sender, instance, created, **kwargs):
+    """Обновляет статистику автора (и прежнего автора при смене)."""
+    previous = instance._loaded_author_id
+    moved = not created and previous not in (None, instance.author_id)
+    changes = {instance.author_id: (int(created or moved), instance.updated)}
+    if moved:
+        changes[previous] = (-1, instance.updated)
+    NoteStats.objects.using(instance._state.db).record(changes)
+
+
+@receiver(bulk_created, sender=Note)
+def count_created_notes(sender, instances, using, **kwargs):
+    """Без pk неизвестно, что вставлено: такие авторы пересчитываются."""
+    changes = {}
+    recount = set()
+    for note in instances:
+        if note.pk is None:
+            recount.add(note.author_id)
+            continue
+        count, edited = changes.get(note.author_id, (0, note.updated))
+        changes[note.author_id] = (count + 1, max(edited, note.updated))
+    stats = NoteStats.objects.using(using)
+    stats.record(changes)
+    for author_id in recount - changes.keys():
+        stats.recount(author_id)
+
+
+@receiver(post_delete, sender=Note)
+def count_deleted_note(sender, instance, **kwargs):
+    NoteStats.objects.using(instance._state.db).record(
+        {instance.author_id: (-1, timezone.now())}
+    )
+
+
+@receiver(bulk_deleted, sender=Note)
+def count_deleted_notes(sender, rows, using, **kwargs):
+    now = timezone.now()
+    counts = Counter(author_id for _, author_id, _ in rows)
+    NoteStats.objects.using(using).record(
+        {author_id: (-count, now) for author_id, count in counts.items()}
+    )
+
+
+@receiver(post_save, sender=Note)
+def track_saved_note(sender, instance, **kwargs):
+    """Сбрасывает кеш и пишет изменение в ленту синхронизации.
+
+    Если у заметки сменился автор, прежний автор получает надгробие.
+    """
+    previous = instance._loaded_author_id
+    cache.invalidate_authors({instance.author_id, previous})
+    changes = NoteChange.objects.using(instance._state.db)
+    changes.record([(instance.pk, instance.author_id, instance.slug)])
+    if previous is not None and previous != instance.author_id:
+        changes.record([(instance.pk, previous, instance.slug)],
+                       deleted=True)
+    instance._loaded_author_id = instance.author_id
+
+
+@receiver(bulk_created, sender=Note)
+def track_created_notes(sender, instances, using, **kwargs):
+    NoteChange.objects.using(using).record([
+        (note.pk, note.author_id, note.slug)
+        for note in instances if note.pk is not None
+    ])
+
+
+@receiver(post_delete, sender=Note)
+def track_deleted_note(sender, instance, **kwargs):
+    cache.invalidate_authors({instance.author_id})
+    NoteChange.objects.using(instance._state.db).record(
+        [(instance.pk, instance.author_id, instance.slug)], deleted=True
+    )
+
+
+@receiver(bulk_deleted, sender=Note)
+def track_deleted_notes(sender, rows, using, **kwargs):
+    cache.invalidate_authors({author_id for _, author_id, _ in rows})
+    NoteChange.objects.using(using).record(rows, deleted=True)
+
+
+@receiver(pre_delete, sender=Note)
+def forget_deleted_note_tags(sender, instance, **kwargs):
+    """Уменьшает счётчики тегов, пока каскад не удалил связи."""
+    tags.forget_notes([instance.pk], instance._state.db)
+
+
+@receiver(bulk_deleted, sender=Note)
+def forget_deleted_notes_tags(sender, rows, using, **kwargs):
+    """Удаляет связи с тегами заметок, удалённых bulk_delete."""
+    note_ids = [note_id for note_id, _, _ in rows]
+    tags.forget_notes(note_ids, using)
+    NoteTag.objects.using(using).filter(note_id__in=note_ids)._raw_delete(
+        using
+    )
+
+
+def remove_files_on_commit(hashes, using):
+    """Удаляет файлы после коммита: при откате они ещё нужны."""
+    for sha256 in set(hashes):
+        transaction.on_commit(
+            lambda sha256=sha256: attachments.remove_unreferenced(sha256),
+            using=using,
+        )
+
+
+@receiver(post_save, sender=Attachment)
+def forget_saved_attachment(sender, instance, **kwargs):
+    cache.invalidate_authors({instance.author_id})
+
+
+@receiver(post_delete, sender=Attachment)
+def remove_deleted_attachment(sender, instance, **kwargs):
+    cache.invalidate_authors({instance.author_id})
+    remove_files_on_commit([instance.sha256], instance._state.db)
+
+
+@receiver(bulk_deleted, sender=Note)
+def remove_deleted_notes_attachments(sender, rows, using, **kwargs):
+    """Удаляет вложения заметок, удалённых bulk_delete, без каскада."""
+    deleted = Attachment.objects.using(using).filter(
+        note_id__in=[note_id for note_id, _, _ in rows]
+    )
+    hashes = list(deleted.values_list('sha256', flat=True))
+    if hashes:
+        deleted._raw_delete(using)
+        remove_files_on_commit(hashes, using)
+
+
+@receiver(post_delete, sender=get_user_model())
+def forget_deleted_user(sender, instance, **kwargs):
+    """Убирает кеш, заметки в шардах, ленту, статистику и теги.
+
+    Заметки из базы самого пользователя удаляет каскад Django.
+    """
+    auth.invalidate_user(instance.pk)
+    cache.invalidate_authors({instance.pk})
+    for alias in shards.aliases():
+        if alias != instance._state.db:
+            Note.objects.using(alias).filter(author_id=instance.pk).delete()
+        NoteChange.objects.using(alias).filter(
+            author_id=instance.pk
+        ).delete()
+        NoteStats.objects.using(alias).filter(author_id=instance.pk).delete()
+        Tag.objects.using(alias).filter(author_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_saved_user(sender, instance, **kwargs):
+    """Сбрасывает кеш пользователя: сменился пароль, права или вход."""
+    auth.invalidate_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        auth.invalidate_user(user.pk)
@@ -0,0 +1,106 @@
+"""Подбор свободных slug с суффиксами -2, -3, ...
+
+Занятые slug для основы ищутся диапазонным запросом по уникальному
+индексу slug: для короткой основы это сама основа и slug вида
+«основа-…», для длинной — всё, что начинается с усечённой основы,
+ведь к ней суффикс дописывается после обрезки.
+"""
+import re
+
+from django.db import connections
+from pytils.translit import slugify
+
+# Сколько символов оставляется под суффикс у длинной основы.
+SUFFIX_RESERVE = len('-999999')
+# Символ больше любого допустимого в slug: граница диапазона по префиксу.
+RANGE_END = '~'
+# Сколько основ проверяется в одном запросе.
+BASES_PER_QUERY = 300
+DEFAULT_BASE = 'note'
+
+
+def slugify_title(title, max_length):
+    return slugify(title or '')[:max_length] or DEFAULT_BASE
+
+
+def candidates(base, max_length, start=1):
+    """Пары (номер, slug): основа, основа-2, основа-3, ...
+
+    Номер 1 — сама основа; slug не длиннее max_length.
+    """
+    if start <= 1:
+        yield 1, base
+    number = max(start, 2)
+    while True:
+        suffix = f'-{number}'
+        yield number, base[:max_length - len(suffix)] + suffix
+        number += 1
+
+
+def is_long(base, max_length):
+    return len(base) > max_length - SUFFIX_RESERVE
+
+
+def taken_condition(column, base, max_length):
+    """SQL-условие и параметры для slug, конфликтующих с основой."""
+    if is_long(base, max_length):
+        stem = base[:max_length - SUFFIX_RESERVE]
+        return f'({column} >= %s AND {column} < %s)', [stem, stem + RANGE_END]
+    return (f'({column} = %s OR ({column} > %s AND {column} < %s))',
+            [base, base + '-', base + '.'])
+
+
+def taken_slugs(model, using, bases, max_length, exclude_pk=None):
+    """Занятые slug, которые могут совпасть с кандидатами для bases.
+
+    Запрос собирается вручную: ORM строит условие из сотен OR
+    за квадратичное время.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    column = quote(model._meta.get_field('slug').column)
+    table = quote(model._meta.db_table)
+    bases = sorted(set(bases))
+    taken = set()
+    with connection.cursor() as cursor:
+        for start in range(0, len(bases), BASES_PER_QUERY):
+            conditions, params = [], []
+            for base in bases[start:start + BASES_PER_QUERY]:
+                condition, condition_params = taken_condition(
+                    column, base, max_length
+                )
+                conditions.append(condition)
+                params.extend(condition_params)
+            sql = (f'SELECT {column} FROM {table} '
+                   f'WHERE ({" OR ".join(conditions)})')
+            if exclude_pk is not None:
+                sql += f' AND {quote(model._meta.pk.column)} <> %s'
+                params.append(exclude_pk)
+            cursor.execute(sql, params)
+            taken.update(slug for slug, in cursor.fetchall())
+    return taken
+
+
+def allocate(bases, taken, max_length):
+    """Подбирает свободный slug для каждой основы по порядку.
+
+    Выданные slug добавляются в taken, поэтому одинаковые основы
+    внутри пачки получают разные суффиксы.
+    """
+    # С какого номера продолжать поиск для основы, уже встреченной в пачке.
+    next_number = {}
+    slugs = []
+    for base in bases:
+        for number, slug in candidates(base, max_length,
+                                       next_number.get(base, 1)):
+            if slug not in taken:
+                break
+        next_number[base] = number + 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def is_slug_conflict(error):
+    """Нарушено ли ограничение уникальности slug."""
+    return re.search(r'\bslug\b', str(error)) is not None
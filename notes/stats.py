@@ -0,0 +1,84 @@
+"""Статистика заметок пользователя: число и время последнего изменения.
+
+Записи NoteStats обновляются вместе с заметками (см. signals.py
+и NoteQuerySet.update), а читаются через кеш заметок: каждое
+изменение записи сбрасывает её из кеша. Валидаторы списка заметок
+читают запись мимо кеша (read_stats).
+"""
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from . import cache, shards
+from .models import NoteStats
+
+
+def get_stats(author_id):
+    """Статистика автора из кеша; при промахе — из его шарда."""
+    stats = cache.get_cache().get(cache.stats_key(author_id))
+    if stats is None:
+        stats = read_stats(author_id)
+    return stats
+
+
+def read_stats(author_id):
+    """Статистика автора из его шарда, мимо кеша; кладёт её в кеш.
+
+    Записи ещё нет (автор не менял заметки с её появления) — она
+    считается по заметкам один раз.
+    """
+    stats = NoteStats.objects.using(
+        shards.db_for_author(author_id, write=False)
+    ).filter(author_id=author_id).first()
+    if stats is None:
+        stats = NoteStats.objects.using(
+            shards.db_for_author(author_id)
+        ).recount(author_id)
+    cache.get_cache().set(cache.stats_key(author_id), stats)
+    return stats
+
+
+def reconcile_rows(batch_size, using):
+    """Сверяет статистику авторов базы using с их заметками.
+
+    Авторы перебираются пачками по id; пачка сверяется и исправляется
+    в одной транзакции, чтобы не затереть параллельные изменения.
+    Запись появляется только у авторов с заметками. Возвращает
+    генератор пар (проверено авторов, исправлено записей).
+    """
+    author_ids = (get_user_model().objects.using(DEFAULT_DB_ALIAS)
+                  .order_by('pk').values_list('pk', flat=True))
+    stats = NoteStats.objects.using(using)
+    last_id = 0
+    checked = 0
+    fixed = 0
+    while True:
+        batch = list(author_ids.filter(pk__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        with transaction.atomic(using=using):
+            counted = stats.count_notes(batch)
+            stored = {row.pk: row for row in stats.filter(author_id__in=batch)}
+            drifted = set()
+            for author_id in batch:
+                count, updated = counted.get(author_id, (0, None))
+                row = stored.get(author_id)
+                if row is None:
+                    if count:
+                        stats.create(author_id=author_id, note_count=count,
+                                     last_edited=updated)
+                        drifted.add(author_id)
+                    continue
+                last_edited = row.last_edited
+                if updated and (last_edited is None or last_edited < updated):
+                    last_edited = updated
+                if (row.note_count, row.last_edited) != (count, last_edited):
+                    stats.filter(author_id=author_id).update(
+                        note_count=count, last_edited=last_edited,
+                    )
+                    drifted.add(author_id)
+        cache.invalidate_authors(drifted)
+        cache.invalidate_stats(drifted, using=using)
+        last_id = batch[-1]
+        checked += len(batch)
+        fixed += len(drifted)
+        yield checked, fixed
@@ -0,0 +1,147 @@
+"""Нагрузочная проверка одновременной записи несколькими процессами.
+
+run() создаёт временную базу, применяет миграции и запускает workers
+процессов manage.py stress_writes --worker: как WSGI-процессы, каждый
+со своим соединением, они одновременно создают, правят и удаляют
+заметки через представления. Итог — число операций, ошибок
+«database is locked» и перцентили задержки.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import OperationalError
+from django.test import Client
+from django.urls import reverse
+
+from .benchmark import percentile
+from .retry import is_database_locked
+
+READY = 'ready'
+GO = 'go'
+EXPECTED_STATUS = {'batch': 200}
+OPERATIONS = ('create', 'update', 'batch', 'delete')
+
+
+def manage(*args):
+    return [sys.executable, str(Path(settings.BASE_DIR) / 'manage.py'),
+            *args]
+
+
+def run(mode, workers, writes):
+    """Запускает процессы-писатели в режиме базы mode и сводит итоги."""
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            'NOTES_DB_MODE': mode,
+            'NOTES_DB_NAME': str(Path(directory) / 'stress.sqlite3'),
+        }
+        subprocess.run(manage('migrate', '-v0'), env=env, check=True)
+        processes = [
+            subprocess.Popen(
+                manage('stress_writes', '--worker', str(number),
+                       '--writes', str(writes)),
+                env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                text=True,
+            )
+            for number in range(workers)
+        ]
+        # Все процессы готовы — только тогда одновременно начинают.
+        for process in processes:
+            if process.stdout.readline().strip() != READY:
+                raise RuntimeError('процесс нагрузки не запустился')
+        started = time.perf_counter()
+        for process in processes:
+            process.stdin.write(GO + '\n')
+            process.stdin.flush()
+        results = []
+        for process in processes:
+            output, _ = process.communicate()
+            if process.returncode:
+                raise RuntimeError('процесс нагрузки завершился с ошибкой')
+            results.append(json.loads(output))
+        elapsed = time.perf_counter() - started
+    latencies = [value for result in results for value in result['latencies']]
+    operations = sum(result['operations'] for result in results)
+    return {
+        'mode': mode,
+        'workers': workers,
+        'operations': operations,
+        'locked': sum(result['locked'] for result in results),
+        'errors': sum(result['errors'] for result in results),
+        'per_second': round(operations / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 2) if latencies else None,
+    }
+
+
+def get_author(number):
+    """Автор процесса; создание тоже может наткнуться на блокировку."""
+    from django.contrib.auth import get_user_model
+    for _ in range(settings.NOTES_DB_WRITE_ATTEMPTS * 10):
+        try:
+            return get_user_model().objects.get_or_create(
+                username=f'stress-{number}'
+            )[0]
+        except OperationalError as error:
+            if not is_database_locked(error):
+                raise
+            time.sleep(0.1)
+    raise RuntimeError('не удалось создать автора')
+
+
+def request(client, operation, number, slug):
+    if operation == 'create':
+        return client.post(reverse('notes:add'), {
+            'title': f'Нагрузка {number}', 'text': 'Текст ' * 50,
+        })
+    if operation == 'update':
+        return client.post(reverse('notes:edit', args=(slug,)), {
+            'title': f'Нагрузка {number}', 'text': 'Правка ' * 50,
+            'slug': slug,
+        })
+    if operation == 'batch':
+        operations = [{'op': 'update', 'slug': slug,
+                       'fields': {'text': f'Пакет {number}'}},
+                      {'op': 'create', 'fields': {'title': 'Пакет'}}]
+        return client.post(reverse('api:batch'),
+                           json.dumps({'operations': operations}),
+                           content_type='application/json')
+    return client.post(reverse('notes:delete', args=(slug,)))
+
+
+def work(number, writes, stdin, stdout):
+    """Тело процесса-писателя: writes операций по кругу OPERATIONS."""
+    from .models import Note
+    client = Client()
+    author = get_author(number)
+    client.force_login(author)
+    stdout.write(READY + '\n')
+    stdout.flush()
+    stdin.readline()
+    result = {'operations': 0, 'locked': 0, 'errors': 0, 'latencies': []}
+    slug = None
+    for index in range(writes):
+        operation = OPERATIONS[index % len(OPERATIONS)]
+        if operation != 'create' and slug is None:
+            operation = 'create'
+        started = time.perf_counter()
+        try:
+            response = request(client, operation, number, slug)
+            elapsed = time.perf_counter() - started
+            if operation in ('create', 'delete'):
+                slug = (Note.objects.for_author(author).order_by('-id')
+                        .values_list('slug', flat=True).first())
+        except OperationalError as error:
+            result['locked' if is_database_locked(error) else 'errors'] += 1
+            continue
+        result['latencies'].append(elapsed * 1000)
+        result['operations'] += 1
+        if response.status_code != EXPECTED_STATUS.get(operation, 302):
+            result['errors'] += 1
+    stdout.write(json.dumps(result) + '\n')
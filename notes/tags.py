@@ -0,0 +1,153 @@
+"""Теги заметок: связи, счётчики заметок и фильтр списка.
+
+Тег и связи заметки с ним лежат в шарде автора. Счётчик note_count
+меняется на разницу в той же транзакции, что и связи: при смене тегов
+заметки (set_tags), её удалении и удалении пачкой (forget_notes).
+Облако тегов читает готовые счётчики одним запросом по индексу
+(автор, название).
+"""
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+
+from . import cache, shards
+from .models import NoteTag, Tag
+
+# Сколько тегов может быть у одной заметки.
+MAX_TAGS = 20
+MAX_LENGTH = Tag._meta.get_field('name').max_length
+QUERY_PARAM = 'tag'
+
+
+def normalize(name):
+    """Название тега без лишних пробелов и без учёта регистра."""
+    return ' '.join(name.split()).lower()
+
+
+def parse(value):
+    """Названия тегов из строки через запятую, без повторов."""
+    names = (normalize(name) for name in value.split(','))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def get_or_create(author_id, names, using):
+    """Теги автора с названиями names: {название: тег}."""
+    tags = Tag.objects.using(using).filter(author_id=author_id)
+    found = {tag.name: tag for tag in tags.filter(name__in=names)}
+    missing = [name for name in names if name not in found]
+    if missing:
+        # Тег могли создать параллельно: тогда он просто найдётся.
+        Tag.objects.using(using).bulk_create(
+            [Tag(author_id=author_id, name=name) for name in missing],
+            ignore_conflicts=True,
+        )
+        found.update(
+            (tag.name, tag) for tag in tags.filter(name__in=missing)
+        )
+    return found
+
+
+def change_counts(counts, using):
+    """Прибавляет к note_count тегов {id тега: изменение}."""
+    by_delta = {}
+    for tag_id, delta in counts.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(tag_id)
+    for delta, tag_ids in by_delta.items():
+        Tag.objects.using(using).filter(pk__in=tag_ids).update(
+            note_count=F('note_count') + delta
+        )
+
+
+def set_tags(note, names):
+    """Оставляет у сохранённой заметки ровно теги с названиями names."""
+    using = note._state.db
+    links = NoteTag.objects.using(using)
+    with transaction.atomic(using=using):
+        current = dict(
+            links.filter(note=note).values_list('tag__name', 'tag_id')
+        )
+        added = get_or_create(
+            note.author_id, [name for name in names if name not in current],
+            using,
+        )
+        removed = [tag_id for name, tag_id in current.items()
+                   if name not in names]
+        if removed:
+            links.filter(note=note, tag_id__in=removed).delete()
+        links.bulk_create([NoteTag(note=note, tag=tag)
+                           for tag in added.values()])
+        change_counts({
+            **dict.fromkeys(removed, -1),
+            **{tag.pk: 1 for tag in added.values()},
+        }, using)
+    if added or removed:
+        cache.invalidate_authors({note.author_id})
+
+
+def forget_notes(note_ids, using):
+    """Уменьшает счётчики тегов удаляемых заметок.
+
+    Вызывается в транзакции удаления, пока связи ещё на месте.
+    """
+    counts = Counter(
+        NoteTag.objects.using(using).filter(note_id__in=note_ids)
+        .values_list('tag_id', flat=True)
+    )
+    change_counts({tag_id: -count for tag_id, count in counts.items()},
+                  using)
+
+
+def note_tag_names(note):
+    if note.pk is None:
+        return []
+    return list(
+        NoteTag.objects.using(note._state.db).filter(note=note)
+        .order_by('tag__name').values_list('tag__name', flat=True)
+    )
+
+
+def cloud(author):
+    """Теги автора с заметками, по названию, со счётчиками."""
+    return list(
+        Tag.objects.using(shards.db_for_author(author.pk, write=False))
+        .filter(author=author, note_count__gt=0).order_by('name')
+    )
+
+
+def selected(author, names):
+    """Теги автора из фильтра; None — какого-то тега у автора нет."""
+    if not names:
+        return []
+    found = list(
+        Tag.objects.using(shards.db_for_author(author.pk, write=False))
+        .filter(author=author, name__in=names)
+    )
+    if len(found) < len(names):
+        return None
+    return found
+
+
+def filter_notes(notes, tags):
+    """Заметки со всеми тегами tags.
+
+    Выборку ведёт самый редкий тег (по готовым счётчикам), остальные
+    проверяются подзапросами по уникальному индексу (тег, заметка).
+    """
+    tags = sorted(tags, key=lambda tag: tag.note_count)
+    links = NoteTag.objects.all()
+    notes = notes.filter(
+        pk__in=links.filter(tag=tags[0]).values('note_id')
+    )
+    for tag in tags[1:]:
+        notes = notes.filter(
+            Exists(links.filter(tag=tag, note=OuterRef('pk')))
+        )
+    return notes
+
+
+def query(names):
+    """Строка запроса фильтра по тегам names."""
+    return urlencode({QUERY_PARAM: sorted(names)}, doseq=True)
@@ -0,0 +1,70 @@
+"""Фоновые задачи над заметками пользователя (см. jobs.py).
+
+Каждая задача работает с заметками автора задачи в его шарде пачками
+по BATCH_SIZE и сообщает прогресс после каждой пачки.
+"""
+from django.db import transaction
+
+from . import jobs, rendering, search, shards
+from .models import Note
+
+BATCH_SIZE = 500
+
+
+def author_notes(job):
+    return Note.objects.using(
+        shards.db_for_author(job.author_id)
+    ).filter(author_id=job.author_id)
+
+
+@jobs.register('render_notes', 'Перерисовать заметки', public=True)
+def render_notes(job):
+    """Перерисовывает HTML всех заметок автора."""
+    notes = author_notes(job)
+    total = notes.count()
+    job.report(0, total)
+    done = 0
+    for done in rendering.render_rows(Note, BATCH_SIZE, notes.db,
+                                      everything=True,
+                                      author_id=job.author_id):
+        job.report(done, total)
+    return {'rendered': done}
+
+
+@jobs.register('reindex_notes', 'Обновить поисковый индекс', public=True)
+def reindex_notes(job):
+    """Заново добавляет заметки автора в полнотекстовый индекс."""
+    notes = author_notes(job).only('id', 'title', 'text', 'author_id')
+    total = notes.count()
+    job.report(0, total)
+    last_id = 0
+    done = 0
+    while True:
+        batch = list(notes.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+        if not batch:
+            break
+        with transaction.atomic(using=notes.db):
+            search.index_notes(batch)
+        last_id = batch[-1].pk
+        done += len(batch)
+        job.report(done, total)
+    return {'indexed': done}
+
+
+@jobs.register('delete_notes', 'Удалить заметки')
+def delete_notes(job):
+    """Удаляет заметки автора: все или со slug из params['slugs']."""
+    notes = author_notes(job)
+    if 'slugs' in job.params:
+        notes = notes.filter(slug__in=job.params['slugs'])
+    total = notes.count()
+    job.report(0, total)
+    deleted = 0
+    while True:
+        batch = list(notes.order_by('id').values_list('id', flat=True)
+                     [:BATCH_SIZE])
+        if not batch:
+            break
+        deleted += notes.filter(pk__in=batch).bulk_delete()
+        job.report(deleted, total)
+    return {'deleted': deleted}
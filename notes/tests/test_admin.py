@@ -0,0 +1,135 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from notes import search
+from notes.models import Note, NoteChange
+from notes.pagination import COUNT_LIMIT, EstimatedCountPaginator
+from notes.tests.test_data import User
+
+CHANGELIST = reverse('admin:notes_note_changelist')
+
+
+def deletes_from(captured, table):
+    return [query['sql'] for query in captured
+            if query['sql'].startswith(f'DELETE FROM "{table}"')]
+
+
+class TestNoteAdmin(TestCase):
+    """Тестируем админку заметок на большой таблице"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='Админ', is_staff=True,
+                                        is_superuser=True)
+        cls.author = User.objects.create(username='Автор')
+        cls.note = Note.objects.create(author=cls.author, title='Хлеб',
+                                       text='Ржаной', slug='bread')
+        cls.other = Note.objects.create(author=cls.admin, title='Молоко',
+                                        text='Свежее', slug='milk')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, params=None):
+        return self.client.get(CHANGELIST, params or {})
+
+    def test_queries_do_not_grow_with_page(self):
+        """Тестируем постоянное число запросов и отсутствие COUNT(*)"""
+        # Первый запрос кладёт пользователя в кеш.
+        self.changelist()
+        with CaptureQueriesContext(connection) as small:
+            self.changelist()
+        User.objects.bulk_create(
+            [User(username=f'Автор {number}') for number in range(30)]
+        )
+        authors = User.objects.filter(username__startswith='Автор ')
+        Note.objects.bulk_create_with_slugs(
+            [Note(author=author, title='Заметка', text='Текст')
+             for author in authors]
+        )
+        with CaptureQueriesContext(connection) as large:
+            response = self.changelist()
+        self.assertEqual(len(response.context['cl'].result_list), 32)
+        self.assertEqual(len(large), len(small))
+        self.assertFalse([query for query in large
+                          if 'COUNT(' in query['sql']])
+        self.assertContains(response, f'?author={self.author.pk}')
+
+    def test_author_filter(self):
+        response = self.changelist({'author': self.author.pk})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.note])
+
+    def test_search(self):
+        """Тестируем поиск по началу slug и словам заголовка"""
+        mixed = Note.objects.create(author=self.author, title='Сыр',
+                                    text='Твёрдый', slug='Cheese-Gouda')
+        for term, expected in (('bre', [self.note]), ('BRE', [self.note]),
+                               ('Cheese-G', [mixed]), ('Молок', [self.other]),
+                               ('нет', [])):
+            with self.subTest(term=term):
+                response = self.changelist({'q': term})
+                self.assertEqual(list(response.context['cl'].result_list),
+                                 expected)
+
+    def test_author_autocomplete(self):
+        response = self.client.get(reverse('admin:notes_note_add'))
+        self.assertContains(response, 'admin-autocomplete')
+
+    def test_bulk_delete(self):
+        """Тестируем удаление выбранных заметок одним DELETE"""
+        with CaptureQueriesContext(connection) as captured:
+            self.client.post(CHANGELIST, {
+                'action': 'delete_selected', 'post': 'yes',
+                '_selected_action': [self.note.pk, self.other.pk],
+            })
+        self.assertEqual(len(deletes_from(captured, 'notes_note')), 1)
+        self.assertFalse(Note.objects.exists())
+        self.assertEqual(
+            NoteChange.objects.filter(deleted=True).count(), 2
+        )
+        self.assertEqual(search.search_notes(self.author, 'хлеб', 10), [])
+
+    def test_delete_confirmation(self):
+        response = self.client.post(CHANGELIST, {
+            'action': 'delete_selected',
+            '_selected_action': [self.note.pk],
+        })
+        self.assertContains(response, 'Хлеб')
+
+    def test_touch_action(self):
+        """Тестируем отметку заметок изменёнными"""
+        updated = self.note.updated
+        self.client.post(CHANGELIST, {
+            'action': 'touch_notes', '_selected_action': [self.note.pk],
+        })
+        self.note.refresh_from_db()
+        self.assertGreater(self.note.updated, updated)
+        self.assertEqual(Note.objects.get(pk=self.other.pk).updated,
+                         self.other.updated)
+
+
+class TestEstimatedCountPaginator(TestCase):
+    """Тестируем оценку числа записей без COUNT(*)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        Note.objects.bulk_create_with_slugs(
+            [Note(author=cls.author, title='Заметка', text='Текст')
+             for _ in range(3)]
+        )
+        Note.objects.order_by('id').first().delete()
+
+    def test_unfiltered_count_is_max_id(self):
+        paginator = EstimatedCountPaginator(Note.objects.order_by('id'), 10)
+        self.assertEqual(paginator.count, Note.objects.order_by('-id')
+                         .values_list('id', flat=True).first())
+        self.assertGreaterEqual(paginator.count, Note.objects.count())
+
+    def test_filtered_count_is_capped(self):
+        queryset = Note.objects.filter(author=self.author).order_by('id')
+        self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 2)
+        self.assertGreater(COUNT_LIMIT, 2)
@@ -0,0 +1,151 @@
+import json
+from http import HTTPStatus
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from notes import tags
+from notes.models import Note, Tag
+from notes.tests.test_data import NOTES, User
+
+BATCH_URL = reverse('api:batch')
+
+
+class TestNoteBatch(TestCase):
+    """Тестируем пакетный JSON API заметок"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.reader = User.objects.create(username='Читатель')
+        cls.note = Note.objects.create(author=cls.author, slug='first',
+                                       **NOTES['first_note'])
+        cls.foreign = Note.objects.create(author=cls.reader, slug='foreign',
+                                          **NOTES['second_note'])
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def post(self, operations, client=None, **payload):
+        response = (client or self.client).post(
+            BATCH_URL, json.dumps({'operations': operations, **payload}),
+            content_type='application/json',
+        )
+        return response
+
+    def statuses(self, response):
+        return [result['status'] for result in response.json()['results']]
+
+    def test_mixed_batch(self):
+        """Тестируем создание, изменение и удаление одним запросом"""
+        response = self.post([
+            {'op': 'create', 'fields': NOTES['second_note']},
+            {'op': 'update', 'slug': 'first',
+             'fields': {'title': NOTES['edited_note']['title']}},
+            {'op': 'delete', 'slug': 'first'},
+        ])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(self.statuses(response),
+                         ['created', 'updated', 'deleted'])
+        created = response.json()['results'][0]['slug']
+        self.assertTrue(Note.objects.filter(slug=created,
+                                            author=self.author).exists())
+        self.assertFalse(Note.objects.filter(slug='first').exists())
+
+    def test_invalid_item_does_not_block_others(self):
+        """Тестируем ошибки отдельных операций"""
+        response = self.post([
+            {'op': 'create', 'fields': {'title': 'Без текста'}},
+            {'op': 'update', 'slug': 'foreign', 'fields': {'text': 'Моё'}},
+            {'op': 'update', 'slug': 'first', 'fields': {'text': 'Новый'}},
+        ])
+        results = response.json()['results']
+        self.assertEqual(self.statuses(response),
+                         ['error', 'error', 'updated'])
+        self.assertIn('text', results[0]['errors'])
+        self.assertEqual(results[1]['code'], HTTPStatus.NOT_FOUND)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.text, 'Новый')
+        self.foreign.refresh_from_db()
+        self.assertEqual(self.foreign.text, NOTES['second_note']['text'])
+
+    def test_atomic_batch_rolls_back(self):
+        """Тестируем откат всего пакета в режиме atomic"""
+        response = self.post([
+            {'op': 'delete', 'slug': 'first'},
+            {'op': 'update', 'slug': 'first', 'fields': {'text': 'Текст'}},
+        ], atomic=True)
+        self.assertEqual(self.statuses(response), ['rolled_back', 'error'])
+        self.assertTrue(Note.objects.filter(slug='first').exists())
+
+    def test_duplicate_slug_is_rejected(self):
+        """Тестируем проверку уникальности slug формой"""
+        response = self.post([
+            {'op': 'create', 'fields': {**NOTES['second_note'],
+                                        'slug': 'foreign'}},
+        ])
+        self.assertIn('slug', response.json()['results'][0]['errors'])
+
+    def test_tags(self):
+        """Тестируем теги и их счётчики при создании и изменении"""
+        response = self.post([
+            {'op': 'create', 'slug': 'new',
+             'fields': {**NOTES['second_note'], 'slug': 'new',
+                        'tags': ['Покупки', 'срочно']}},
+            {'op': 'update', 'slug': 'first', 'fields': {'tags': 'срочно'}},
+            {'op': 'update', 'slug': 'first', 'fields': {'text': 'Текст'}},
+        ])
+        self.assertEqual(self.statuses(response),
+                         ['created', 'updated', 'updated'])
+        created = Note.objects.get(slug='new')
+        self.assertEqual(tags.note_tag_names(created), ['покупки', 'срочно'])
+        self.assertEqual(tags.note_tag_names(self.note), ['срочно'])
+        self.assertEqual(
+            dict(Tag.objects.filter(author=self.author)
+                 .values_list('name', 'note_count')),
+            {'покупки': 1, 'срочно': 2},
+        )
+        response = self.post([
+            {'op': 'update', 'slug': 'first', 'fields': {'tags': [1]}},
+        ])
+        self.assertEqual(self.statuses(response), ['error'])
+
+    def test_bad_requests(self):
+        """Тестируем анонимный доступ и некорректное тело запроса"""
+        response = self.post([], client=Client())
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        response = self.client.post(BATCH_URL, 'not json',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+class TestNoteBatchRetry(TransactionTestCase):
+    """Тестируем повтор пакета при блокировке базы"""
+
+    def test_locked_database_is_retried(self):
+        author = User.objects.create(username='Автор')
+        self.client.force_login(author)
+        save = Note.save
+        calls = []
+
+        def locked_once(note, *args, **kwargs):
+            calls.append(note.title)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return save(note, *args, **kwargs)
+
+        with mock.patch.object(Note, 'save', locked_once), \
+                mock.patch('notes.retry.time.sleep'):
+            response = self.client.post(
+                BATCH_URL,
+                json.dumps({'operations': [
+                    {'op': 'create', 'fields': NOTES['first_note']},
+                ]}),
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['results'][0]['status'], 'created')
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Note.objects.filter(author=author).count(), 1)
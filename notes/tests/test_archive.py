@@ -0,0 +1,98 @@
+import io
+import tarfile
+import tracemalloc
+import zipfile
+from http import HTTPStatus
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from notes import archive
+from notes.models import Note
+from notes.tests.test_data import User
+
+URL = reverse('notes:archive')
+# Заметок для замера памяти и размер текста каждой: вместе около 2 МБ.
+MANY_NOTES = 1000
+TEXT_SIZE = 2000
+# Память ограничена куском заметок из базы, а не числом заметок.
+CHUNK_SIZE = 100
+PEAK_LIMIT = 1_000_000
+
+
+def read_archive(response):
+    return b''.join(response.streaming_content)
+
+
+class TestArchive(TestCase):
+    """Тестируем потоковый архив заметок пользователя"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.reader = User.objects.create(username='Читатель')
+        Note.objects.create(author=cls.author, title='Покупки',
+                            text='- хлеб', slug='shopping')
+        Note.objects.create(author=cls.reader, title='Чужая', text='Текст',
+                            slug='foreign')
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def test_tar_gz(self):
+        """Тестируем tar.gz только с заметками пользователя"""
+        response = self.client.get(URL)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        with tarfile.open(fileobj=io.BytesIO(read_archive(response)),
+                          mode='r:gz') as tar:
+            self.assertEqual(tar.getnames(), ['shopping.md'])
+            self.assertEqual(tar.extractfile('shopping.md').read().decode(),
+                             '# Покупки\n\n- хлеб\n')
+
+    def test_zip(self):
+        """Тестируем zip только с заметками пользователя"""
+        response = self.client.get(URL, {'format': 'zip'})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(read_archive(response))) as zipped:
+            self.assertIsNone(zipped.testzip())
+            self.assertEqual(zipped.namelist(), ['shopping.md'])
+            self.assertEqual(zipped.read('shopping.md').decode(),
+                             '# Покупки\n\n- хлеб\n')
+
+    def test_zip64(self):
+        """Тестируем конец каталога ZIP64 при большом числе файлов"""
+        Note.objects.create(author=self.author, title='Вторая', text='Текст',
+                            slug='second')
+        with mock.patch.object(archive, 'ZIP64_COUNT_LIMIT', 1):
+            response = self.client.get(URL, {'format': 'zip'})
+            data = read_archive(response)
+        with zipfile.ZipFile(io.BytesIO(data)) as zipped:
+            self.assertEqual(zipped.namelist(), ['shopping.md', 'second.md'])
+            self.assertIsNone(zipped.testzip())
+
+    def test_unknown_format(self):
+        response = self.client.get(URL, {'format': 'rar'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_memory_is_bounded(self):
+        """Тестируем, что память не растёт с объёмом архива"""
+        text = 'x' * TEXT_SIZE
+        Note.objects.bulk_create([
+            Note(author=self.author, title=f'Заметка {number}', text=text,
+                 slug=f'note-{number}')
+            for number in range(MANY_NOTES)
+        ])
+        for archive_format in archive.FORMATS:
+            with self.subTest(format=archive_format), \
+                    mock.patch.object(archive, 'CHUNK_SIZE', CHUNK_SIZE):
+                response = self.client.get(URL, {'format': archive_format})
+                tracemalloc.start()
+                try:
+                    size = sum(map(len, response.streaming_content))
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+                self.assertGreater(size, 0)
+                self.assertLess(peak, PEAK_LIMIT)
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+from http import HTTPStatus
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.test import (SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import resolve, reverse
+
+from notes import executor
+from notes.models import Note
+from notes.tests.test_data import User
+from yanote.asgi import NotesASGIHandler
+
+# Потоки пула читают базу своими соединениями: данные теста должны
+# быть закоммичены, поэтому тесты — TransactionTestCase.
+
+
+@override_settings(ROOT_URLCONF='yanote.asgi_urls')
+class TestAsyncViews(TransactionTestCase):
+    """Тестируем асинхронные страницы чтения под ASGI"""
+
+    def setUp(self):
+        self.author = User.objects.create(username='Автор')
+        self.reader = User.objects.create(username='Читатель')
+        self.note = Note.objects.create(author=self.author, title='Покупки',
+                                        text='Хлеб', slug='shopping')
+        self.detail_url = reverse('notes:detail', args=(self.note.slug,))
+
+    def test_routes(self):
+        """Тестируем, что асинхронны только страницы чтения"""
+        for name, args, is_async in (
+            ('notes:home', (), True),
+            ('notes:list', (), True),
+            ('notes:detail', ('shopping',), True),
+            ('notes:add', (), False),
+            ('notes:edit', ('shopping',), False),
+        ):
+            with self.subTest(name=name):
+                view = resolve(reverse(name, args=args)).func
+                self.assertEqual(asyncio.iscoroutinefunction(view), is_async)
+
+    async def test_anonymous_is_redirected(self):
+        login_url = reverse('users:login')
+        for url in (reverse('notes:list'), self.detail_url):
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertRedirects(response, f'{login_url}?next={url}',
+                                     fetch_redirect_response=False)
+        response = await self.async_client.get(reverse('notes:home'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    async def test_author_pages(self):
+        """Тестируем страницы автора и 404 на чужую заметку"""
+        await sync_to_async(self.async_client.force_login)(self.author)
+        response = await self.async_client.get(reverse('notes:list'))
+        self.assertContains(response, 'Покупки')
+        response = await self.async_client.get(self.detail_url)
+        self.assertContains(response, 'Хлеб')
+        # AsyncClient в Django 3.2 принимает заголовки по их именам.
+        response = await self.async_client.get(
+            self.detail_url, **{'If-None-Match': response['ETag']}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        await sync_to_async(self.async_client.force_login)(self.reader)
+        response = await self.async_client.get(self.detail_url)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    async def test_view_runs_in_pool(self):
+        threads = []
+        call = executor.call
+
+        def record(function, *args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return call(function, *args, **kwargs)
+
+        with mock.patch.object(executor, 'call', record):
+            response = await self.async_client.get(reverse('notes:home'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith(executor.THREAD_NAME_PREFIX))
+
+    @override_settings(NOTES_PERF_ENABLED=True)
+    async def test_pool_queries_are_measured(self):
+        """Тестируем замер SQL, выполненного в потоке пула"""
+        await sync_to_async(self.async_client.force_login)(self.author)
+        response = await self.async_client.get(reverse('notes:list'))
+        db = response['Server-Timing'].split(', ')[0]
+        # Те же запросы, что и у синхронного списка.
+        self.assertTrue(db.endswith('desc="6 SQL"'), db)
+        self.assertNotIn('db;dur=0.00;', db)
+
+    def test_pool_size_follows_setting(self):
+        with self.settings(NOTES_ASYNC_DB_THREADS=3):
+            self.assertEqual(executor.get_executor()._max_workers, 3)
+            self.assertIs(executor.get_executor(), executor.get_executor())
+        self.assertEqual(executor.get_executor()._max_workers,
+                         settings.NOTES_ASYNC_DB_THREADS)
+
+
+class TestAsgiHandler(SimpleTestCase):
+    """Тестируем выбор маршрутов ASGI-приложения"""
+
+    def create_request(self):
+        request, error = NotesASGIHandler().create_request(
+            {'type': 'http', 'method': 'GET', 'path': '/', 'headers': []},
+            None,
+        )
+        self.assertIsNone(error)
+        return request
+
+    def test_urlconf(self):
+        self.assertEqual(self.create_request().urlconf, 'yanote.asgi_urls')
+        with self.settings(NOTES_ASGI_URLCONF=''):
+            self.assertFalse(hasattr(self.create_request(), 'urlconf'))
@@ -0,0 +1,219 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from http import HTTPStatus
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from notes import attachments, cache
+from notes.models import Attachment, Note
+from notes.tests.test_data import User
+
+# Больше 2,5 МБ: Django держал бы файл меньшего размера в памяти.
+BIG_SIZE = 3 * 1024 * 1024
+CONTENT = bytes(range(256)) * 40
+
+
+def read(response):
+    return b''.join(response.streaming_content)
+
+
+class TestAttachments(TestCase):
+    """Тестируем загрузку и выдачу вложений заметок"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.reader = User.objects.create(username='Читатель')
+        cls.note = Note.objects.create(author=cls.author, title='Покупки',
+                                       text='Список', slug='shopping')
+        cls.other = Note.objects.create(author=cls.author, title='Дела',
+                                        text='Список', slug='todo')
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(NOTES_ATTACHMENTS_ROOT=root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_login(self.author)
+
+    def upload(self, note, content=CONTENT, name='list.txt'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('notes:attach', args=(note.slug,)),
+                {'file': SimpleUploadedFile(name, content, 'text/plain')},
+            )
+
+    def test_upload_is_streamed_to_disk(self):
+        """Тестируем запись большого файла по его SHA-256"""
+        content = os.urandom(BIG_SIZE)
+        response = self.upload(self.note, content, 'big.bin')
+        self.assertRedirects(
+            response, reverse('notes:detail', args=(self.note.slug,))
+        )
+        attachment = Attachment.objects.get()
+        sha256 = hashlib.sha256(content).hexdigest()
+        self.assertEqual((attachment.name, attachment.size,
+                          attachment.sha256, attachment.note),
+                         ('big.bin', BIG_SIZE, sha256, self.note))
+        with open(attachments.blob_path(sha256), 'rb') as blob:
+            self.assertEqual(blob.read(), content)
+        self.assertEqual(
+            os.listdir(os.path.join(attachments.root(),
+                                    attachments.TEMP_DIR)), []
+        )
+        response = self.client.get(
+            reverse('notes:detail', args=(self.note.slug,))
+        )
+        self.assertContains(response, 'big.bin')
+
+    def test_identical_files_are_stored_once(self):
+        self.upload(self.note)
+        self.upload(self.other, name='copy.txt')
+        self.assertEqual(Attachment.objects.count(), 2)
+        directory = os.path.dirname(
+            attachments.blob_path(Attachment.objects.first().sha256)
+        )
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_download(self):
+        self.upload(self.note)
+        url = reverse('notes:attachment',
+                      args=(Attachment.objects.get().pk,))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(read(response), CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('list.txt', response['Content-Disposition'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_range(self):
+        """Тестируем выдачу части файла по заголовку Range"""
+        self.upload(self.note)
+        attachment = Attachment.objects.get()
+        url = reverse('notes:attachment', args=(attachment.pk,))
+        size = len(CONTENT)
+        cases = (
+            ('bytes=10-19', 10, 19),
+            ('bytes=100-', 100, size - 1),
+            ('bytes=-5', size - 5, size - 1),
+            (f'bytes=0-{size * 2}', 0, size - 1),
+        )
+        for header, start, end in cases:
+            with self.subTest(header=header):
+                response = self.client.get(url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.PARTIAL_CONTENT)
+                self.assertEqual(read(response), CONTENT[start:end + 1])
+                self.assertEqual(response['Content-Range'],
+                                 f'bytes {start}-{end}/{size}')
+                self.assertEqual(int(response['Content-Length']),
+                                 end - start + 1)
+        response = self.client.get(url, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code,
+                         HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+        response = self.client.get(url, HTTP_RANGE='bytes=0-1',
+                                   HTTP_IF_RANGE='"другой"')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(read(response), CONTENT)
+
+    @override_settings(NOTES_ATTACHMENTS_ACCEL_PREFIX='/protected/')
+    def test_accel_redirect(self):
+        self.upload(self.note)
+        attachment = Attachment.objects.get()
+        response = self.client.get(
+            reverse('notes:attachment', args=(attachment.pk,))
+        )
+        sha256 = attachment.sha256
+        self.assertEqual(response['X-Accel-Redirect'],
+                         f'/protected/{sha256[:2]}/{sha256[2:4]}/{sha256}')
+        self.assertEqual(response.content, b'')
+
+    def test_other_author_gets_404(self):
+        """Тестируем недоступность чужих вложений и заметок"""
+        self.upload(self.note)
+        attachment = Attachment.objects.get()
+        self.client.force_login(self.reader)
+        for response in (
+            self.client.get(reverse('notes:attachment',
+                                    args=(attachment.pk,))),
+            self.client.post(reverse('notes:attachment_delete',
+                                     args=(attachment.pk,))),
+            self.upload(self.note),
+        ):
+            self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertEqual(Attachment.objects.count(), 1)
+
+    def test_delete_from_another_session(self):
+        """Тестируем форму удаления после запроса страницы другой сессией"""
+        self.upload(self.note)
+        attachment = Attachment.objects.get()
+        detail_url = reverse('notes:detail', args=(self.note.slug,))
+        cache.get_cache().clear()
+        self.client.get(detail_url)
+        self.client.get(detail_url)
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.author)
+        page = client.get(detail_url).content.decode()
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"',
+                          page).group(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(
+                reverse('notes:attachment_delete', args=(attachment.pk,)),
+                {'csrfmiddlewaretoken': token},
+            )
+        self.assertRedirects(response, detail_url,
+                             fetch_redirect_response=False)
+        self.assertFalse(Attachment.objects.exists())
+
+    def test_file_is_removed_with_last_attachment(self):
+        """Тестируем удаление файла, на который никто не ссылается"""
+        self.upload(self.note)
+        self.upload(self.other)
+        first, second = Attachment.objects.order_by('id')
+        path = attachments.blob_path(first.sha256)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('notes:attachment_delete',
+                                     args=(first.pk,)))
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            Note.objects.filter(pk=self.other.pk).bulk_delete()
+        self.assertFalse(Attachment.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_upload_touches_note(self):
+        updated = self.note.updated
+        self.upload(self.note)
+        self.note.refresh_from_db()
+        self.assertGreater(self.note.updated, updated)
+
+    @override_settings(NOTES_ATTACHMENT_MAX_SIZE=100)
+    def test_too_large_file_is_rejected(self):
+        response = self.upload(self.note)
+        self.assertEqual(response.status_code,
+                         HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(Attachment.objects.exists())
+        self.assertEqual(
+            os.listdir(os.path.join(attachments.root(),
+                                    attachments.TEMP_DIR)), []
+        )
+
+    def test_parse_range(self):
+        for header, expected in (
+            (None, None), ('bytes=0-1,5-6', None), ('items=0-1', None),
+            ('bytes=-', None), ('bytes=2-4', (2, 4)), ('bytes=-20', (0, 9)),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(attachments.parse_range(header, 10),
+                                 expected)
+        for header in ('bytes=10-', 'bytes=5-4', 'bytes=-0'):
+            with self.subTest(header=header), \
+                    self.assertRaises(attachments.RangeNotSatisfiable):
+                attachments.parse_range(header, 10)
@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from notes import auth, cache
+from notes.models import Note
+from notes.tests.test_data import NOTES, User
+
+SIGNED_COOKIES = 'django.contrib.sessions.backends.signed_cookies'
+
+
+@override_settings(SESSION_ENGINE=SIGNED_COOKIES,
+                   NOTES_USER_CACHE_TIMEOUT=300)
+class TestCachedUser(TestCase):
+    """Тестируем сессию в cookie и пользователя из кеша"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.author.set_password('old-password')
+        cls.author.save()
+        cls.note = Note.objects.create(author=cls.author, slug='note-slug',
+                                       **NOTES['first_note'])
+        cls.detail_url = reverse('notes:detail', args=(cls.note.slug,))
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.client.force_login(self.author)
+
+    def get_detail_cold(self):
+        """Запрос страницы заметки мимо кеша страниц."""
+        cache.invalidate_authors({self.author.pk})
+        return self.client.get(self.detail_url)
+
+    def test_detail_in_one_query(self):
+        """Тестируем, что страница заметки требует одного запроса"""
+        self.get_detail_cold()
+        with self.assertNumQueries(1):
+            response = self.get_detail_cold()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['object'], self.note)
+
+    def test_cached_page_without_queries(self):
+        """Тестируем страницу из кеша вовсе без запросов"""
+        self.client.get(self.detail_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_password_change_logs_out(self):
+        """Тестируем, что смена пароля завершает прежние сессии"""
+        self.get_detail_cold()
+        user = get_user_model().objects.get(pk=self.author.pk)
+        user.set_password('new-password')
+        user.save()
+        response = self.get_detail_cold()
+        self.assertRedirects(
+            response, f'{reverse("users:login")}?next={self.detail_url}'
+        )
+
+    def test_logout_invalidates_user(self):
+        """Тестируем сброс кеша пользователя при выходе"""
+        self.get_detail_cold()
+        key = auth.user_key(self.author.pk)
+        self.assertIsNotNone(cache.get_cache().get(key))
+        self.client.get(reverse('users:logout'))
+        self.assertIsNone(cache.get_cache().get(key))
+
+    def test_deleted_user_is_anonymous(self):
+        """Тестируем, что удалённый пользователь не остаётся в кеше"""
+        self.get_detail_cold()
+        self.author.delete()
+        self.assertIsNone(cache.get_cache().get(auth.user_key(
+            self.note.author_id
+        )))
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(NOTES_USER_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        """Тестируем чтение пользователя из базы при нулевом таймауте"""
+        self.get_detail_cold()
+        with self.assertNumQueries(2):
+            self.get_detail_cold()
@@ -0,0 +1,110 @@
+import time
+from http import HTTPStatus
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from notes import autocomplete, cache
+from notes.models import Note
+from notes.tests.test_data import User
+
+AUTOCOMPLETE_URL = reverse('notes:autocomplete')
+
+
+class TestAutocomplete(TestCase):
+    """Тестируем подсказки заметок по началу заголовка и slug"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.other = User.objects.create(username='Другой')
+        Note.objects.create(author=cls.author, title='Ржаной хлеб',
+                            text='Текст')
+        Note.objects.create(author=cls.author, title='Ёлка на Новый год',
+                            text='Текст', slug='new-year')
+        Note.objects.create(author=cls.other, title='Хлеб другого',
+                            text='Текст')
+
+    def setUp(self):
+        cache.get_cache().clear()
+        autocomplete.clear()
+
+    def titles(self, prefix, author=None):
+        return [title for title, _ in
+                autocomplete.suggest((author or self.author).pk, prefix)]
+
+    def test_prefixes(self):
+        """Тестируем кириллицу, транслитерацию и начало любого слова"""
+        for prefix, titles in (
+            ('ржа', ['Ржаной хлеб']),
+            ('ХЛЕ', ['Ржаной хлеб']),
+            ('rzhanoj-h', ['Ржаной хлеб']),
+            ('hleb', ['Ржаной хлеб']),
+            ('елка', ['Ёлка на Новый год']),
+            ('новый го', ['Ёлка на Новый год']),
+            ('new y', ['Ёлка на Новый год']),
+            ('Novyij', ['Ёлка на Новый год']),
+            ('булка', []),
+            ('  ', []),
+        ):
+            with self.subTest(prefix=prefix):
+                self.assertEqual(self.titles(prefix), titles)
+        self.assertEqual(self.titles('хлеб', self.other), ['Хлеб другого'])
+
+    def test_index_is_reused_and_invalidated(self):
+        """Тестируем индекс в памяти и его сброс при изменении заметок"""
+        self.titles('хлеб')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles('хлеб'), ['Ржаной хлеб'])
+        note = Note.objects.create(author=self.author, title='Хлебцы',
+                                   text='Текст')
+        self.assertEqual(self.titles('хлеб'), ['Ржаной хлеб', 'Хлебцы'])
+        note.delete()
+        self.assertEqual(self.titles('хлеб'), ['Ржаной хлеб'])
+        Note.objects.filter(author=self.author).bulk_delete()
+        self.assertEqual(self.titles('хлеб'), [])
+
+    @override_settings(NOTES_AUTOCOMPLETE_TIMEOUT=30)
+    def test_index_expires(self):
+        """Тестируем перестройку индекса, изменённого другим процессом"""
+        self.titles('хлеб')
+        # Изменение в другом процессе: токен версии здесь не сброшен.
+        with mock.patch.object(cache, 'invalidate_authors'):
+            Note.objects.filter(title='Ржаной хлеб').update(
+                title='Белый хлеб'
+            )
+        self.assertEqual(self.titles('хлеб'), ['Ржаной хлеб'])
+        later = time.monotonic() + 31
+        with mock.patch('notes.autocomplete.time.monotonic',
+                        return_value=later):
+            self.assertEqual(self.titles('хлеб'), ['Белый хлеб'])
+
+    @override_settings(NOTES_AUTOCOMPLETE_USERS=1)
+    def test_lru_eviction(self):
+        self.titles('хлеб')
+        self.titles('хлеб', self.other)
+        self.assertEqual(list(autocomplete._indexes), [self.other.pk])
+
+    def test_lookup_is_fast(self):
+        """Тестируем, что подсказка по готовому индексу быстрее 1 мс"""
+        index = autocomplete.PrefixIndex(
+            (number, f'Заметка номер {number}', f'note-{number}')
+            for number in range(10000)
+        )
+        started = time.perf_counter()
+        for _ in range(100):
+            results = index.search('заметка номер 12', 10)
+        elapsed = (time.perf_counter() - started) / 100
+        self.assertEqual(len(results), 10)
+        self.assertLess(elapsed, 0.001)
+
+    def test_endpoint(self):
+        self.client.force_login(self.author)
+        response = self.client.get(AUTOCOMPLETE_URL, {'q': 'ржаной'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        note = Note.objects.get(title='Ржаной хлеб')
+        self.assertEqual(response.json(), {'results': [{
+            'title': note.title, 'slug': note.slug,
+            'url': reverse('notes:detail', args=(note.slug,)),
+        }]})
@@ -0,0 +1,77 @@
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from notes import benchmark
+from notes.models import Note
+
+
+class TestBenchmark(TestCase):
+    """Тестируем генератор данных и замеры маршрутов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = benchmark.generate(3, 4, seed=1)
+
+    def test_generate(self):
+        """Тестируем объём данных и slug из кириллических заголовков"""
+        self.assertTrue(self.user.is_superuser)
+        self.assertEqual(Note.objects.count(), 12)
+        self.assertEqual(
+            Note.objects.values('author').distinct().count(), 3
+        )
+        for title, slug in Note.objects.values_list('title', 'slug'):
+            with self.subTest(title=title):
+                self.assertRegex(title, '[а-яё]')
+                self.assertRegex(slug, r'^[a-z0-9-]+$')
+
+    def test_generate_is_reproducible(self):
+        """Тестируем, что одно зерно даёт одни и те же заметки"""
+        titles = list(Note.objects.order_by('id')
+                      .values_list('title', flat=True))
+        Note.objects.all().delete()
+        get_user_model().objects.all().delete()
+        benchmark.generate(3, 4, seed=1)
+        self.assertEqual(
+            list(Note.objects.order_by('id').values_list('title', flat=True)),
+            titles,
+        )
+
+    def test_every_route_is_measured(self):
+        """Тестируем, что замеры покрывают все маршруты без ошибок"""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(NOTES_ATTACHMENTS_ROOT=root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cases = benchmark.build_cases(self.user)
+        self.assertEqual(benchmark.uncovered_routes(cases), [])
+        results = benchmark.run_cases(self.user, cases, iterations=2,
+                                      warmup=0)
+        self.assertEqual(len(results), len(cases))
+        for label, result in results.items():
+            with self.subTest(label=label):
+                self.assertEqual(result['errors'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+                self.assertGreaterEqual(result['queries'], 0)
+
+    def test_compare(self):
+        """Тестируем сравнение двух прогонов"""
+        old = {'runs': [{'size': '1x1', 'routes': {
+            'GET notes:list': {'p50_ms': 2.0, 'queries': 5},
+            'GET notes:home': {'p50_ms': 1.0, 'queries': 1},
+        }}]}
+        new = {'runs': [{'size': '1x1', 'routes': {
+            'GET notes:list': {'p50_ms': 1.0, 'queries': 4},
+            'GET notes:search': {'p50_ms': 1.0, 'queries': 1},
+        }}]}
+        self.assertEqual(list(benchmark.compare(old, new)),
+                         [('1x1', 'GET notes:list', 2.0, 1.0, 5, 4)])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 95), 7)
@@ -0,0 +1,139 @@
+import time
+from http import HTTPStatus
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from notes import cache
+from notes.models import Note
+from notes.tests.test_data import NOTES, TARGET_URLS, User
+
+METRICS_TOKEN = 'secret-token'
+
+
+class TestPageCache(TestCase):
+    """Тестируем кеш страниц заметок и его сброс"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.reader = User.objects.create(username='Читатель')
+        cls.note = Note.objects.create(
+            author=cls.author, slug='note-slug',
+            title=NOTES['first_note']['title'],
+            text=NOTES['first_note']['text'],
+        )
+        cls.detail_url = reverse('notes:detail', args=(cls.note.slug,))
+        cls.list_url = reverse(TARGET_URLS['list_page'])
+
+    def setUp(self):
+        cache.get_cache().clear()
+        cache.reset_stats()
+        self.client.force_login(self.author)
+
+    @override_settings(NOTES_USER_CACHE_TIMEOUT=300)
+    def test_second_request_is_served_from_cache(self):
+        """Тестируем, что повторный запрос не обращается к заметкам"""
+        first = self.client.get(self.detail_url)
+        # Остаётся только чтение сессии: пользователь тоже в кеше.
+        with self.assertNumQueries(1):
+            second = self.client.get(self.detail_url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(cache.get_stats(), {
+            ('NoteDetail', cache.MISS): 1,
+            ('NoteDetail', cache.HIT): 1,
+        })
+
+    def test_pages_are_cached_per_user(self):
+        """Тестируем, что чужой пользователь не видит закешированное"""
+        self.client.get(self.detail_url)
+        self.client.force_login(self.reader)
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_edit_invalidates_cache(self):
+        """Тестируем сброс кеша при редактировании заметки"""
+        self.client.get(self.detail_url)
+        self.client.get(self.list_url)
+        self.client.post(
+            reverse(TARGET_URLS['edit_page'], args=(self.note.slug,)),
+            data={'title': NOTES['edited_note']['title'],
+                  'text': NOTES['edited_note']['text'],
+                  'slug': self.note.slug},
+        )
+        for url in (self.detail_url, self.list_url):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, NOTES['edited_note']['title'])
+
+    def test_delete_invalidates_cache(self):
+        """Тестируем сброс кеша при удалении заметки"""
+        self.client.get(self.detail_url)
+        self.client.post(
+            reverse(TARGET_URLS['delete_page'], args=(self.note.slug,))
+        )
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_bulk_create_invalidates_cache(self):
+        """Тестируем сброс кеша при массовом создании заметок"""
+        self.client.get(self.list_url)
+        Note.objects.bulk_create([
+            Note(author=self.author, title='Новая', text='Текст',
+                 slug='new-note')
+        ])
+        self.assertContains(self.client.get(self.list_url), 'Новая')
+
+    @override_settings(NOTES_CACHE_VERSION_TIMEOUT=10)
+    def test_version_expires_in_process_cache(self):
+        """Тестируем, что токен версии в кеше процесса истекает"""
+        version = cache.get_version(self.author.pk)
+        self.assertEqual(cache.get_version(self.author.pk), version)
+        later = time.time() + 11
+        with mock.patch('django.core.cache.backends.locmem.time.time',
+                        return_value=later):
+            self.assertNotEqual(cache.get_version(self.author.pk), version)
+
+    def test_author_change_invalidates_both_authors(self):
+        """Тестируем сброс кеша прежнего автора при смене автора"""
+        self.client.get(self.detail_url)
+        self.note.author = self.reader
+        self.note.save()
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(NOTES_METRICS_TOKEN=METRICS_TOKEN)
+class TestCacheMetrics(TestCase):
+    """Тестируем доступ к счётчикам кеша"""
+
+    url = reverse('notes:cache_metrics')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='Пользователь')
+        cls.staff = User.objects.create(username='Персонал', is_staff=True)
+
+    def test_regular_user_is_forbidden(self):
+        """Тестируем, что обычный пользователь не видит метрики"""
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+    def test_staff_and_token_access(self):
+        """Тестируем доступ персонала и доступ по токену"""
+        cache.reset_stats()
+        cache.record('NoteDetail', cache.HIT)
+        self.client.force_login(self.staff)
+        staff_response = self.client.get(self.url)
+        self.client.logout()
+        token_response = self.client.get(
+            self.url, HTTP_AUTHORIZATION=f'Bearer {METRICS_TOKEN}'
+        )
+        for response in (staff_response, token_response):
+            self.assertContains(
+                response,
+                'notes_page_cache_requests_total'
+                '{view="NoteDetail",result="hit"} 1',
+            )
@@ -0,0 +1,94 @@
+from http import HTTPStatus
+
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from notes.models import Note, NoteChange
+from notes.tests.test_data import NOTES, User
+
+CHANGES_URL = reverse('api:changes')
+
+
+class TestChangeFeed(TestCase):
+    """Тестируем ленту изменений для синхронизации"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.reader = User.objects.create(username='Читатель')
+        cls.first = Note.objects.create(author=cls.author, slug='first',
+                                        **NOTES['first_note'])
+        cls.second = Note.objects.create(author=cls.author, slug='second',
+                                         **NOTES['second_note'])
+        Note.objects.create(author=cls.reader, slug='foreign',
+                            **NOTES['edited_note'])
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def feed(self, cursor=0, **params):
+        response = self.client.get(CHANGES_URL, {'cursor': cursor, **params})
+        return response.json()
+
+    def test_initial_sync_and_paging(self):
+        """Тестируем первую синхронизацию по страницам"""
+        first_page = self.feed(limit=1)
+        self.assertTrue(first_page['has_more'])
+        self.assertEqual(first_page['changes'][0]['slug'], 'first')
+        self.assertEqual(first_page['changes'][0]['text'],
+                         NOTES['first_note']['text'])
+        second_page = self.feed(first_page['cursor'], limit=1)
+        self.assertEqual([change['slug'] for change in second_page['changes']],
+                         ['second'])
+        self.assertFalse(second_page['has_more'])
+
+    def test_only_latest_changes_after_cursor(self):
+        """Тестируем, что после курсора приходят только новые изменения"""
+        cursor = self.feed()['cursor']
+        self.assertEqual(self.feed(cursor)['changes'], [])
+        self.first.text = 'Новый текст'
+        self.first.save()
+        self.first.save()
+        second_id = self.second.pk
+        self.second.delete()
+        changes = self.feed(cursor)['changes']
+        self.assertEqual(
+            [(change['id'], change['deleted']) for change in changes],
+            [(self.first.pk, False), (second_id, True)],
+        )
+        self.assertEqual(NoteChange.objects.filter(author=self.author).count(),
+                         2)
+
+    def test_bulk_operations_are_recorded(self):
+        """Тестируем запись массовых изменений"""
+        cursor = self.feed()['cursor']
+        Note.objects.bulk_create([Note(author=self.author, slug='bulk',
+                                       title='Пачка', text='Текст')])
+        Note.objects.filter(slug='first').update(title='Обновлено')
+        changes = self.feed(cursor)['changes']
+        self.assertEqual([change['slug'] for change in changes],
+                         ['bulk', 'first'])
+        self.assertEqual(changes[1]['title'], 'Обновлено')
+
+    def test_author_change_leaves_tombstone(self):
+        """Тестируем надгробие у прежнего автора заметки"""
+        cursor = self.feed()['cursor']
+        self.first.author = self.reader
+        self.first.save()
+        changes = self.feed(cursor)['changes']
+        self.assertEqual([(change['id'], change['deleted'])
+                          for change in changes], [(self.first.pk, True)])
+
+    def test_user_deletion_removes_feed(self):
+        """Тестируем удаление ленты вместе с пользователем"""
+        self.author.delete()
+        self.assertFalse(
+            NoteChange.objects.filter(author_id=self.author.pk).exists()
+        )
+
+    def test_anonymous_and_bad_cursor(self):
+        """Тестируем анонимный доступ и некорректный курсор"""
+        response = Client().get(CHANGES_URL)
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        response = self.client.get(CHANGES_URL, {'cursor': 'x'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
@@ -0,0 +1,111 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from notes import benchmark, compression, search
+from notes.models import Note
+from notes.tests.test_data import User
+
+THRESHOLD = 100
+LONG_TEXT = 'Строка лога сервера\n' * 50
+
+
+def stored_value(note):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT text FROM notes_note WHERE id = %s',
+                       (note.pk,))
+        return cursor.fetchone()[0]
+
+
+@override_settings(NOTES_TEXT_COMPRESSION_THRESHOLD=THRESHOLD)
+class TestCompression(TestCase):
+    """Тестируем сжатое хранение длинного текста заметок"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        with override_settings(NOTES_TEXT_COMPRESSION_THRESHOLD=THRESHOLD):
+            cls.note = Note.objects.create(author=cls.author, title='Лог',
+                                           text=LONG_TEXT)
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def test_encode(self):
+        """Тестируем выбор формата хранения"""
+        cases = (
+            ('коротко', compression.PLAIN),
+            (LONG_TEXT, compression.ZLIB),
+        )
+        for text, flag in cases:
+            with self.subTest(flag=flag):
+                value = compression.encode(text)
+                self.assertEqual(value[:1], flag)
+                self.assertEqual(compression.decode(value), text)
+        self.assertEqual(compression.encode(LONG_TEXT, 0)[:1],
+                         compression.PLAIN)
+
+    def test_long_text_is_stored_compressed(self):
+        """Тестируем прозрачность сжатия для модели, страниц и поиска"""
+        value = bytes(stored_value(self.note))
+        self.assertEqual(value[:1], compression.ZLIB)
+        self.assertLess(len(value), len(LONG_TEXT.encode()))
+        self.assertEqual(Note.objects.get().text, LONG_TEXT)
+        self.assertEqual(Note.objects.values_list('text', flat=True).get(),
+                         LONG_TEXT)
+        response = self.client.get(reverse('notes:edit',
+                                           args=(self.note.slug,)))
+        self.assertEqual(response.context['form'].initial['text'], LONG_TEXT)
+        response = self.client.get(reverse('notes:detail',
+                                           args=(self.note.slug,)))
+        self.assertContains(response, 'Строка лога сервера')
+        self.assertEqual(search.search_notes(self.author, 'сервера', 10),
+                         [self.note])
+
+    def test_form_saves_compressed(self):
+        """Тестируем сохранение формы длинным и коротким текстом"""
+        url = reverse('notes:edit', args=(self.note.slug,))
+        for text, flag in (('Коротко', compression.PLAIN),
+                           (LONG_TEXT.strip(), compression.ZLIB)):
+            with self.subTest(flag=flag):
+                self.client.post(url, {'title': 'Лог', 'text': text,
+                                       'slug': self.note.slug})
+                self.assertEqual(bytes(stored_value(self.note))[:1], flag)
+                self.note.refresh_from_db()
+                self.assertEqual(self.note.text, text)
+
+    def test_command_compresses_existing_rows(self):
+        """Тестируем перезапись старых строк командой compress_notes"""
+        short = Note.objects.create(author=self.author, title='Кратко',
+                                    text='Коротко')
+        with connection.cursor() as cursor:
+            # Так выглядят строки, оставшиеся от текстовой колонки.
+            cursor.execute('UPDATE notes_note SET text = %s', (LONG_TEXT,))
+            cursor.execute('UPDATE notes_note SET text = %s WHERE id = %s',
+                           ('Коротко', short.pk))
+        self.assertEqual(Note.objects.get(pk=self.note.pk).text, LONG_TEXT)
+        updated = self.note.updated
+        out = StringIO()
+        call_command('compress_notes', '--batch-size', '1', stdout=out)
+        self.assertIn('Обработано заметок: 2', out.getvalue())
+        self.assertEqual(bytes(stored_value(self.note))[:1],
+                         compression.ZLIB)
+        self.assertEqual(bytes(stored_value(short)),
+                         compression.PLAIN + 'Коротко'.encode())
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.text, self.note.updated),
+                         (LONG_TEXT, updated))
+
+    def test_benchmark(self):
+        """Тестируем замер хранения и чтения со сжатием и без"""
+        results = benchmark.measure_compression(self.author, sizes=(2000,),
+                                                iterations=2)
+        plain, compressed = results
+        self.assertEqual((plain['mode'], compressed['mode']),
+                         ('plain', 'zlib'))
+        self.assertGreater(plain['stored_bytes'], 2000)
+        self.assertLess(compressed['stored_bytes'], 2000)
+        self.assertEqual(Note.objects.count(), 1)
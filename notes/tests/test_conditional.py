@@ -0,0 +1,78 @@
+from http import HTTPStatus
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from notes import cache
+from notes.models import Note
+from notes.tests.test_data import NOTES, TARGET_URLS, User
+
+
+class TestConditionalGet(TestCase):
+    """Тестируем ответы 304 на условные запросы"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.note = Note.objects.create(
+            author=cls.author, slug='note-slug',
+            title=NOTES['first_note']['title'],
+            text=NOTES['first_note']['text'],
+        )
+        cls.detail_url = reverse('notes:detail', args=(cls.note.slug,))
+        cls.list_url = reverse(TARGET_URLS['list_page'])
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.client.force_login(self.author)
+
+    def test_timestamps_are_set(self):
+        """Тестируем заполнение времени создания и изменения"""
+        self.assertIsNotNone(self.note.created)
+        self.assertGreaterEqual(self.note.updated, self.note.created)
+
+    def test_detail_if_none_match(self):
+        """Тестируем 304 по ETag без загрузки заметки"""
+        etag = self.client.get(self.detail_url)['ETag']
+        cache.get_cache().clear()
+        # Сессия, пользователь и запрос валидаторов без текста.
+        with self.assertNumQueries(3):
+            response = self.client.get(self.detail_url,
+                                       HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_detail_if_modified_since(self):
+        """Тестируем 304 по Last-Modified"""
+        last_modified = self.client.get(self.detail_url)['Last-Modified']
+        response = self.client.get(self.detail_url,
+                                   HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    @override_settings(NOTES_USER_CACHE_TIMEOUT=300)
+    def test_cached_page_answers_conditional_request(self):
+        """Тестируем 304 для страницы из кеша без запросов к заметкам"""
+        etag = self.client.get(self.detail_url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url,
+                                       HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_edit_changes_etag(self):
+        """Тестируем, что после изменения заметки отдаётся новая версия"""
+        etag = self.client.get(self.detail_url)['ETag']
+        self.note.text = NOTES['edited_note']['text']
+        self.note.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_etag_changes_on_delete(self):
+        """Тестируем, что удаление заметки меняет ETag списка"""
+        etag = self.client.get(self.list_url)['ETag']
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Note.objects.create(author=self.author, title='Другая', text='Текст',
+                            slug='other')
+        self.note.delete()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
@@ -1,9 +1,13 @@
-from django.test import TestCase
+from http import HTTPStatus
+
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
+from notes import cache
 from notes.models import Note
 from notes.forms import NoteForm
-from notes.tests.test_data import (User, NOTES_COUNT, TARGET_URLS)
+from notes.tests.test_data import (User, NOTES_COUNT, PAGE_SIZE,
+                                   TARGET_URLS)
 
 
 class TestListPage(TestCase):
@@ -19,6 +23,10 @@ class TestListPage(TestCase):
             all_notes.append(note)
         Note.objects.bulk_create(all_notes)
 
+    def setUp(self):
+        # Тесты проверяют контекст шаблона, а его нет у ответа из кеша.
+        cache.get_cache().clear()
+
     def test_notes_order(self):
         """Тестируем сортировку заметок по id"""
         self.client.force_login(self.author)
@@ -28,6 +36,42 @@ class TestListPage(TestCase):
         sorted_ids = sorted(all_ids)
         self.assertEqual(all_ids, sorted_ids)
 
+    @override_settings(NOTES_PAGE_SIZE=PAGE_SIZE)
+    def test_keyset_pagination(self):
+        """Тестируем переходы по курсорам ?after= и ?before="""
+        self.client.force_login(self.author)
+        url = reverse(TARGET_URLS['list_page'])
+        first_page = self.client.get(url).context['page_obj']
+        self.assertEqual(len(first_page), PAGE_SIZE)
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+        second_page = self.client.get(
+            url, {'after': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second_page), NOTES_COUNT - PAGE_SIZE)
+        self.assertTrue(second_page.has_previous())
+        self.assertFalse(second_page.has_next())
+        back_page = self.client.get(
+            url, {'before': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual([note.id for note in back_page],
+                         [note.id for note in first_page])
+        self.assertFalse(back_page.has_previous())
+
+    def test_list_defers_text(self):
+        """Тестируем, что текст заметок не загружается в список"""
+        self.client.force_login(self.author)
+        response = self.client.get(reverse(TARGET_URLS['list_page']))
+        for note in response.context['object_list']:
+            self.assertIn('text', note.get_deferred_fields())
+
+    def test_invalid_cursor(self):
+        """Тестируем, что некорректный курсор возвращает 404"""
+        self.client.force_login(self.author)
+        response = self.client.get(reverse(TARGET_URLS['list_page']),
+                                   {'after': 'abc'})
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
     def test_authorized_client_has_form(self):
         """Тестируем, что авторизированному пользователю форма доступна"""
         self.client.force_login(self.author)
@@ -39,3 +39,4 @@ NOTE_WAS_NOT_DELETED: Final[int] = 1
 NOTE_WAS_ADDED: Final[int] = 2
 NOTE_WAS_DELETED: Final[int] = 0
 NOTES_COUNT: Final[int] = 15
+PAGE_SIZE: Final[int] = 10
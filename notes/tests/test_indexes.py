@@ -0,0 +1,104 @@
+import re
+
+from django.db import connection
+from django.test import RequestFactory, TestCase
+
+from notes import views
+from notes.models import Note
+from notes.tests.test_data import User
+
+# Столько строк «видит» планировщик SQLite в таблице заметок.
+ESTIMATED_ROWS = 1_000_000
+ROWS_PER_AUTHOR = 100
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?notes_note\b')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+class TestQueryPlans(TestCase):
+    """Тестируем, что запросы NoteBase используют индексы.
+
+    Вместо вставки миллиона строк подменяем статистику sqlite_stat1:
+    планировщик выбирает план так, будто в таблице ESTIMATED_ROWS
+    заметок, по ROWS_PER_AUTHOR на автора.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.note = Note.objects.create(author=cls.author, title='Заголовок',
+                                       text='Текст', slug='note-slug')
+        cls.fake_statistics()
+
+    @classmethod
+    def fake_statistics(cls):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute("DELETE FROM sqlite_stat1 WHERE tbl = 'notes_note'")
+            cursor.execute(
+                'INSERT INTO sqlite_stat1 (tbl, idx, stat) '
+                'VALUES (%s, NULL, %s)',
+                ('notes_note', str(ESTIMATED_ROWS)),
+            )
+            cursor.execute(
+                "SELECT name FROM sqlite_master "
+                "WHERE type = 'index' AND tbl_name = 'notes_note'"
+            )
+            for (name,) in cursor.fetchall():
+                cursor.execute(f'PRAGMA index_info("{name}")')
+                columns = [row[2] for row in cursor.fetchall()]
+                # Ключ, начинающийся с author_id, отбирает заметки автора,
+                # любой более длинный префикс — одну строку.
+                stat = [ESTIMATED_ROWS] + [
+                    ROWS_PER_AUTHOR if column == 'author_id' and not position
+                    else 1
+                    for position, column in enumerate(columns)
+                ]
+                cursor.execute(
+                    'INSERT INTO sqlite_stat1 (tbl, idx, stat) '
+                    'VALUES (%s, %s, %s)',
+                    ('notes_note', name, ' '.join(map(str, stat))),
+                )
+            cursor.execute('ANALYZE sqlite_master')
+
+    def get_view(self, view_class, **kwargs):
+        request = RequestFactory().get('/')
+        request.user = self.author
+        view = view_class()
+        view.setup(request, **kwargs)
+        return view
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_uses_index(self, queryset):
+        plan = self.explain(queryset)
+        for detail in plan:
+            self.assertIsNone(FULL_SCAN.match(detail), plan)
+            self.assertNotIn(TEMP_SORT, detail, plan)
+
+    def test_list_queryset(self):
+        """Тестируем план запроса страницы списка заметок"""
+        view = self.get_view(views.NotesList)
+        queryset = view.get_queryset()
+        pages = (
+            queryset.order_by(*view.keyset_ordering),
+            queryset.filter(id__gt=self.note.id).order_by(
+                *view.keyset_ordering),
+            queryset.filter(id__lt=self.note.id).order_by(
+                *[f'-{field}' for field in view.keyset_ordering]),
+        )
+        for page in pages:
+            with self.subTest(sql=str(page.query)):
+                self.assert_uses_index(page[:view.get_paginate_by(page)])
+
+    def test_slug_querysets(self):
+        """Тестируем планы запросов заметки по slug"""
+        for view_class in (views.NoteDetail, views.NoteUpdate,
+                           views.NoteDelete):
+            with self.subTest(view=view_class.__name__):
+                view = self.get_view(view_class, slug=self.note.slug)
+                queryset = view.get_queryset().filter(slug=self.note.slug)
+                self.assert_uses_index(queryset)
@@ -0,0 +1,57 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from notes import cache, instrumentation
+from notes.models import Note
+from notes.tests.test_data import NOTES, TARGET_URLS, User
+
+
+@override_settings(NOTES_PERF_ENABLED=True)
+class TestPerformanceMiddleware(TestCase):
+    """Тестируем замеры времени запросов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.staff = User.objects.create(username='Персонал', is_staff=True)
+        Note.objects.create(author=cls.author, slug='note-slug',
+                            **NOTES['first_note'])
+
+    def setUp(self):
+        cache.get_cache().clear()
+        instrumentation.registry.reset()
+
+    def test_server_timing_header(self):
+        """Тестируем заголовок Server-Timing"""
+        self.client.force_login(self.author)
+        response = self.client.get(reverse(TARGET_URLS['list_page']))
+        header = response['Server-Timing']
+        for metric in instrumentation.METRICS:
+            self.assertIn(f'{metric};dur=', header)
+        # Сессия, пользователь, валидаторы, облако тегов, страница
+        # заметок и их теги.
+        self.assertIn('desc="6 SQL"', header)
+
+    def test_histograms_by_route(self):
+        """Тестируем гистограммы по именам маршрутов"""
+        self.client.force_login(self.author)
+        self.client.get(reverse(TARGET_URLS['list_page']))
+        self.client.get(reverse('users:login'))
+        self.client.force_login(self.staff)
+        text = self.client.get(reverse('notes:request_metrics')).content
+        text = text.decode()
+        for route in ('notes:list', 'users:login'):
+            self.assertIn(
+                f'notes_request_duration_ms_count{{route="{route}",'
+                f'phase="total"}} 1', text,
+            )
+        self.assertIn('notes_request_queries_total{route="notes:list"} 6',
+                      text)
+
+
+class TestDisabledMiddleware(TestCase):
+    """Тестируем, что выключенное middleware не участвует в запросе"""
+
+    def test_no_header(self):
+        response = self.client.get(reverse('notes:home'))
+        self.assertFalse(response.has_header('Server-Timing'))
@@ -0,0 +1,235 @@
+import json
+import os
+import subprocess
+import tempfile
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from http import HTTPStatus
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from notes import jobs, stress
+from notes.models import Job, Note
+from notes.tests.test_data import User
+
+
+def broken_task(job):
+    raise RuntimeError('Сломалось')
+
+
+def requeued_task(job):
+    """Пока задача выполняется, её отнимают как зависшую."""
+    Job.objects.filter(pk=job.pk).update(
+        heartbeat=timezone.now() - timedelta(days=1)
+    )
+    jobs.Supervisor(1).requeue_stale()
+    Job.objects.update(run_after=timezone.now())
+    Job.objects.claim('другой')
+    job.report(1, 1)
+    return 'устарело'
+
+
+def broken_future():
+    future = futures.Future()
+    future.set_exception(BrokenProcessPool('Процесс пула убит'))
+    return future
+
+
+@override_settings(NOTES_JOB_ATTEMPTS=2, NOTES_JOB_RETRY_DELAY=60)
+class TestJobs(TestCase):
+    """Тестируем очередь фоновых задач"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.reader = User.objects.create(username='Читатель')
+        Note.objects.bulk_create_with_slugs([
+            Note(author=cls.author, title=f'Заметка {number}', text='*Текст*')
+            for number in range(3)
+        ])
+
+    def test_claim_by_priority(self):
+        """Тестируем порядок выдачи задач исполнителю"""
+        low = Job.objects.enqueue('render_notes', self.author)
+        high = Job.objects.enqueue('render_notes', self.author, priority=5)
+        later = Job.objects.enqueue('render_notes', self.author, priority=9)
+        later.run_after = timezone.now() + timedelta(hours=1)
+        later.save()
+        self.assertEqual(Job.objects.claim('w'), high)
+        claimed = Job.objects.claim('w')
+        self.assertEqual(claimed, low)
+        self.assertEqual((claimed.status, claimed.attempts, claimed.worker),
+                         (Job.RUNNING, 1, 'w'))
+        self.assertIsNone(Job.objects.claim('w'))
+
+    def test_execute_reports_progress(self):
+        Note.objects.update(html='')
+        job = Job.objects.enqueue('render_notes', self.author)
+        Job.objects.claim('w')
+        self.assertEqual(jobs.execute(job.pk, 'w', 1), Job.DONE)
+        job.refresh_from_db()
+        self.assertEqual((job.done, job.total, job.percent, job.result),
+                         (3, 3, 100, {'rendered': 3}))
+        self.assertFalse(Note.objects.filter(html='').exists())
+
+    def test_retry_then_fail(self):
+        """Тестируем повтор с задержкой и окончательную ошибку"""
+        task = jobs.Task('broken', 'Сломанная', broken_task, False)
+        job = Job.objects.enqueue('broken', self.author)
+        with mock.patch.dict(jobs.TASKS, {'broken': task}):
+            Job.objects.claim('w')
+            self.assertEqual(jobs.execute(job.pk, 'w', 1), Job.QUEUED)
+            job.refresh_from_db()
+            self.assertGreater(job.run_after,
+                               timezone.now() + timedelta(seconds=50))
+            self.assertEqual(job.error_summary, 'RuntimeError: Сломалось')
+            self.assertIsNone(Job.objects.claim('w'))
+            Job.objects.update(run_after=timezone.now())
+            Job.objects.claim('w')
+            self.assertEqual(jobs.execute(job.pk, 'w', 2), Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(job.finished)
+
+    @override_settings(NOTES_JOB_TIMEOUT=60)
+    def test_stale_jobs(self):
+        job = Job.objects.enqueue('render_notes', self.author)
+        Job.objects.claim('w')
+        self.assertFalse(Job.objects.stale().exists())
+        Job.objects.update(heartbeat=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(list(Job.objects.stale()), [job])
+        self.assertEqual(jobs.fail(job.pk, 'w', 1, jobs.STALE_ERROR),
+                         Job.QUEUED)
+
+    def test_stale_requeue_before_finish(self):
+        """Тестируем попытку, у которой задачу забрали как зависшую"""
+        task = jobs.Task('requeued', 'Отнятая', requeued_task, False)
+        job = Job.objects.enqueue('requeued', self.author)
+        with mock.patch.dict(jobs.TASKS, {'requeued': task}):
+            Job.objects.claim('w')
+            self.assertEqual(jobs.execute(job.pk, 'w', 1), jobs.LOST)
+        self.assertEqual(jobs.fail(job.pk, 'w', 1, 'Поздно'), jobs.LOST)
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.status, job.worker, job.attempts, job.done, job.result),
+            (Job.RUNNING, 'другой', 2, 0, None),
+        )
+        self.assertEqual(job.error, jobs.STALE_ERROR)
+
+    def test_broken_pool(self):
+        """Тестируем, что поломка пула засчитывается только виновнику"""
+        first, second = (Job.objects.enqueue('render_notes', self.author)
+                         for _ in range(2))
+        supervisor = jobs.Supervisor(2)
+        for _ in range(2):
+            claimed = Job.objects.claim(supervisor.worker)
+            supervisor.running[broken_future()] = (claimed.pk,
+                                                   claimed.attempts)
+        self.assertTrue(supervisor.collect(0))
+        self.assertEqual(supervisor.suspects, {first.pk, second.pk})
+        self.assertEqual(
+            set(Job.objects.values_list('status', 'attempts', 'worker')),
+            {(Job.QUEUED, 0, '')},
+        )
+        pool = mock.Mock()
+        pool.submit.side_effect = lambda *args: broken_future()
+        supervisor.submit(pool)
+        self.assertEqual(pool.submit.call_args.args[1:],
+                         (first.pk, supervisor.worker, 1))
+        self.assertTrue(supervisor.collect(0))
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), (Job.QUEUED, 1))
+        self.assertIn('BrokenProcessPool', first.error)
+        self.assertEqual(supervisor.suspects, {first.pk, second.pk})
+        Job.objects.update(run_after=timezone.now())
+        supervisor.submit(pool)
+        self.assertEqual(pool.submit.call_args.args[1:],
+                         (first.pk, supervisor.worker, 2))
+        supervisor.collect(0)
+        self.assertEqual(supervisor.suspects, {second.pk})
+        self.assertEqual(Job.objects.get(pk=first.pk).status, Job.FAILED)
+
+    def test_delete_notes(self):
+        slugs = list(Note.objects.values_list('slug', flat=True)[:2])
+        job = Job.objects.enqueue('delete_notes', self.author,
+                                  params={'slugs': slugs})
+        Job.objects.claim('w')
+        jobs.execute(job.pk, 'w', 1)
+        job.refresh_from_db()
+        self.assertEqual(job.result, {'deleted': 2})
+        self.assertEqual(Note.objects.count(), 1)
+
+    def test_status_pages(self):
+        """Тестируем страницы задач только своего пользователя"""
+        self.client.force_login(self.author)
+        response = self.client.post(reverse('notes:job_add'),
+                                    {'name': 'reindex_notes'})
+        self.assertRedirects(response, reverse('notes:jobs'))
+        job = Job.objects.get()
+        self.assertEqual((job.author, job.name, job.status),
+                         (self.author, 'reindex_notes', Job.QUEUED))
+        response = self.client.get(reverse('notes:jobs'))
+        self.assertContains(response, 'Обновить поисковый индекс')
+        self.assertContains(response, 'http-equiv="refresh"')
+        url = reverse('notes:job', args=(job.pk,))
+        self.assertContains(self.client.get(url), 'В очереди')
+        response = self.client.post(reverse('notes:job_add'),
+                                    {'name': 'delete_notes'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.get(url).status_code,
+                         HTTPStatus.NOT_FOUND)
+        self.assertNotContains(self.client.get(reverse('notes:jobs')),
+                               'Обновить поисковый индекс</a>')
+
+
+# Ставит задачи во временной базе и печатает их состояния.
+ENQUEUE = """
+from notes.models import Job, Note
+from notes.tests.test_data import User
+author = User.objects.create(username='author')
+Note.objects.bulk_create_with_slugs(
+    [Note(author=author, title='Note', text='Text') for _ in range(20)]
+)
+Job.objects.enqueue('render_notes', author)
+Job.objects.enqueue('reindex_notes', author, priority=1)
+Job.objects.enqueue('unknown', author)
+"""
+STATUSES = """
+import json
+from notes.models import Job
+print(json.dumps(dict(Job.objects.values_list('name', 'status'))))
+"""
+
+
+class TestRunWorkers(SimpleTestCase):
+    """Тестируем выполнение очереди командой на пуле процессов"""
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, 'NOTES_DB_MODE': 'production',
+                   'NOTES_DB_NAME': str(Path(directory) / 'jobs.sqlite3'),
+                   'NOTES_JOB_ATTEMPTS': '2', 'NOTES_JOB_RETRY_DELAY': '0'}
+            for command in (stress.manage('migrate', '-v0'),
+                            stress.manage('shell', '-c', ENQUEUE)):
+                subprocess.run(command, env=env, check=True)
+            output = subprocess.run(
+                stress.manage('run_workers', '--burst', '--processes', '2'),
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            statuses = subprocess.run(
+                stress.manage('shell', '-c', STATUSES),
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+        self.assertIn('Выполнено задач: 2, отложено для повтора: 1, '
+                      'с ошибкой: 1.', output)
+        self.assertEqual(json.loads(statuses), {
+            'render_notes': Job.DONE,
+            'reindex_notes': Job.DONE,
+            'unknown': Job.FAILED,
+        })
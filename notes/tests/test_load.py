@@ -0,0 +1,93 @@
+import json
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from notes import load, stress
+from notes.models import Note
+from notes.tests.test_data import User
+
+# В процессе теста база SQLite в памяти: её общий кеш блокирует
+# таблицы при одновременной записи, поэтому здесь пользователь один,
+# а одновременных проверяет TestConcurrentLoad в отдельном процессе.
+USERS = 1
+REQUESTS = 8
+NOTES = 2
+CONCURRENT_USERS = 4
+# Медленные клиенты: WSGI с одним потоком успевает не больше
+# 1000 / SLOW_CLIENT_MS ответов в секунду, ASGI ждёт их одновременно.
+SLOW_CLIENT_MS = 50
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']
+)
+class TestLoad(TransactionTestCase):
+    """Тестируем нагрузку одновременными пользователями"""
+
+    def test_targets(self):
+        """Тестируем все способы вызова приложения без ошибок"""
+        for target in load.TARGETS:
+            with self.subTest(target=target):
+                result = load.run(target, USERS, REQUESTS, notes=NOTES)
+                routes = result['routes']
+                self.assertEqual(routes['total']['requests'],
+                                 USERS * REQUESTS)
+                self.assertEqual(routes['total']['errors'], 0)
+                self.assertGreater(routes['total']['rps'], 0)
+                self.assertLessEqual(routes['total']['p50_ms'],
+                                     routes['total']['p99_ms'])
+        self.assertEqual(User.objects.count(), USERS * len(load.TARGETS))
+        self.assertTrue(Note.objects.exists())
+
+    def test_mix(self):
+        """Тестируем смесь только из чтения списка"""
+        result = load.run(load.WSGI, 1, REQUESTS, mix=load.parse_mix('list=1'),
+                          notes=0)
+        self.assertEqual(set(result['routes']), {'list', 'total'})
+        for value in ('list=0', 'unknown=1', 'list=x'):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                load.parse_mix(value)
+
+
+class TestConcurrentLoad(SimpleTestCase):
+    """Тестируем одновременных пользователей командой во временной базе"""
+
+    def load(self, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'load.json'
+            subprocess.run(
+                stress.manage('load_notes', '--users', str(CONCURRENT_USERS),
+                              '--requests', str(REQUESTS), '--notes',
+                              str(NOTES), '--output', str(output), *args),
+                env={**os.environ, 'NOTES_DB_MODE': 'production',
+                     'NOTES_DB_NAME': str(Path(directory) / 'unused.db')},
+                check=True, capture_output=True,
+            )
+            return json.loads(output.read_text(encoding='utf-8'))
+
+    def test_command(self):
+        report = self.load()
+        self.assertEqual([run['target'] for run in report['runs']],
+                         list(load.TARGETS))
+        for run in report['runs']:
+            with self.subTest(target=run['target']):
+                total = run['routes']['total']
+                self.assertEqual(total['requests'],
+                                 CONCURRENT_USERS * REQUESTS)
+                self.assertEqual(total['errors'], 0)
+
+    def test_slow_clients(self):
+        """Тестируем WSGI и асинхронный ASGI при медленных клиентах"""
+        report = self.load('--target', load.WSGI, '--target', load.ASGI,
+                           '--mix', 'list=1,detail=1', '--workers', '1',
+                           '--slow-client', str(SLOW_CLIENT_MS))
+        self.assertEqual(report['environment']['slow_client_ms'],
+                         SLOW_CLIENT_MS)
+        wsgi, asgi = (run['routes']['total'] for run in report['runs'])
+        self.assertEqual(wsgi['errors'] + asgi['errors'], 0)
+        self.assertLessEqual(wsgi['rps'], 1000 / SLOW_CLIENT_MS)
+        self.assertGreater(asgi['rps'], wsgi['rps'])
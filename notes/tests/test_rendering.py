@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import models
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from notes import cache, rendering
+from notes.models import Note
+from notes.tests.test_data import User
+
+MARKDOWN = '# Покупки\n\n- **хлеб**\n- [молоко](https://example.com)'
+UNSAFE = ('<script>alert(1)</script> [ссылка](javascript:alert(1)) '
+          '<img src="x.png" onerror="alert(1)">')
+
+
+class TestRendering(TestCase):
+    """Тестируем Markdown, отрисованный при сохранении заметки"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.note = Note.objects.create(author=cls.author, title='Покупки',
+                                       text=MARKDOWN)
+        cls.url = reverse('notes:detail', args=(cls.note.slug,))
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.client.force_login(self.author)
+
+    def test_html_is_rendered_on_save(self):
+        """Тестируем HTML и версию отрисовки после сохранения"""
+        self.assertEqual(self.note.html_version, rendering.VERSION)
+        self.assertInHTML('<h1>Покупки</h1>', self.note.html)
+        self.assertInHTML('<li><strong>хлеб</strong></li>', self.note.html)
+        self.assertInHTML('<a href="https://example.com">молоко</a>',
+                          self.note.html)
+
+    def test_html_is_sanitized(self):
+        """Тестируем удаление опасной разметки"""
+        html = rendering.render(UNSAFE)
+        for fragment in ('<script', 'javascript:', 'onerror'):
+            with self.subTest(fragment=fragment):
+                self.assertNotIn(fragment, html)
+        self.assertIn('<img src="x.png">', html)
+
+    @override_settings(NOTES_MARKDOWN_MAX_LENGTH=10)
+    def test_long_text_is_not_parsed(self):
+        """Тестируем вывод длинного текста как есть"""
+        self.assertEqual(rendering.render('**<b>слишком длинно</b>**'),
+                         '<pre>**&lt;b&gt;слишком длинно&lt;/b&gt;**</pre>')
+
+    def test_detail_serves_stored_html(self):
+        """Тестируем страницу заметки без загрузки текста"""
+        response = self.client.get(self.url)
+        self.assertContains(response, '<strong>хлеб</strong>', html=True)
+        self.assertIn('text', response.context['note'].get_deferred_fields())
+
+    def test_stale_html_is_saved_on_view(self):
+        """Тестируем сохранение HTML, перерисованного при просмотре"""
+        models.QuerySet.update(Note.objects.filter(pk=self.note.pk),
+                               html='устарело', html_version=0)
+        updated = Note.objects.get(pk=self.note.pk).updated
+        self.assertContains(self.client.get(self.url), '<strong>хлеб</strong>',
+                            html=True)
+        note = Note.objects.get(pk=self.note.pk)
+        self.assertEqual((note.html, note.html_version, note.updated),
+                         (self.note.html, rendering.VERSION, updated))
+
+    def test_every_write_path_renders(self):
+        """Тестируем отрисовку при правке формой, update и bulk_create"""
+        self.client.post(reverse('notes:edit', args=(self.note.slug,)), {
+            'title': 'Покупки', 'text': '*форма*', 'slug': self.note.slug,
+        })
+        self.note.refresh_from_db()
+        self.assertInHTML('<em>форма</em>', self.note.html)
+        Note.objects.filter(pk=self.note.pk).update(text='`update`')
+        self.note.refresh_from_db()
+        self.assertInHTML('<code>update</code>', self.note.html)
+        note, = Note.objects.bulk_create_with_slugs(
+            [Note(author=self.author, title='Пачка', text='**пачка**')]
+        )
+        self.assertInHTML('<strong>пачка</strong>',
+                          Note.objects.get(pk=note.pk).html)
+
+    def test_command_rerenders_stale_notes(self):
+        """Тестируем перерисовку заметок прежней версии"""
+        fresh = Note.objects.create(author=self.author, title='Свежая',
+                                    text='_свежая_')
+        # Так выглядят заметки после смены VERSION.
+        models.QuerySet.update(Note.objects.filter(pk=self.note.pk),
+                               html='устарело', html_version=0)
+        updated = Note.objects.get(pk=self.note.pk).updated
+        out = StringIO()
+        call_command('render_notes', stdout=out)
+        self.assertIn('Перерисовано заметок: 1', out.getvalue())
+        note = Note.objects.get(pk=self.note.pk)
+        self.assertEqual((note.html, note.html_version, note.updated),
+                         (self.note.html, rendering.VERSION, updated))
+        call_command('render_notes', '--all', stdout=out)
+        self.assertIn('Перерисовано заметок: 2', out.getvalue())
+        self.assertEqual(Note.objects.get(pk=fresh.pk).html, fresh.html)
@@ -0,0 +1,81 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from notes import search
+from notes.models import Note
+from notes.tests.test_data import User
+
+SEARCH_URL = 'notes:search'
+
+
+class TestSearch(TestCase):
+    """Тестируем полнотекстовый поиск по заметкам"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.reader = User.objects.create(username='Читатель')
+        cls.in_text = Note.objects.create(
+            author=cls.author, title='Покупки',
+            text='Купить молоко и <b>хлеб</b>', slug='in-text'
+        )
+        cls.in_title = Note.objects.create(
+            author=cls.author, title='Хлеб', text='Ржаной', slug='in-title'
+        )
+        cls.foreign = Note.objects.create(
+            author=cls.reader, title='Хлеб', text='Чужой хлеб',
+            slug='foreign'
+        )
+
+    def search(self, query, user=None):
+        self.client.force_login(user or self.author)
+        response = self.client.get(reverse(SEARCH_URL), {'q': query})
+        return list(response.context['object_list'])
+
+    def test_results_are_ranked_and_scoped(self):
+        """Тестируем ранжирование и поиск только по своим заметкам"""
+        results = self.search('хлеб')
+        self.assertEqual([note.pk for note in results],
+                         [self.in_title.pk, self.in_text.pk])
+
+    def test_snippet_is_escaped(self):
+        """Тестируем, что фрагмент экранирован, а совпадение выделено"""
+        note, = self.search('молоко')
+        self.assertIn('<mark>молоко</mark>', note.snippet)
+        self.assertIn('&lt;b&gt;', note.snippet)
+
+    def test_fts_syntax_is_not_interpreted(self):
+        """Тестируем, что операторы FTS5 в запросе безопасны"""
+        self.assertEqual(self.search('NOT " ( *'), [])
+
+    def test_without_fts(self):
+        """Тестируем поиск только по заголовку без FTS5"""
+        with mock.patch.object(search, 'is_available', return_value=False):
+            results = self.search('Хлеб')
+            self.assertEqual([note.pk for note in results],
+                             [self.in_title.pk])
+            self.assertEqual(results[0].snippet, '')
+            self.assertEqual(self.search('молоко'), [])
+
+    def test_index_follows_save_and_delete(self):
+        """Тестируем обновление индекса при сохранении и удалении"""
+        self.in_text.text = 'Купить кефир'
+        self.in_text.save()
+        self.assertEqual(self.search('молоко'), [])
+        self.assertEqual(len(self.search('кефир')), 1)
+        self.in_text.delete()
+        self.assertEqual(self.search('кефир'), [])
+
+    def test_rebuild_command(self):
+        """Тестируем пересборку индекса командой"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+        self.assertEqual(self.search('хлеб'), [])
+        call_command('rebuild_search_index', batch_size=1, stdout=StringIO())
+        self.assertEqual(len(self.search('хлеб')), 2)
+        self.assertEqual(len(self.search('хлеб', user=self.reader)), 1)
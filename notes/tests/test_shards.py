@@ -0,0 +1,252 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from notes import search, shards, tags
+from notes.models import (Attachment, AuthorShard, Note, NoteChange,
+                          NoteStats, NoteTag, Tag)
+from notes.tests.test_data import NOTES, User
+from notes.views import NotesList
+
+SHARD = 'notes_shard'
+REPLICA = 'notes_replica'
+SHARDS = ['default', SHARD]
+
+
+def add_shard_database(path):
+    """Объявляет второй шард в файле path и создаёт в нём таблицы.
+
+    База нужна только TestShards: она объявляется на время класса,
+    чтобы не попасть в остальные тесты.
+    """
+    database = {**connections[DEFAULT_DB_ALIAS].settings_dict,
+                'NAME': path, 'TEST': {'NAME': path}}
+    settings.DATABASES[SHARD] = database
+    connections.databases[SHARD] = database
+    with override_settings(NOTES_SHARDS=SHARDS):
+        call_command('migrate', database=SHARD, verbosity=0)
+
+
+def remove_shard_database():
+    connections[SHARD].close()
+    del connections[SHARD]
+    # В Django 3.2 это обычно один и тот же словарь.
+    connections.databases.pop(SHARD, None)
+    settings.DATABASES.pop(SHARD, None)
+
+
+def make_author(alias, prefix):
+    """Пользователь, которого хеш отправляет в шард alias."""
+    number = 0
+    while True:
+        user = User.objects.create(username=f'{prefix}-{number}')
+        if shards.hashed_shard(user.pk) == alias:
+            return user
+        user.delete()
+        number += 1
+
+
+@override_settings(NOTES_SHARDS=SHARDS)
+class TestShards(TestCase):
+    """Тестируем распределение заметок авторов по шардам"""
+    databases = {'default', SHARD}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        add_shard_database(os.path.join(cls.directory.name, 'shard.sqlite3'))
+        try:
+            super().setUpClass()
+        except Exception:
+            remove_shard_database()
+            cls.directory.cleanup()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        remove_shard_database()
+        cls.directory.cleanup()
+
+    @classmethod
+    def setUpTestData(cls):
+        with override_settings(NOTES_SHARDS=SHARDS):
+            cls.local = make_author('default', 'Местный')
+            cls.remote = make_author(SHARD, 'Дальний')
+            cls.local_note = Note.objects.create(
+                author=cls.local, slug='same', **NOTES['first_note']
+            )
+            cls.remote_note = Note.objects.create(
+                author=cls.remote, slug='remote', title='Хлеб',
+                text='Ржаной хлеб',
+            )
+
+    def setUp(self):
+        self.client.force_login(self.remote)
+
+    def test_notes_are_stored_in_author_shard(self):
+        """Тестируем запись заметок в шард автора"""
+        self.assertEqual(self.remote_note._state.db, SHARD)
+        self.assertFalse(Note.objects.using('default')
+                         .filter(author=self.remote).exists())
+        self.assertTrue(Note.objects.using(SHARD)
+                        .filter(slug='remote').exists())
+        self.assertEqual(
+            NoteChange.objects.using(SHARD).filter(author=self.remote)
+            .count(), 1,
+        )
+
+    def test_views_use_author_shard(self):
+        """Тестируем страницы, поиск и запись через шард автора"""
+        response = self.client.get(reverse('notes:list'))
+        self.assertEqual(list(response.context['object_list']),
+                         [self.remote_note])
+        response = self.client.get(
+            reverse('notes:detail', args=(self.remote_note.slug,))
+        )
+        self.assertEqual(response.status_code, 200)
+        results = search.search_notes(self.remote, 'хлеб', 10)
+        self.assertEqual([note.slug for note in results], ['remote'])
+        self.client.post(reverse('notes:add'),
+                         {'title': 'Новая', 'text': 'Текст'})
+        self.assertTrue(Note.objects.using(SHARD)
+                        .filter(author=self.remote, title='Новая').exists())
+        self.client.post(reverse('notes:delete', args=('remote',)))
+        self.assertFalse(Note.objects.using(SHARD)
+                         .filter(slug='remote').exists())
+
+    def test_placement_is_read_once_per_request(self):
+        """Тестируем одно чтение размещения автора за запрос"""
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            response = self.client.get(reverse('notes:list'))
+        self.assertContains(response, 'Хлеб')
+        self.assertEqual(
+            sum(AuthorShard._meta.db_table in query['sql']
+                for query in queries.captured_queries), 1
+        )
+
+    def test_slug_is_unique_across_shards(self):
+        """Тестируем проверку и подбор slug во всех шардах"""
+        response = self.client.post(reverse('notes:add'), {
+            'title': 'Заметка', 'text': 'Текст', 'slug': 'same',
+        })
+        self.assertFormError(response, 'form', 'slug',
+                             'same - такой slug уже существует, '
+                             'придумайте уникальное значение!')
+        Note.objects.create(author=self.local, title='Общий', text='Текст')
+        self.client.post(reverse('notes:add'),
+                         {'title': 'Общий', 'text': 'Текст'})
+        self.assertTrue(Note.objects.using(SHARD)
+                        .filter(slug='obschij-2').exists())
+
+    def test_bulk_create_spreads_notes(self):
+        """Тестируем раскладку пачки заметок по шардам"""
+        Note.objects.bulk_create_with_slugs([
+            Note(author=self.local, title='Пачка', text='Текст'),
+            Note(author=self.remote, title='Пачка', text='Текст'),
+        ])
+        self.assertEqual(Note.objects.using('default')
+                         .get(title='Пачка').slug, 'pachka')
+        self.assertEqual(Note.objects.using(SHARD)
+                         .get(title='Пачка').slug, 'pachka-2')
+
+    def test_author_cannot_change_shard_on_save(self):
+        """Тестируем запрет переноса заметки сменой автора"""
+        self.remote_note.author = self.local
+        with self.assertRaises(ValueError):
+            self.remote_note.save()
+
+    def test_rebalance_moves_author(self):
+        """Тестируем перенос заметок автора в другой шард"""
+        cursor = self.client.get(reverse('api:changes')).json()['cursor']
+        updated = self.remote_note.updated
+        call_command('rebalance_notes', '--author', self.remote.username,
+                     '--to', 'default', stdout=StringIO())
+        self.assertFalse(Note.objects.using(SHARD).exists())
+        self.assertFalse(NoteChange.objects.using(SHARD).exists())
+        self.assertFalse(NoteStats.objects.using(SHARD).exists())
+        self.assertEqual(NoteStats.objects.using('default')
+                         .get(author=self.remote).note_count, 1)
+        self.assertEqual(shards.shard_for(self.remote.pk), 'default')
+        moved = Note.objects.using('default').get(slug='remote')
+        self.assertEqual(moved.updated, updated)
+        # id занят заметкой default: прежний id уходит в ленту надгробием.
+        self.assertNotEqual(moved.pk, self.remote_note.pk)
+        changes = self.client.get(reverse('api:changes'),
+                                  {'cursor': cursor}).json()['changes']
+        self.assertEqual(
+            {(change['id'], change['deleted']) for change in changes},
+            {(self.remote_note.pk, True), (moved.pk, False)},
+        )
+        self.assertEqual(search.search_notes(self.remote, 'хлеб', 10)[0],
+                         moved)
+        call_command('rebalance_notes', stdout=StringIO())
+        self.assertTrue(Note.objects.using(SHARD)
+                        .filter(slug='remote').exists())
+        self.assertFalse(AuthorShard.objects.exists())
+
+    def test_rebalance_moves_attachments(self):
+        """Тестируем перенос вложений вместе с заметками"""
+        Attachment.objects.using(SHARD).create(
+            note=self.remote_note, author=self.remote, name='list.txt',
+            content_type='text/plain', size=1, sha256='0' * 64,
+        )
+        with self.captureOnCommitCallbacks(using=SHARD):
+            shards.move_author(self.remote.pk, 'default')
+        self.assertFalse(Attachment.objects.using(SHARD).exists())
+        moved = Attachment.objects.using('default').get()
+        self.assertEqual(moved.note,
+                         Note.objects.using('default').get(slug='remote'))
+        self.assertEqual(moved.sha256, '0' * 64)
+
+    def test_rebalance_moves_tags(self):
+        """Тестируем перенос тегов и их счётчиков вместе с заметками"""
+        tags.set_tags(self.remote_note, ['покупки', 'срочно'])
+        shards.move_author(self.remote.pk, 'default')
+        self.assertFalse(Tag.objects.using(SHARD).exists())
+        self.assertFalse(NoteTag.objects.using(SHARD).exists())
+        moved = Note.objects.using('default').get(slug='remote')
+        self.assertEqual(tags.note_tag_names(moved), ['покупки', 'срочно'])
+        self.assertEqual(
+            set(Tag.objects.using('default').filter(author=self.remote)
+                .values_list('name', 'note_count')),
+            {('покупки', 1), ('срочно', 1)},
+        )
+
+    def test_user_deletion_cleans_shard(self):
+        """Тестируем удаление заметок пользователя из его шарда"""
+        self.remote.delete()
+        self.assertFalse(Note.objects.using(SHARD).exists())
+        self.assertFalse(NoteChange.objects.using(SHARD).exists())
+
+    def test_admin_lists_selected_shard(self):
+        """Тестируем выбор шарда в админке"""
+        admin = User.objects.create(username='Админ', is_staff=True,
+                                    is_superuser=True)
+        self.client.force_login(admin)
+        url = reverse('admin:notes_note_changelist')
+        response = self.client.get(url, {'shard': SHARD})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.remote_note])
+        response = self.client.get(
+            reverse('admin:notes_note_change', args=(self.remote_note.pk,)),
+            {'_changelist_filters': f'shard={SHARD}'},
+        )
+        self.assertEqual(response.context['original'], self.remote_note)
+
+    @override_settings(NOTES_REPLICAS={SHARD: REPLICA})
+    def test_reads_go_to_replica(self):
+        """Тестируем чтение с реплики и запись в шард"""
+        view = NotesList()
+        for method, alias in (('get', REPLICA), ('post', SHARD)):
+            with self.subTest(method=method):
+                view.request = getattr(RequestFactory(), method)('/')
+                view.request.user = self.remote
+                self.assertEqual(view.get_queryset().db, alias)
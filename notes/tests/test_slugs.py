@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from pytils.translit import slugify
+
+from notes.forms import WARNING
+from notes.models import Note, NoteQuerySet
+from notes.tests.test_data import NOTES, TARGET_URLS, User
+
+TITLE = NOTES['first_note']['title']
+BASE = slugify(TITLE)
+BULK_SIZE = 500
+
+
+class TestSlugAllocation(TestCase):
+    """Тестируем подбор свободных slug"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        Note.objects.create(author=cls.author, title=TITLE, text='Текст')
+
+    def test_suffix_is_added_in_one_query(self):
+        """Тестируем суффикс для занятой основы за один запрос"""
+        with self.assertNumQueries(1):
+            slug = Note.objects.allocate_slug(TITLE)
+        self.assertEqual(slug, f'{BASE}-2')
+
+    def test_other_prefixes_do_not_collide(self):
+        """Тестируем, что slug с общим началом не считаются занятыми"""
+        Note.objects.create(author=self.author, title='Другая',
+                            text='Текст', slug=f'{BASE}-draft')
+        self.assertEqual(Note.objects.allocate_slug(TITLE), f'{BASE}-2')
+
+    def test_long_title_fits_max_length(self):
+        """Тестируем длину slug для длинного заголовка"""
+        title = 'а' * 100
+        first = Note.objects.create(author=self.author, title=title,
+                                    text='Текст')
+        second = Note.objects.create(author=self.author, title=title,
+                                     text='Текст')
+        self.assertEqual(len(first.slug), 100)
+        self.assertEqual(len(second.slug), 100)
+        self.assertTrue(second.slug.endswith('-2'))
+
+    def test_bulk_create_with_slugs(self):
+        """Тестируем подбор slug для пачки заметок с одним заголовком"""
+        notes = [Note(author=self.author, title=TITLE, text='Текст')
+                 for _ in range(BULK_SIZE)]
+        with CaptureQueriesContext(connection) as queries:
+            Note.objects.bulk_create_with_slugs(notes)
+        lookups = [query for query in queries.captured_queries
+                   if query['sql'].startswith('SELECT "slug" FROM')]
+        self.assertEqual(len(lookups), 1)
+        slugs = set(Note.objects.values_list('slug', flat=True))
+        self.assertEqual(len(slugs), BULK_SIZE + 1)
+        self.assertIn(f'{BASE}-{BULK_SIZE + 1}', slugs)
+
+    def test_save_retries_when_slug_is_taken(self):
+        """Тестируем повтор вставки, если slug успели занять"""
+        allocate = mock.patch.object(
+            NoteQuerySet, 'allocate_slug', side_effect=[BASE, f'{BASE}-2']
+        )
+        with allocate:
+            note = Note.objects.create(author=self.author, title=TITLE,
+                                       text='Текст')
+        self.assertEqual(note.slug, f'{BASE}-2')
+
+    def test_form_allocates_empty_slug(self):
+        """Тестируем, что форма подбирает slug вместо ошибки"""
+        self.client.force_login(self.author)
+        self.client.post(reverse(TARGET_URLS['add_page']),
+                         data={'title': TITLE, 'text': 'Текст', 'slug': ''})
+        self.assertTrue(Note.objects.filter(slug=f'{BASE}-2').exists())
+
+    def test_form_reports_race_on_explicit_slug(self):
+        """Тестируем ошибку формы, если slug заняли после проверки"""
+        self.client.force_login(self.author)
+        error = IntegrityError('UNIQUE constraint failed: notes_note.slug')
+        with mock.patch.object(Note, 'save', side_effect=error):
+            response = self.client.post(
+                reverse(TARGET_URLS['add_page']),
+                data={'title': 'Новая', 'text': 'Текст', 'slug': 'new'},
+            )
+        self.assertFormError(response, 'form', 'slug', 'new' + WARNING)
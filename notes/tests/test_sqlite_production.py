@@ -0,0 +1,65 @@
+import tempfile
+from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase
+
+from notes import stress
+from notes.backends.sqlite3.base import DatabaseWrapper
+
+OPTIONS = {
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+}
+
+
+class TestProductionBackend(SimpleTestCase):
+    """Тестируем настройки соединения SQLite для продакшена"""
+
+    def make_wrapper(self, directory, options):
+        return DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': str(Path(directory) / 'db.sqlite3'),
+            'OPTIONS': options,
+        })
+
+    def test_init_command_and_transaction_mode(self):
+        """Тестируем PRAGMA нового соединения и BEGIN IMMEDIATE"""
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = self.make_wrapper(directory, OPTIONS)
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('PRAGMA synchronous')
+                    # NORMAL — 1.
+                    self.assertEqual(cursor.fetchone()[0], 1)
+                wrapper._start_transaction_under_autocommit()
+                self.assertTrue(wrapper.connection.in_transaction)
+                # Блокировка записи взята сразу: второе соединение
+                # не может начать свою пишущую транзакцию.
+                other = self.make_wrapper(directory, {'timeout': 0})
+                with self.assertRaisesMessage(OperationalError, 'locked'):
+                    other.cursor().execute('BEGIN IMMEDIATE')
+                other.close()
+                wrapper.connection.rollback()
+            finally:
+                wrapper.close()
+
+    def test_unknown_transaction_mode(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = self.make_wrapper(directory,
+                                        {'transaction_mode': 'LAZY'})
+            with self.assertRaises(ImproperlyConfigured):
+                wrapper.get_connection_params()
+
+
+class TestConcurrentWrites(SimpleTestCase):
+    """Тестируем запись несколькими процессами без «database is locked»"""
+
+    def test_no_lock_errors(self):
+        result = stress.run('production', workers=4, writes=16)
+        self.assertEqual(result['operations'], 64)
+        self.assertEqual(result['locked'], 0)
+        self.assertEqual(result['errors'], 0)
@@ -0,0 +1,121 @@
+from http import HTTPStatus
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from notes import cache, stats
+from notes.models import Note, NoteStats
+from notes.tests.test_data import User
+
+
+class TestNoteStats(TestCase):
+    """Тестируем статистику заметок пользователя"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.other = User.objects.create(username='Другой')
+        cls.note = Note.objects.create(author=cls.author, title='Хлеб',
+                                       text='Ржаной')
+
+    def setUp(self):
+        cache.get_cache().clear()
+
+    def assert_stats(self, author, count):
+        row = NoteStats.objects.get(author=author)
+        self.assertEqual(row.note_count, count)
+        self.assertEqual(row.note_count, Note.objects.filter(
+            author=author).count())
+        return row
+
+    def test_save_and_delete(self):
+        """Тестируем счётчик при создании и удалении заметок"""
+        row = self.assert_stats(self.author, 1)
+        self.assertEqual(row.last_edited, self.note.updated)
+        second = Note.objects.create(author=self.author, title='Молоко',
+                                     text='Свежее')
+        self.assertEqual(self.assert_stats(self.author, 2).last_edited,
+                         second.updated)
+        second.delete()
+        row = self.assert_stats(self.author, 1)
+        self.assertGreater(row.last_edited, second.updated)
+
+    def test_bulk_operations(self):
+        """Тестируем bulk_create, bulk_delete и update со сменой автора"""
+        notes = Note.objects.bulk_create_with_slugs(
+            [Note(author=self.author, title='Заметка', text='Текст')
+             for _ in range(3)]
+        )
+        self.assert_stats(self.author, 4)
+        Note.objects.filter(pk__in=[note.pk for note in notes[:2]]).update(
+            author=self.other
+        )
+        self.assert_stats(self.author, 2)
+        self.assert_stats(self.other, 2)
+        Note.objects.filter(author=self.other).bulk_delete()
+        self.assert_stats(self.other, 0)
+
+    def test_user_deletion(self):
+        self.author.delete()
+        self.assertFalse(NoteStats.objects.exists())
+
+    def test_cached_stats_without_queries(self):
+        """Тестируем чтение статистики из кеша без запросов"""
+        stats.get_stats(self.author.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(stats.get_stats(self.author.pk).note_count, 1)
+        Note.objects.create(author=self.author, title='Молоко',
+                            text='Свежее')
+        self.assertEqual(stats.get_stats(self.author.pk).note_count, 2)
+
+    def test_list_etag_ignores_cached_stats(self):
+        """Тестируем ETag списка по записи в базе, а не в кеше"""
+        self.client.force_login(self.author)
+        url = reverse('notes:list')
+        etag = self.client.get(url)['ETag']
+        # Запись изменил другой процесс: кеш этого процесса не сброшен.
+        NoteStats.objects.filter(author=self.author).update(note_count=5)
+        cache.invalidate_authors({self.author.pk})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_missing_row_is_counted(self):
+        NoteStats.objects.all().delete()
+        self.assertEqual(stats.get_stats(self.author.pk).note_count, 1)
+        self.assert_stats(self.author, 1)
+
+    def test_reconcile(self):
+        """Тестируем исправление расхождений командой"""
+        NoteStats.objects.filter(author=self.author).update(note_count=7,
+                                                            last_edited=None)
+        NoteStats.objects.create(author=self.other, note_count=3)
+        out = StringIO()
+        call_command('reconcile_note_stats', '--batch-size', '1', stdout=out)
+        self.assertIn('Исправлено записей статистики: 2', out.getvalue())
+        self.assertEqual(self.assert_stats(self.author, 1).last_edited,
+                         self.note.updated)
+        self.assert_stats(self.other, 0)
+        out = StringIO()
+        call_command('reconcile_note_stats', stdout=out)
+        self.assertIn('Исправлено записей статистики: 0', out.getvalue())
+
+    def test_header_and_list(self):
+        """Тестируем вывод статистики в шапке и ETag списка"""
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('notes:list'))
+        self.assertContains(response, 'заметок: 1')
+        self.assertContains(response, 'Всего заметок: 1.')
+        etag = response['ETag']
+        Note.objects.create(author=self.author, title='Молоко',
+                            text='Свежее')
+        response = self.client.get(reverse('notes:list'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Всего заметок: 2.')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_anonymous_header(self):
+        response = self.client.get(reverse('notes:home'))
+        self.assertIsNone(response.context['note_stats'] or None)
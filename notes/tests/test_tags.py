@@ -0,0 +1,114 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from notes import cache, tags
+from notes.forms import NoteForm
+from notes.models import Note, NoteTag, Tag
+from notes.tests.test_data import User
+
+
+class TestTags(TestCase):
+    """Тестируем теги заметок и фильтр списка по ним"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.other = User.objects.create(username='Другой')
+        cls.bread = Note.objects.create(author=cls.author, title='Хлеб',
+                                        text='Ржаной', slug='bread')
+        cls.milk = Note.objects.create(author=cls.author, title='Молоко',
+                                       text='Свежее', slug='milk')
+        cls.report = Note.objects.create(author=cls.author, title='Отчёт',
+                                         text='Квартальный', slug='report')
+        tags.set_tags(cls.bread, ['покупки', 'срочно'])
+        tags.set_tags(cls.milk, ['покупки'])
+        tags.set_tags(cls.report, ['работа', 'срочно'])
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.client.force_login(self.author)
+
+    def counts(self, author=None):
+        """Счётчики тегов, сверенные с числом связей."""
+        result = {}
+        for tag in Tag.objects.filter(author=author or self.author):
+            self.assertEqual(tag.note_count, NoteTag.objects.filter(
+                tag=tag).count())
+            result[tag.name] = tag.note_count
+        return result
+
+    def list_slugs(self, *names):
+        response = self.client.get(reverse('notes:list'), {'tag': names})
+        return [note.slug for note in response.context['object_list']]
+
+    def test_parse(self):
+        self.assertEqual(tags.parse(' Работа,  покупки , работа,,'),
+                         ['работа', 'покупки'])
+
+    def test_counts_follow_edits(self):
+        """Тестируем счётчики при смене тегов и удалении заметок"""
+        self.assertEqual(self.counts(),
+                         {'покупки': 2, 'срочно': 2, 'работа': 1})
+        response = self.client.post(
+            reverse('notes:edit', args=('milk',)),
+            {'title': 'Молоко', 'text': 'Свежее', 'slug': 'milk',
+             'tags': 'Срочно, дом'},
+        )
+        self.assertRedirects(response, reverse('notes:success'))
+        self.assertEqual(tags.note_tag_names(self.milk), ['дом', 'срочно'])
+        self.assertEqual(self.counts(), {'покупки': 1, 'срочно': 3,
+                                         'работа': 1, 'дом': 1})
+        self.bread.delete()
+        self.assertEqual(self.counts(), {'покупки': 0, 'срочно': 2,
+                                         'работа': 1, 'дом': 1})
+        Note.objects.filter(slug__in=['milk', 'report']).bulk_delete()
+        self.assertEqual(set(self.counts().values()), {0})
+        self.assertFalse(NoteTag.objects.exists())
+
+    def test_filter(self):
+        """Тестируем фильтр по одному и нескольким тегам сразу"""
+        self.assertEqual(len(self.list_slugs()), 3)
+        self.assertEqual(set(self.list_slugs('покупки')), {'bread', 'milk'})
+        self.assertEqual(self.list_slugs('покупки', 'срочно'), ['bread'])
+        self.assertEqual(self.list_slugs('нет такого'), [])
+        self.client.force_login(self.other)
+        self.assertEqual(self.list_slugs('покупки'), [])
+
+    def test_list_page(self):
+        """Тестируем облако тегов и число запросов при многих заметках"""
+        response = self.client.get(reverse('notes:list'), {'tag': 'срочно'})
+        self.assertContains(response, 'срочно (2)')
+        toggle = tags.query(['покупки', 'срочно']).replace('&', '&amp;')
+        self.assertContains(response, f'href="?{toggle}"')
+        cache.get_cache().clear()
+        with self.assertNumQueries(6) as first:
+            # Сессия, пользователь, статистика, облако тегов, заметки
+            # и их теги.
+            self.client.get(reverse('notes:list'))
+        for number in range(10):
+            note = Note.objects.create(author=self.author, title='Заметка',
+                                       text='Текст', slug=f'note-{number}')
+            tags.set_tags(note, ['срочно', f'тег {number}'])
+        cache.get_cache().clear()
+        with self.assertNumQueries(len(first.captured_queries)):
+            self.client.get(reverse('notes:list'))
+
+    def test_form(self):
+        """Тестируем проверку тегов и то, что без поля теги не стираются"""
+        form = NoteForm(instance=self.bread)
+        self.assertEqual(form.initial['tags'], 'покупки, срочно')
+        form = NoteForm(data={'title': 'Хлеб', 'text': 'Ржаной',
+                              'slug': 'bread',
+                              'tags': ','.join(map(str, range(21)))},
+                        instance=self.bread)
+        self.assertIn('tags', form.errors)
+        form = NoteForm(data={'title': 'Хлеб', 'text': 'Белый',
+                              'slug': 'bread'}, instance=self.bread)
+        form.save()
+        self.assertEqual(tags.note_tag_names(self.bread),
+                         ['покупки', 'срочно'])
+
+    def test_user_deletion(self):
+        self.author.delete()
+        self.assertFalse(Tag.objects.exists())
+        self.assertFalse(NoteTag.objects.exists())
@@ -0,0 +1,115 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from notes import search
+from notes.models import Note
+from notes.tests.test_data import NOTES, User
+
+BATCH_SIZE = 2
+
+
+class TestExportImport(TestCase):
+    """Тестируем команды export_notes и import_notes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор')
+        cls.reader = User.objects.create(username='Читатель')
+        for index, key in enumerate(('first_note', 'second_note')):
+            Note.objects.create(author=cls.author, slug=f'note-{index}',
+                                **NOTES[key])
+        Note.objects.create(author=cls.reader, slug='reader-note',
+                            **NOTES['edited_note'])
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def export(self, name, *args):
+        call_command('export_notes', self.path(name), *args,
+                     stderr=StringIO())
+
+    def import_(self, name, *args):
+        call_command('import_notes', self.path(name), *args,
+                     f'--batch-size={BATCH_SIZE}', stderr=StringIO())
+
+    def test_export_is_gzipped_jsonl(self):
+        """Тестируем формат выгрузки и фильтр по автору"""
+        self.export('notes.jsonl.gz', '--author', self.author.username)
+        with gzip.open(self.path('notes.jsonl.gz'), 'rt',
+                       encoding='utf-8') as stream:
+            rows = [json.loads(line) for line in stream]
+        self.assertEqual(rows[0], {'author': self.author.username,
+                                   'slug': 'note-0',
+                                   **NOTES['first_note']})
+        self.assertEqual(len(rows), 2)
+
+    def test_round_trip_resolves_slug_collisions(self):
+        """Тестируем повторную загрузку выгрузки в ту же базу"""
+        self.export('notes.jsonl')
+        self.import_('notes.jsonl')
+        self.assertEqual(Note.objects.count(), 6)
+        self.assertEqual(
+            set(Note.objects.filter(author=self.author)
+                .values_list('slug', flat=True)),
+            {'note-0', 'note-1', 'note-0-2', 'note-1-2'},
+        )
+        found = search.search_notes(self.reader, 'отредактированный', 10)
+        self.assertEqual(len(found), 2)
+
+    def test_stdout_stays_open(self):
+        """Тестируем выгрузку в stdout без закрытия самого stdout"""
+        for args, decode in (((), bytes.decode),
+                             (('--gzip',), gzip.decompress)):
+            with self.subTest(args=args):
+                stdout = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+                with mock.patch('sys.stdout', stdout):
+                    call_command('export_notes', '-', *args,
+                                 stderr=StringIO())
+                self.assertFalse(stdout.closed)
+                # В stdout можно писать и после команды.
+                stdout.write('\n')
+                stdout.flush()
+                content = stdout.buffer.getvalue()[:-1]
+                lines = decode(content)
+                self.assertEqual(len(lines.splitlines()), 3)
+
+    def test_orphaned_notes_are_skipped(self):
+        """Тестируем пропуск заметок, автора которых уже нет"""
+        Note.objects.create(author_id=self.reader.pk + 1000, slug='orphan',
+                            **NOTES['first_note'])
+        stderr = StringIO()
+        call_command('export_notes', self.path('notes.jsonl'), stderr=stderr)
+        self.assertIn('Пропущено заметок без автора: 1.', stderr.getvalue())
+        with open(self.path('notes.jsonl'), encoding='utf-8') as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual(len(rows), 3)
+        Note.objects.all().delete()
+        self.import_('notes.jsonl')
+        self.assertEqual(Note.objects.count(), 3)
+
+    def test_missing_authors(self):
+        """Тестируем обработку неизвестных пользователей"""
+        with open(self.path('notes.jsonl'), 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'author': 'Новый', 'title': 'Заметка',
+                                   'text': 'Текст'}) + '\n')
+        with self.assertRaises(CommandError):
+            self.import_('notes.jsonl')
+        self.import_('notes.jsonl', '--missing-authors=skip')
+        self.assertEqual(Note.objects.count(), 3)
+        self.import_('notes.jsonl', '--missing-authors=create')
+        note = Note.objects.get(author__username='Новый')
+        self.assertEqual(note.slug, 'zametka')
+        self.assertFalse(note.author.has_usable_password())
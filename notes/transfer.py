@@ -0,0 +1,109 @@
+"""Потоковый перенос заметок в формате JSON Lines."""
+import gzip
+import io
+import json
+import sys
+import time
+
+# Поля заметки в выгрузке, помимо имени автора.
+NOTE_FIELDS = ('title', 'text', 'slug')
+GZIP_SUFFIX = '.gz'
+STDIO = '-'
+
+
+def is_gzip(path, force=False):
+    return force or path.endswith(GZIP_SUFFIX)
+
+
+class StdioLines(io.TextIOWrapper):
+    """Текстовый поток поверх stdin/stdout, который их не закрывает.
+
+    Команду могут вызвать через call_command или из фоновой задачи:
+    после неё процессу ещё нужны его стандартные потоки.
+    """
+
+    def close(self):
+        if getattr(self, 'detached', False):
+            return
+        self.detached = True
+        self.flush()
+        raw = self.detach()
+        if isinstance(raw, gzip.GzipFile):
+            # Дописывает конец архива; сам stdout GzipFile не закрывает.
+            raw.close()
+        else:
+            raw.flush()
+
+
+def open_lines(path, mode, compress=False):
+    """Открывает файл или stdin/stdout как текстовый поток UTF-8."""
+    binary_mode = mode + 'b'
+    if path == STDIO:
+        raw = (sys.stdin if mode == 'r' else sys.stdout).buffer
+        if compress:
+            raw = gzip.GzipFile(fileobj=raw, mode=binary_mode)
+        return StdioLines(raw, encoding='utf-8')
+    if compress:
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def dump_note(row):
+    return json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def read_notes(stream):
+    """Построчно разбирает выгрузку, пропуская пустые строки."""
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            raise ValueError(f'строка {number}: {error}')
+        if not isinstance(row, dict) or 'author' not in row:
+            raise ValueError(f'строка {number}: нет поля author')
+        yield number, row
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Progress:
+    """Печатает прогресс и скорость не чаще раза в interval секунд."""
+
+    def __init__(self, stream, label, interval=1.0):
+        self.stream = stream
+        self.label = label
+        self.interval = interval
+        self.count = 0
+        self.started = self.reported = time.monotonic()
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.count / elapsed if elapsed else 0.0
+
+    def advance(self, count):
+        self.count += count
+        now = time.monotonic()
+        if now - self.reported >= self.interval:
+            self.reported = now
+            self.stream.write(
+                f'{self.label}: {self.count} ({self.rate():.0f} в секунду)'
+            )
+
+    def finish(self):
+        elapsed = time.monotonic() - self.started
+        self.stream.write(
+            f'{self.label}: {self.count} за {elapsed:.1f} с '
+            f'({self.rate():.0f} в секунду)'
+        )
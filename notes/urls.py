@@ -12,4 +12,21 @@ urlpatterns = [
     path('delete/<slug:slug>/', views.NoteDelete.as_view(), name='delete'),
     path('notes/', views.NotesList.as_view(), name='list'),
     path('done/', views.NoteSuccess.as_view(), name='success'),
+    path('search/', views.NoteSearch.as_view(), name='search'),
+    path('autocomplete/', views.NoteAutocomplete.as_view(),
+         name='autocomplete'),
+    path('attach/<slug:slug>/', views.AttachmentCreate.as_view(),
+         name='attach'),
+    path('attachment/<int:pk>/', views.AttachmentDownload.as_view(),
+         name='attachment'),
+    path('attachment/<int:pk>/delete/', views.AttachmentDelete.as_view(),
+         name='attachment_delete'),
+    path('archive/', views.NoteArchive.as_view(), name='archive'),
+    path('jobs/', views.JobList.as_view(), name='jobs'),
+    path('jobs/add/', views.JobCreate.as_view(), name='job_add'),
+    path('jobs/<int:pk>/', views.JobDetail.as_view(), name='job'),
+    path('metrics/cache/', views.CacheMetrics.as_view(),
+         name='cache_metrics'),
+    path('metrics/requests/', views.RequestMetrics.as_view(),
+         name='request_metrics'),
 ]
@@ -1,9 +1,30 @@
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.urls import reverse_lazy
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib.auth.mixins import (LoginRequiredMixin,
+                                        UserPassesTestMixin)
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import (HttpResponse, HttpResponseBadRequest,
+                         HttpResponseRedirect, JsonResponse,
+                         StreamingHttpResponse)
+from django.shortcuts import get_object_or_404, redirect
+from django.urls import reverse, reverse_lazy
+from django.utils.decorators import method_decorator
+from django.utils.functional import cached_property
 from django.views import generic
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+from . import (archive, attachments, autocomplete, cache, instrumentation,
+               rendering, search, shards, slugs, stats, tags)
+from .conditional import ConditionalGetMixin, is_conditional
+from .forms import AttachmentForm, JobForm, NoteForm
+from .models import Attachment, Job, Note, Tag
+from .pagination import KeysetPaginationMixin
+from .retry import WriteRetryMixin
 
-from .forms import NoteForm
-from .models import Note
+# Запросы, которые не меняют заметки: их можно обслужить с реплики.
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
 
 
 class Home(generic.TemplateView):
@@ -22,38 +43,375 @@ class NoteBase(LoginRequiredMixin):
     success_url = reverse_lazy('notes:success')
 
     def get_queryset(self):
-        """Пользователь может работать только со своими заметками."""
-        return self.model.objects.filter(author=self.request.user)
+        """Пользователь может работать только со своими заметками.
 
+        Заметки читаются из шарда автора, безопасные запросы — из его
+        реплики, если она настроена.
+        """
+        return self.model.objects.for_author(
+            self.request.user, write=self.request.method not in SAFE_METHODS
+        )
 
-class NoteCreate(NoteBase, generic.CreateView):
-    """Добавление заметки."""
+
+class NoteFormMixin:
+    """Сохранение формы заметки с защитой от гонки за slug."""
     template_name = 'notes/form.html'
     form_class = NoteForm
 
+    def save_note(self, note):
+        note.save()
+
     def form_valid(self, form):
-        new_note = form.save(commit=False)
-        new_note.author = self.request.user
-        new_note.save()
-        return super().form_valid(form)
+        note = form.save(commit=False)
+        try:
+            with transaction.atomic(
+                    using=shards.db_for_author(self.request.user.pk)):
+                self.save_note(note)
+                form.save_m2m()
+        except IntegrityError as error:
+            if not slugs.is_slug_conflict(error):
+                raise
+            # Slug заняли между проверкой формы и вставкой.
+            form.slug_taken()
+            return self.form_invalid(form)
+        self.object = note
+        return HttpResponseRedirect(self.get_success_url())
 
 
-class NoteUpdate(NoteBase, generic.UpdateView):
+class NoteCreate(NoteBase, WriteRetryMixin, NoteFormMixin,
+                 generic.CreateView):
+    """Добавление заметки."""
+
+    def save_note(self, note):
+        note.author = self.request.user
+        note.save()
+
+
+class NoteUpdate(NoteBase, WriteRetryMixin, NoteFormMixin,
+                 generic.UpdateView):
     """Редактирование заметки."""
-    template_name = 'notes/form.html'
-    form_class = NoteForm
 
 
-class NoteDelete(NoteBase, generic.DeleteView):
+class NoteDelete(NoteBase, WriteRetryMixin, generic.DeleteView):
     """Удаление заметки."""
     template_name = 'notes/delete.html'
 
 
-class NotesList(NoteBase, generic.ListView):
+class NotesList(NoteBase, cache.UserPageCacheMixin, ConditionalGetMixin,
+                KeysetPaginationMixin, generic.ListView):
     """Список всех заметок пользователя."""
     template_name = 'notes/list.html'
+    keyset_ordering = ('author_id', 'id')
 
+    def get_validators(self):
+        """Валидатор ETag по статистике заметок пользователя.
 
-class NoteDetail(NoteBase, generic.DetailView):
+        Last-Modified не отдаётся: удаление заметки не сдвигает
+        максимальное время изменения, а число заметок — сдвигает.
+        Статистика читается одной записью по ключу, без COUNT(*)
+        по заметкам, и мимо кеша: в кеше другого процесса она может
+        быть устаревшей, и тот ответил бы 304 на изменившийся список.
+        """
+        note_stats = stats.read_stats(self.request.user.pk)
+        updated = note_stats.last_edited
+        stamp = int(updated.timestamp() * 1e6) if updated else 0
+        return f'{note_stats.note_count}-{stamp}', None
+
+    @cached_property
+    def tag_names(self):
+        """Названия тегов фильтра из запроса."""
+        return list(dict.fromkeys(filter(None, map(
+            tags.normalize, self.request.GET.getlist(tags.QUERY_PARAM)
+        ))))
+
+    def get_queryset(self):
+        """Загружаем только поля, которые выводятся в списке.
+
+        Теги страницы загружаются одним запросом, сколько бы заметок
+        на ней ни было.
+        """
+        # author_id нужен роутеру, чтобы найти шард тегов заметки.
+        queryset = super().get_queryset().only('id', 'author_id', 'slug',
+                                               'title')
+        selected = tags.selected(self.request.user, self.tag_names)
+        if selected is None:
+            return queryset.none()
+        if selected:
+            queryset = tags.filter_notes(queryset, selected)
+        return queryset.prefetch_related(Prefetch(
+            'tags',
+            queryset=Tag.objects.only('id', 'author_id', 'name')
+            .order_by('name'),
+        ))
+
+    def get_context_data(self, **kwargs):
+        """Облако тегов: ссылка тега добавляет его к фильтру."""
+        cloud = tags.cloud(self.request.user)
+        selected = set(self.tag_names)
+        for tag in cloud:
+            tag.selected = tag.name in selected
+            tag.query = tags.query(selected ^ {tag.name})
+        return super().get_context_data(
+            tag_cloud=cloud, tag_names=self.tag_names,
+            tag_query=tags.query(selected), **kwargs
+        )
+
+    def get_paginate_by(self, queryset):
+        return settings.NOTES_PAGE_SIZE
+
+
+class NoteDetail(NoteBase, cache.UserPageCacheMixin, ConditionalGetMixin,
+                 generic.DetailView):
     """Заметка подробно."""
     template_name = 'notes/detail.html'
+
+    def get_validators(self):
+        """Валидаторы по времени изменения.
+
+        Для условного запроса текст не загружается: скорее всего,
+        ответом будет 304. Без валидаторов клиента страница отрисуется
+        в любом случае, поэтому заметка загружается сразу, целиком.
+        """
+        if is_conditional(self.request):
+            found = list(
+                self.get_queryset().filter(slug=self.kwargs['slug'])
+                .values_list('id', 'updated')[:1]
+            )
+            if not found:
+                return None, None
+            note_id, updated = found[0]
+        else:
+            self.object = self.get_object()
+            note_id, updated = self.object.pk, self.object.updated
+        # Новая версия отрисовки меняет страницу без изменения заметки.
+        stamp = int(updated.timestamp() * 1e6)
+        return f'{note_id}-{stamp}-{rendering.VERSION}', updated
+
+    def get_queryset(self):
+        """Текст не загружается: страница выводит готовый HTML.
+
+        Наличие вложений проверяется в том же запросе: у большинства
+        заметок их нет, и второй запрос не нужен.
+        """
+        return super().get_queryset().defer('text').annotate(
+            has_attachments=Exists(
+                Attachment.objects.filter(note=OuterRef('pk'))
+            )
+        )
+
+    def get_context_data(self, **kwargs):
+        attachments = []
+        if self.object.has_attachments:
+            attachments = self.object.attachments.only(
+                'id', 'note_id', 'author_id', 'name', 'size'
+            ).order_by('id')
+        return super().get_context_data(attachments=attachments, **kwargs)
+
+    def get_object(self, queryset=None):
+        if queryset is None and getattr(self, 'object', None) is not None:
+            return self.object
+        return super().get_object(queryset)
+
+
+class NoteSearch(NoteBase, generic.ListView):
+    """Полнотекстовый поиск по заметкам пользователя."""
+    template_name = 'notes/search.html'
+
+    def get_query(self):
+        return self.request.GET.get('q', '').strip()
+
+    def get_queryset(self):
+        query = self.get_query()
+        if not query:
+            return []
+        return search.search_notes(self.request.user, query,
+                                   settings.NOTES_PAGE_SIZE)
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(query=self.get_query(), **kwargs)
+
+
+class NoteAutocomplete(LoginRequiredMixin, generic.View):
+    """Подсказки заметок по началу заголовка или slug в JSON."""
+
+    def get(self, request, *args, **kwargs):
+        notes = autocomplete.suggest(request.user.pk,
+                                     request.GET.get('q', ''))
+        return JsonResponse({'results': [
+            {'title': title, 'slug': slug,
+             'url': reverse('notes:detail', args=(slug,))}
+            for title, slug in notes
+        ]})
+
+
+class NoteArchive(NoteBase, generic.View):
+    """Все заметки пользователя одним архивом файлов Markdown.
+
+    Формат выбирается параметром format: tar.gz (по умолчанию) или zip.
+    """
+
+    def get(self, request, *args, **kwargs):
+        archive_format = request.GET.get('format', archive.TAR_GZ)
+        if archive_format not in archive.FORMATS:
+            return HttpResponseBadRequest('Неизвестный формат архива.')
+        response = StreamingHttpResponse(
+            archive.stream(self.get_queryset(), archive_format),
+            content_type=archive.FORMATS[archive_format],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="notes.{archive_format}"'
+        )
+        return response
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AttachmentCreate(NoteBase, generic.FormView):
+    """Загрузка вложения к заметке.
+
+    Файл пишется на диск кусками по мере чтения запроса. Обработчик
+    загрузки нужно заменить до чтения POST, а проверка CSRF читает
+    POST, поэтому она выполняется уже после замены.
+    """
+    template_name = 'notes/attachment_form.html'
+    form_class = AttachmentForm
+
+    def get_note(self):
+        if not hasattr(self, 'note'):
+            self.note = get_object_or_404(self.get_queryset(),
+                                          slug=self.kwargs['slug'])
+        return self.note
+
+    def get(self, request, *args, **kwargs):
+        self.get_note()
+        return super().get(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        handler = attachments.HashingUploadHandler(request)
+        request.upload_handlers = [handler]
+        try:
+            return self.protected_post(request, *args, **kwargs)
+        finally:
+            # Временные файлы, не ставшие вложением (форма с ошибкой).
+            for _, uploads in request.FILES.lists():
+                for upload in uploads:
+                    upload.discard()
+
+    @method_decorator(csrf_protect)
+    def protected_post(self, request, *args, **kwargs):
+        self.get_note()
+        return super().post(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(note=self.get_note(), **kwargs)
+
+    def form_invalid(self, form):
+        if self.request.upload_handlers[0].exceeded:
+            return HttpResponse('Файл слишком большой.',
+                                status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        return super().form_invalid(form)
+
+    def form_valid(self, form):
+        attachments.attach(self.get_note(), form.cleaned_data['file'])
+        return redirect('notes:detail', slug=self.get_note().slug)
+
+
+class AttachmentDownload(NoteBase, generic.View):
+    """Содержимое вложения; поддерживаются ETag и Range."""
+    model = Attachment
+
+    def get(self, request, *args, **kwargs):
+        attachment = get_object_or_404(self.get_queryset(),
+                                       pk=self.kwargs['pk'])
+        return attachments.serve(request, attachment)
+
+
+class AttachmentDelete(NoteBase, generic.View):
+    """Удаление вложения; файл удаляется, если он больше не нужен."""
+    model = Attachment
+
+    def post(self, request, *args, **kwargs):
+        attachment = get_object_or_404(
+            self.get_queryset().select_related('note'), pk=self.kwargs['pk']
+        )
+        attachments.detach(attachment)
+        return redirect('notes:detail', slug=attachment.note.slug)
+
+
+class JobBase(LoginRequiredMixin):
+    """Пользователь видит только свои фоновые задачи."""
+    model = Job
+
+    def get_queryset(self):
+        return Job.objects.filter(author=self.request.user)
+
+
+class JobList(JobBase, generic.ListView):
+    """Последние задачи пользователя и запуск новой."""
+    template_name = 'notes/jobs.html'
+
+    def get_queryset(self):
+        return super().get_queryset().order_by('-id')[
+            :settings.NOTES_PAGE_SIZE
+        ]
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(
+            form=JobForm(),
+            active=any(job.is_active for job in self.object_list),
+            **kwargs,
+        )
+
+
+class JobCreate(JobBase, generic.FormView):
+    """Ставит задачу в очередь; выполнит её manage.py run_workers."""
+    form_class = JobForm
+    http_method_names = ['post']
+
+    def form_invalid(self, form):
+        return HttpResponseBadRequest('Неизвестная задача.')
+
+    def form_valid(self, form):
+        Job.objects.enqueue(form.cleaned_data['name'], self.request.user)
+        return redirect('notes:jobs')
+
+
+class JobDetail(JobBase, generic.DetailView):
+    """Состояние, прогресс и результат задачи."""
+    template_name = 'notes/job.html'
+
+
+class MetricsAccessMixin(UserPassesTestMixin):
+    """Метрики доступны персоналу или по токену NOTES_METRICS_TOKEN."""
+
+    def test_func(self):
+        token = settings.NOTES_METRICS_TOKEN
+        if token and self.request.headers.get(
+                'Authorization') == f'Bearer {token}':
+            return True
+        return self.request.user.is_staff
+
+
+class CacheMetrics(MetricsAccessMixin, generic.View):
+    """Счётчики кеша страниц в текстовом формате Prometheus."""
+
+    def get(self, request, *args, **kwargs):
+        lines = [
+            '# HELP notes_page_cache_requests_total '
+            'Page cache lookups by view and result.',
+            '# TYPE notes_page_cache_requests_total counter',
+        ]
+        for (view_name, result), count in sorted(cache.get_stats().items()):
+            lines.append(
+                f'notes_page_cache_requests_total{{view="{view_name}",'
+                f'result="{result}"}} {count}'
+            )
+        return HttpResponse('\n'.join(lines) + '\n',
+                            content_type='text/plain; version=0.0.4')
+
+
+class RequestMetrics(MetricsAccessMixin, generic.View):
+    """Гистограммы времени запросов по маршрутам в формате Prometheus."""
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(instrumentation.registry.prometheus(),
+                            content_type='text/plain; version=0.0.4')
@@ -9,8 +9,22 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yanote.settings')
 
-application = get_asgi_application()
+
+class NotesASGIHandler(ASGIHandler):
+    """Запросы разбираются по NOTES_ASGI_URLCONF с асинхронными страницами."""
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None and settings.NOTES_ASGI_URLCONF:
+            request.urlconf = settings.NOTES_ASGI_URLCONF
+        return request, error_response
+
+
+django.setup(set_prefix=False)
+application = NotesASGIHandler()
@@ -0,0 +1,11 @@
+"""Корневые маршруты под ASGI: как yanote.urls, но с notes.async_urls."""
+from django.urls import include, path
+
+from notes import urls as notes_urls
+from yanote import urls
+
+urlpatterns = [
+    path('', include('notes.async_urls'))
+    if getattr(pattern, 'urlconf_name', None) is notes_urls else pattern
+    for pattern in urls.urlpatterns
+]
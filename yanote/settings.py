@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 from django.urls import reverse_lazy
@@ -22,17 +23,26 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Работает, только если включён NOTES_PERF_ENABLED.
+    'notes.instrumentation.PerformanceMiddleware',
+    # Размещение автора по шардам читается один раз за запрос.
+    'notes.shards.PlacementMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # AuthenticationMiddleware с кешем пользователя, см. notes/auth.py.
+    'notes.auth.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'yanote.urls'
 
+# Замеры времени SQL, шаблонов и представлений в заголовке Server-Timing
+# и гистограммах notes:request_metrics.
+NOTES_PERF_ENABLED = os.environ.get('NOTES_PERF_ENABLED') == '1'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -44,6 +54,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'notes.context_processors.note_stats',
             ],
         },
     },
@@ -52,13 +63,156 @@ TEMPLATES = [
 WSGI_APPLICATION = 'yanote.wsgi.application'
 
 
+# Режим базы: 'default' — обычный sqlite3, 'production' — WAL,
+# настроенные PRAGMA, постоянные соединения и BEGIN IMMEDIATE, чтобы
+# несколько процессов могли писать без «database is locked».
+NOTES_DB_MODE = os.environ.get('NOTES_DB_MODE', 'default')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('NOTES_DB_NAME', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+if NOTES_DB_MODE == 'production':
+    DATABASES['default'].update({
+        'ENGINE': 'notes.backends.sqlite3',
+        'CONN_MAX_AGE': int(os.environ.get('NOTES_DB_CONN_MAX_AGE', 600)),
+        'OPTIONS': {
+            # Сколько секунд ждать блокировку записи.
+            'timeout': int(os.environ.get('NOTES_DB_BUSY_TIMEOUT', 20)),
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA foreign_keys=ON;'
+                'PRAGMA temp_store=MEMORY;'
+                # 64 МБ страничного кеша и 256 МБ отображения в память.
+                'PRAGMA cache_size=-65536;'
+                'PRAGMA mmap_size=268435456'
+            ),
+        },
+    })
+
+# Шарды заметок: алиасы баз через запятую, авторы распределяются
+# между ними по хешу id. В default хранятся пользователи, поэтому
+# default обязан быть шардом. Базы остальных шардов создаются рядом
+# с основной как db-<алиас>.sqlite3.
+NOTES_SHARDS = os.environ.get('NOTES_SHARDS', 'default').split(',')
+
+# Реплики для чтения: пары «шард=реплика» через запятую. Реплику
+# наполняет внешняя репликация (например, litestream), миграции
+# в неё не применяются.
+NOTES_REPLICAS = dict(
+    pair.split('=', 1)
+    for pair in os.environ.get('NOTES_REPLICAS', '').split(',') if pair
+)
+
+for alias in NOTES_SHARDS + list(NOTES_REPLICAS.values()):
+    DATABASES.setdefault(alias, {
+        **DATABASES['default'],
+        'NAME': Path(DATABASES['default']['NAME']).with_name(
+            f'db-{alias}.sqlite3'
+        ),
+    })
+for primary, replica in NOTES_REPLICAS.items():
+    # В тестах реплика — то же соединение, что и шард.
+    DATABASES[replica]['TEST'] = {'MIRROR': primary}
+
+DATABASE_ROUTERS = ['notes.routers.NoteShardRouter']
+
+# Под ASGI страницы чтения заметок асинхронные (notes/async_views.py),
+# а их работа с базой идёт в пуле из NOTES_ASYNC_DB_THREADS потоков.
+# SQLite работает в процессе и держит GIL, поэтому пул невелик: больше
+# потоков нужно, только если база отвечает по сети.
+# Пустой NOTES_ASGI_URLCONF — все страницы синхронные, как под WSGI.
+NOTES_ASGI_URLCONF = os.environ.get('NOTES_ASGI_URLCONF', 'yanote.asgi_urls')
+NOTES_ASYNC_DB_THREADS = int(os.environ.get('NOTES_ASYNC_DB_THREADS', 2))
+
+# Сколько раз повторять запись, если база всё же занята.
+NOTES_DB_WRITE_ATTEMPTS = int(os.environ.get('NOTES_DB_WRITE_ATTEMPTS', 3))
+
+# Текст заметки длиннее стольких байт хранится сжатым zlib; 0 — не сжимать.
+NOTES_TEXT_COMPRESSION_THRESHOLD = int(
+    os.environ.get('NOTES_TEXT_COMPRESSION_THRESHOLD', 8192)
+)
+
+# Более длинный текст заметки выводится как есть, без разбора Markdown.
+NOTES_MARKDOWN_MAX_LENGTH = int(
+    os.environ.get('NOTES_MARKDOWN_MAX_LENGTH', 200_000)
+)
+
+# Каталог с содержимым вложений (файлы по SHA-256) и предел размера файла.
+NOTES_ATTACHMENTS_ROOT = Path(
+    os.environ.get('NOTES_ATTACHMENTS_ROOT', BASE_DIR / 'attachments')
+)
+NOTES_ATTACHMENT_MAX_SIZE = int(
+    os.environ.get('NOTES_ATTACHMENT_MAX_SIZE', 100 * 1024 * 1024)
+)
+# Если задан, файлы отдаёт nginx: ответ содержит только заголовок
+# X-Accel-Redirect с этим префиксом (internal location на каталог
+# NOTES_ATTACHMENTS_ROOT), а Range nginx обрабатывает сам.
+NOTES_ATTACHMENTS_ACCEL_PREFIX = os.environ.get(
+    'NOTES_ATTACHMENTS_ACCEL_PREFIX', ''
+)
+
+
+# Кеш страниц заметок: 'locmem' (в памяти процесса, только для
+# одного процесса) или 'file' (общий для всех процессов каталог на
+# диске; его нужно выбрать при нескольких воркерах gunicorn/uwsgi).
+NOTES_CACHE_BACKEND = os.environ.get('NOTES_CACHE_BACKEND', 'locmem')
+
+NOTES_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'notes-pages',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'NOTES_CACHE_DIR', str(BASE_DIR / 'cache' / 'notes-pages')
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'notes': NOTES_CACHE_BACKENDS[NOTES_CACHE_BACKEND],
+}
+
+NOTES_CACHE_ALIAS = 'notes'
+
+# Общий ли кеш заметок для всех процессов. 'locmem' рассчитан на один
+# процесс: сброс кеша после записи виден только процессу, который
+# записал. Поэтому с ним токен версии страниц автора (см. cache.py)
+# живёт NOTES_CACHE_VERSION_TIMEOUT секунд: другие процессы отдают
+# устаревшие страницы не дольше этого. В общем кеше токен не истекает.
+NOTES_CACHE_SHARED = NOTES_CACHE_BACKEND != 'locmem'
+NOTES_CACHE_VERSION_TIMEOUT = None if NOTES_CACHE_SHARED else int(
+    os.environ.get('NOTES_CACHE_VERSION_TIMEOUT', 10)
+)
+
+# Хранилище сессий: 'db' (по умолчанию), 'cached_db', 'cache'
+# или 'signed_cookies'. С 'cache' сессии живут в кеше 'default',
+# поэтому при нескольких процессах ему нужен общий бэкенд.
+# С 'signed_cookies' сессия хранится у клиента и базу не читает вовсе.
+NOTES_SESSION_ENGINE = os.environ.get('NOTES_SESSION_ENGINE', 'db')
+
+SESSION_ENGINE = f'django.contrib.sessions.backends.{NOTES_SESSION_ENGINE}'
+
+# Сколько секунд пользователь запроса хранится в кеше заметок;
+# 0 — читать его из базы на каждом запросе. Сброс после выхода, смены
+# пароля или прав виден всем процессам только в общем кеше, поэтому
+# с кешем процесса ('locmem') по умолчанию пользователь не кешируется.
+NOTES_USER_CACHE_TIMEOUT = int(os.environ.get(
+    'NOTES_USER_CACHE_TIMEOUT', 300 if NOTES_CACHE_SHARED else 0
+))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -87,3 +241,38 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = reverse_lazy('users:login')
 LOGIN_REDIRECT_URL = reverse_lazy('notes:home')
+
+# Количество заметок на одной странице списка.
+NOTES_PAGE_SIZE = 50
+
+# Подсказки заметок по началу заголовка: для скольких авторов процесс
+# держит индекс в памяти и сколько подсказок отдаёт.
+NOTES_AUTOCOMPLETE_USERS = int(
+    os.environ.get('NOTES_AUTOCOMPLETE_USERS', 1000)
+)
+NOTES_AUTOCOMPLETE_LIMIT = 10
+# Сколько секунд индекс подсказок живёт в памяти процесса: с кешем
+# процесса ('locmem') столько другие процессы не видят изменений.
+NOTES_AUTOCOMPLETE_TIMEOUT = int(
+    os.environ.get('NOTES_AUTOCOMPLETE_TIMEOUT', 30)
+)
+
+# Наибольшее число операций в одном пакете JSON API.
+NOTES_API_MAX_BATCH = 1000
+
+# Наибольшее число изменений в одном ответе ленты синхронизации.
+NOTES_API_CHANGES_LIMIT = 500
+
+# Фоновые задачи (manage.py run_workers): сколько раз пробовать задачу,
+# через сколько секунд повторить проваленную (задержка удваивается
+# с каждой попыткой), через сколько секунд без отчёта выполняемая
+# задача считается брошенной и как часто проверять очередь.
+NOTES_JOB_ATTEMPTS = int(os.environ.get('NOTES_JOB_ATTEMPTS', 3))
+NOTES_JOB_RETRY_DELAY = float(os.environ.get('NOTES_JOB_RETRY_DELAY', 10))
+NOTES_JOB_TIMEOUT = float(os.environ.get('NOTES_JOB_TIMEOUT', 600))
+NOTES_JOB_POLL_INTERVAL = float(
+    os.environ.get('NOTES_JOB_POLL_INTERVAL', 1)
+)
+
+# Токен для сбора метрик без входа на сайт (Authorization: Bearer ...).
+NOTES_METRICS_TOKEN = os.environ.get('NOTES_METRICS_TOKEN', '')